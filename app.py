@@ -1,78 +1,172 @@
 # author: Samuel Wejeus (samuel@isalldigital.com)
 import sys
-import filecmp
-import git
+import glob
+import itertools
 import os
 
-from pathspec import Pathspec
+from pathspec import Pathspec, home
 from broken_ref_type import BrokenRefType
 from ref_store import RefStore
 from linker import Linker
+from lazy_repo import LazyRepo
+from git_state import GitState
+from content_compare import ContentComparer
+import sync_policy
+from sync_policy import SyncPolicy
+import sync_plan
+from sync_plan import SyncPlan, SyncAction
+import probe
+import file_diff
+import git_head
+import git_index
+import status_snapshot
+from status_snapshot import StatusSnapshot
+import daemon
+from daemon import StatusDaemon
+from watcher import LinkWatcher
+import scanner
+from scanner import RepoScan
+from dir_tracker import DirTracker
+from stat_cache import StatCache
 from config import Config, APP
 import log
+import profiler
 
-AVAILABLE_ACTIONS = ["list", "status", "sync", "add", "remove", "show"]
+AVAILABLE_ACTIONS = ["list", "status", "sync", "add", "remove", "show", "daemon", "watch"]
+
+# number of files added and linked at a time when adding a directory
+_ADD_BATCH_SIZE = 1000
+
+# answers accepted when asking about a broken ref during sync, by broken ref type
+_ANSWERS = {
+    "B": {"m": sync_policy.MINE, "t": sync_policy.THEIRS, "s": sync_policy.SKIP},
+    "C": {"y": sync_policy.LINK, "n": sync_policy.SKIP, "s": sync_policy.SKIP},
+    "E": {"y": sync_policy.REMOVE, "s": sync_policy.SKIP},
+}
+_PENDING_LABELS = {
+    "B": "conflicting content, keep (m)ine or (t)heirs",
+    "C": "not linked to repository, add it (y)",
+    "E": "missing in system and repository, remove from index (y)",
+}
 
 # Everything must be initialized (with a config rc file and all before we can use anything in App)
 class App:
-    def __init__(self, config: Config, ref_store: RefStore, linker: Linker, git_repo: git.Repo):
+    def __init__(self, config: Config, ref_store: RefStore, linker: Linker, git_repo: LazyRepo):
+        self.config = config
         self.ref_store = ref_store
         self.linker = linker
         self.git_repo = git_repo
+        self.content_comparer = None
 
     # remove then add?
     def move(self, src, dest):
         raise Exception("NOT IMPLEMENTED YET!")
 
-    def add_recursive(self, path, resolved) -> bool:
-        ps = None
-        try:
-            ps = Pathspec(path)
-        except Exception as e:
-            log.error(e)
-            return False
-
-        if ps.is_dir_ref():
-            entries = os.listdir(ps.get_abs_path()) # get all files and folder in directory
-            for subpath in entries:
-                print(os.path.join(ps.get_abs_path(), subpath))
-                self.add_recursive(os.path.join(ps.get_abs_path(), subpath), resolved)
-        else:
-            resolved.append(ps)      
-        return True
-            
+    # Yields pathspecs of all files at pathspec, the pathspec itself if it is a file.
+    # Directories are expanded iteratively while walking so callers can consume files
+    # as they are found, without holding the full tree in memory. Symlinked directories
+    # below pathspec are not followed (same as --status and tracked directory listings).
+    def iter_files(self, pathspec: Pathspec):
+        if not pathspec.is_dir_ref():
+            yield pathspec
+            return
+        root = pathspec.get_abs_path()
+        for rel_path, entry in scanner.walk_files(root):
+            yield Pathspec.from_normalized(root + rel_path)
+
+    # adds and links a batch of files, returns number of files added.
+    # Files that fail to link are reported and not added to the index.
+    def add_batch(self, pathspecs) -> int:
+        new_pathspecs = []
+        for ps in pathspecs:
+            if self.ref_store.contains_ref(ps): # TODO should also check? os.path.isfile(ps.get_abs_path()):
+                log.info("File already tracked: {0}".format(ps))
+                continue
+            new_pathspecs.append(ps)
+
+        linked = []
+        def unlink_batch():
+            for ps in reversed(linked):
+                self.linker.unlink(ps)
+        self.ref_store.on_rollback(unlink_batch)
 
-    # param could be either a path to a file or directory. Only a single param at a time is currently supported.
+        for ps, result in zip(new_pathspecs, self.linker.link_pathspecs(new_pathspecs)):
+            if not result.ok:
+                log.error("Could not link {0}: {1}".format(ps, result.error))
+                continue
+            linked.append(ps)
+            self.ref_store.add_ref(ps)
+        return len(linked)
+
+    # params are paths to files or directories, or glob patterns (e.g. from --from-file).
+    # All files are added and linked as one stream in batches while directories are walked.
+    # All refs are written to the index in one go when done. If linking fails midway the
+    # index is left untouched and links created so far are removed again.
     def add(self, params):
-        if len(params) == 1:
-            param = params[0]
-            resolved = []
-            if self.add_recursive(param, resolved):
-                for ps in resolved:
-                    if self.ref_store.contains_ref(ps): # TODO should also check? os.path.isfile(ps.get_abs_path()):
-                        log.info("File already tracked: {0}".format(ps))
-                        continue
-                    self.ref_store.add_ref(ps)  # best to save ref first if something goes wrong later
-                    self.linker.link(ps)
-                
-                maybeDirPathspec = Pathspec(param)
-                if maybeDirPathspec.is_dir_ref():
-                    self.ref_store.add_dir_ref(maybeDirPathspec)
-            else:
-                log.error("Could not resolve param")
+        roots = self.resolve_roots(params)
+        if not roots:
+            log.error("Nothing to add")
+            return
 
-            # if param is dir: add separate entry in ref_store indicating that it is a directory being tracked
-        else:
-            log.error("Can only add a single path (file or directory) at a time!")
+        with self.ref_store.transaction():
+            added = 0
+            single_file = len(roots) == 1 and not roots[0].is_dir_ref()
+            files = itertools.chain.from_iterable(self.iter_files(root) for root in roots)
+            batch = list(itertools.islice(files, _ADD_BATCH_SIZE))
+            while batch:
+                added += self.add_batch(batch)
+                if single_file:
+                    if added:
+                        log.info("creating link: {0}".format(roots[0]))
+                else:
+                    log.info("{0} files added..".format(added))
+                batch = list(itertools.islice(files, _ADD_BATCH_SIZE))
+
+            # directories get a separate entry in ref_store indicating that it is a directory being tracked
+            for root in roots:
+                if root.is_dir_ref():
+                    self.ref_store.add_dir_ref(root)
+        self.refresh_status_snapshot()
+
+    # Expands globs and resolves params to pathspecs, sorted and without duplicates. Paths
+    # inside another given directory are dropped since walking that directory covers them.
+    def resolve_roots(self, params) -> [Pathspec]:
+        resolved = {}
+        for param in params:
+            paths = [param]
+            if glob.has_magic(param):
+                paths = sorted(glob.glob(os.path.expanduser(param)))
+                if not paths:
+                    log.error("No match for: {0}".format(param))
+            for path in paths:
+                try:
+                    ps = Pathspec(path)
+                except Exception as e:
+                    log.error(e)
+                    log.error("Could not resolve param")
+                    continue
+                if not os.path.lexists(ps.get_abs_path()):
+                    log.error("No such file or directory: {0}".format(path))
+                    continue
+                resolved[ps.get_abs_path()] = ps
+
+        roots = []
+        covering_dir = None
+        # sorted by path a directory comes right before everything inside it
+        for abspath in sorted(resolved):
+            if covering_dir and abspath.startswith(covering_dir):
+                log.debug("%s already covered by %s", abspath, covering_dir)
+                continue
+            root = resolved[abspath]
+            if root.is_dir_ref():
+                covering_dir = abspath
+            roots.append(root)
+        return roots
 
-        # Edge case: what happens when adding a dir and a file in that dir is already tracked?
-        
     # can be used to either remove a ref pointed to by path in repo dir
     # or by pointing to original source file. Either way refs are remove
-    # and (maybe) unlinked if needed.
+    # and (maybe) unlinked if needed. Directories remove every ref below them.
     def remove(self, pathspecs: Pathspec):
-        log.error("TODO: implement removal of directory")
-
         resolved = []
         for ps in pathspecs:
             try:
@@ -80,13 +174,40 @@ class App:
             except Exception as e:
                 log.error(e)
                 return
-        for ps in resolved:
-            log.debug("Removing ref: {0}".format(ps))
-            try:
-                self.ref_store.remove_ref(ps)
-            except Exception as e:
-                pass
-            self.linker.unlink(ps)
+        repo = self.ref_store.get_repository()
+        with self.ref_store.transaction():
+            for ps in resolved:
+                dir_name = self.tracked_dir_name(repo, ps)
+                if dir_name:
+                    self.remove_dir(dir_name)
+                    continue
+                log.debug("Removing ref: %s", ps)
+                try:
+                    self.ref_store.remove_ref(ps)
+                except Exception as e:
+                    pass
+                if self.linker.unlink(ps) and ps.is_existing_file():
+                    self.ref_store.on_rollback(lambda ps=ps: self.linker.link(ps))
+        self.refresh_status_snapshot()
+
+    # <repository> relative name ("dir/") if pathspec is a directory holding tracked refs.
+    # Also works for directories no longer present in system (but tracked).
+    def tracked_dir_name(self, repo: str, ps: Pathspec):
+        name = Pathspec.get_ref_from_repo(repo, ps)
+        if not ps.is_dir_ref() and self.ref_store.contains_ref_name(name):
+            return None
+        dir_name = name.rstrip("/") + "/"
+        if self.ref_store.get_refs_under(dir_name) or dir_name in self.ref_store.get_dirs():
+            return dir_name
+        return None
+
+    # refs are dropped from index in one batch and their repository copies removed in bulk
+    def remove_dir(self, dir_name: str):
+        removed = self.ref_store.remove_refs_under(dir_name)
+        unlinked = self.linker.unlink_many(removed, prune_root=dir_name)
+        relinks = [pair for pair in map(self.mine_theirs_from_ref, unlinked) if os.path.isfile(pair[0])]
+        self.ref_store.on_rollback(lambda: self.linker.link_many(relinks))
+        log.info("{0} files removed from tracking: ~/{1}".format(len(removed), dir_name))
 
     def list(self, params=None):
         log.info("Tracking files:")
@@ -97,39 +218,123 @@ class App:
         for ref in refs:
             log.info('~/' + ref)
 
-    def get_broken_refs(self):
+    # git_state is collected if not given
+    @profiler.timed("get_broken_refs")
+    def get_broken_refs(self, git_state: GitState = None):
         broken_refs = []
-        git_diff_refs = [item.a_path for item in self.git_repo.index.diff(None)] + [item.a_path for item in self.git_repo.index.diff("HEAD")]
-        # Handle cases tracked by INDEX
-        for ref_name in self.ref_store.get_index():
-            status = self.determine_link_status(ref_name)
-            if ref_name in git_diff_refs:
-                git_diff_refs.remove(ref_name)
-            if status:
-                broken_refs.append(status)
-
-        # Handle dangling files NOT tracked by index
         repo = self.ref_store.get_repository()
-        for root, _, files in os.walk(repo):
-            for file in files:
-                ref_name = os.path.join(root, file).split(repo + "/")[1]
-                status = self.determine_track_status(ref_name)
+        if git_state is None:
+            with profiler.phase("git_state"):
+                git_state = self.collect_git_state(self.ref_store.get_index())
+        # one pass over repository gives stat info of all theirs, only mine needs probing
+        with profiler.phase("repo_scan"):
+            scan = RepoScan.scan(repo)
+
+        # Handle cases tracked by INDEX
+        refs = self.ref_store.get_index()
+        pairs = [self.mine_theirs_from_ref(ref_name) for ref_name in refs]
+        with profiler.phase("probe"):
+            mine_stats = probe.probe_paths([mine for mine, _ in pairs], self.config.get_workers())
+        with profiler.phase("classify"):
+            # refs with unchanged stat info since last found clean are skipped
+            stat_cache = self.ref_store.get_stat_cache()
+            stat_cache.check_tag(git_head.state_tag(repo))
+            for ref_name, (mine, theirs), mine_stat in zip(refs, pairs, mine_stats):
+                theirs_stat = scan.stat(ref_name)
+                if stat_cache.is_clean(ref_name, mine_stat, theirs_stat):
+                    continue
+                linked = scan.is_linked(ref_name, mine_stat)
+                status = self.classify_link_status(ref_name, mine, theirs, mine_stat, theirs_stat, git_state, linked)
                 if status:
+                    stat_cache.invalidate(ref_name)
                     broken_refs.append(status)
+                else:
+                    stat_cache.mark_clean(ref_name, mine_stat, theirs_stat)
+            stat_cache.save()
+
+        # Handle dangling files NOT tracked by index
+        for ref_name in scan:
+            if not self.ref_store.contains_ref_name(ref_name):
+                broken_refs.append(BrokenRefType.F(os.path.join(repo, ref_name)))
+
+        # Handle new files in tracked directories (in system). Files also present in
+        # repository are already reported as untracked above
+        with profiler.phase("tracked_dirs"):
+            for ref_name in self.new_files_in_tracked_dirs():
+                if scan.stat(ref_name) is None:
+                    mine, theirs = self.mine_theirs_from_ref(ref_name)
+                    broken_refs.append(BrokenRefType.G(mine, theirs))
 
         # Handle git specific case where file is intentionally unknown to trakk (dangling git index)
         # i.e. file not index and not in repository but known to git (either staged or not)
         # Example file staged for deletion in git but not commited as a result of a --remove operation
-        for ref_name in git_diff_refs:
+        for ref_name in sorted(git_state.changed_paths()):
+            if self.ref_store.contains_ref_name(ref_name):
+                continue
             mine, theirs = self.mine_theirs_from_ref(ref_name)
             broken_refs.append(BrokenRefType.A(mine, theirs))
 
         return broken_refs
 
+    # git state read from .git/index without running git when possible, see git_index
+    def collect_git_state(self, refs) -> GitState:
+        with profiler.phase("git_index"):
+            state = git_index.collect_state(self.ref_store.get_repository(), self.git_repo, refs, self.config.get_workers())
+        if state is None:
+            with profiler.phase("git_status"):
+                state = GitState.collect(self.git_repo)
+        return state
+
+    # <repository> relative names of files in tracked directories that are not in index.
+    # Only directories modified since last run are listed again, see DirTracker
+    def new_files_in_tracked_dirs(self) -> [str]:
+        tracker = DirTracker(self.config.get_dir_cache_file())
+        new_files = []
+        covering_dir = None
+        for dir_name in self.ref_store.get_dirs():
+            # dirs are sorted, a tracked dir inside another is covered by listing the outer one
+            if covering_dir and dir_name.startswith(covering_dir):
+                continue
+            covering_dir = dir_name
+            for rel_path in tracker.list_files(os.path.join(home(), dir_name)):
+                ref_name = dir_name + rel_path
+                if not self.ref_store.contains_ref_name(ref_name):
+                    new_files.append(ref_name)
+        log.debug("listed %s changed tracked directories", tracker.listed)
+        try:
+            tracker.save()
+        except OSError as e:
+            log.debug("could not save directory cache: %s", e)
+        return new_files
+
+    # Classifies only given <repository> relative ref names, by same rules as get_broken_refs.
+    # Returns ref name -> broken ref, or None for refs that are fine
+    def classify_refs(self, ref_names, git_state: GitState) -> dict:
+        results = {}
+        for ref_name in ref_names:
+            mine, theirs = self.mine_theirs_from_ref(ref_name)
+            if self.ref_store.contains_ref_name(ref_name):
+                mine_stat, theirs_stat = probe.probe_pair((mine, theirs))
+                results[ref_name] = self.classify_link_status(ref_name, mine, theirs, mine_stat, theirs_stat, git_state)
+            elif os.path.lexists(theirs) and not os.path.isdir(theirs):
+                results[ref_name] = BrokenRefType.F(theirs)
+            elif self.ref_store.in_tracked_dir(ref_name) and os.path.isfile(mine):
+                results[ref_name] = BrokenRefType.G(mine, theirs)
+            elif ref_name in git_state.changed_paths():
+                results[ref_name] = BrokenRefType.A(mine, theirs)
+            else:
+                results[ref_name] = None
+        return results
+
+    # with --cached broken refs are read from the snapshot of last full run if still valid
     def status(self, params=None):
-        log.error("TODO: implement sync status of folders!")
+        # a running daemon (--daemon) has a live answer
+        broken_refs = self.daemon_broken_refs()
+        if broken_refs is None and self.config.get_option('cached'):
+            broken_refs = self.cached_broken_refs()
+        if broken_refs is None:
+            broken_refs = self.refresh_status_snapshot()
 
-        broken_refs = self.get_broken_refs()
         if len(broken_refs) > 0:
             # broken_refs.sort(key=lambda tup: tup[1]) throws "instance has no attribute '__getitem__'" since no longer tuple
             log.info("{0} - Found broken or inconsistent refs:".format(APP))
@@ -152,11 +357,55 @@ class App:
                     log.info(broken_ref.mine) # neither exist but pick a name for display
                 elif broken_ref.type == "F":
                     log.info(broken_ref.theirs)
+                elif broken_ref.type == "G":
+                    log.info(broken_ref.mine)
             return True
         else:
             log.info("{0} - All OK".format(APP))
         return False
 
+    # keeps status live using inotify and answers --status over a unix socket until stopped
+    def daemon(self, params=None):
+        StatusDaemon(self, self.config.get_daemon_socket_file()).run()
+
+    # relinks tracked files replaced by editors saving atomically, until stopped
+    def watch(self, params=None):
+        LinkWatcher(self).run()
+
+    # MARK: - status snapshot
+
+    def status_snapshot_tag(self) -> dict:
+        return status_snapshot.current_tag(self.ref_store.get_repository(), self.config.get_storage_file())
+
+    # broken refs from a running daemon or None if no daemon answers. An answer tagged with
+    # other git state or configuration than current is stale (daemon has not handled the
+    # change yet) and not used
+    def daemon_broken_refs(self):
+        snapshot = daemon.query_status(self.config.get_daemon_socket_file())
+        if snapshot is None:
+            return None
+        if snapshot.tag != self.status_snapshot_tag():
+            log.debug("status daemon answer is stale, running status")
+            return None
+        return snapshot.broken_refs
+
+    # broken refs from snapshot or None if there is no valid snapshot
+    def cached_broken_refs(self):
+        snapshot = StatusSnapshot.load(self.config.get_status_snapshot_file())
+        if snapshot and snapshot.is_valid(self.status_snapshot_tag()):
+            return snapshot.broken_refs
+        return None
+
+    # runs a full status and saves it as snapshot. Tag is read afterwards since git status
+    # may refresh .git/index while collecting
+    def refresh_status_snapshot(self) -> [BrokenRefType]:
+        broken_refs = self.get_broken_refs()
+        try:
+            StatusSnapshot(self.status_snapshot_tag(), broken_refs).save(self.config.get_status_snapshot_file())
+        except OSError as e:
+            log.debug("could not save status snapshot: %s", e)
+        return broken_refs
+
     # ref param could be either local or from repo. must handle both cases and separate correctly into mine/theirs
     def mine_theirs_from_ref(self, ref):
         mine = os.path.join(os.path.expanduser("~"), ref) # R
@@ -167,32 +416,42 @@ class App:
     def determine_track_status(self, ref_name):
         if ref_name.startswith('.git/'):
             return None
-        log.debug("determine track status for: {0}".format(ref_name))
+        log.debug("determine track status for: %s", ref_name)
         repo = self.ref_store.get_repository()
         theirs_ps = Pathspec(os.path.join(repo, ref_name))
         if not self.ref_store.contains_ref(theirs_ps):
             return BrokenRefType.F(theirs_ps.get_abs_path())
         return None
 
-    def determine_link_status(self, ref):
+    # git_state is collected on demand if not given, pass it in when checking many refs
+    def determine_link_status(self, ref, git_state: GitState = None):
         mine, theirs = self.mine_theirs_from_ref(ref)
+        mine_stat, theirs_stat = probe.probe_pair((mine, theirs))
+        return self.classify_link_status(ref, mine, theirs, mine_stat, theirs_stat, git_state)
 
+    # classifies a ref from already probed stat results (None meaning path does not exist).
+    # linked tells if mine and theirs are the same inode, derived from the stat results if not given
+    def classify_link_status(self, ref, mine, theirs, mine_stat, theirs_stat, git_state: GitState = None, linked: bool = None):
         # Case C, E
-        if not os.path.exists(theirs):
-            if os.path.exists(mine):
+        if theirs_stat is None:
+            if mine_stat is not None:
                 return BrokenRefType.C(mine, theirs)
             else:
                 return BrokenRefType.E(mine, theirs)
         # Case A, B, D (theirs do exist)
         else:
             # Case D
-            if not os.path.exists(mine):
+            if mine_stat is None:
                 return BrokenRefType.D(mine, theirs)
             # Case A, B (mine do exist)
             else:
-                if os.path.samefile(mine, theirs):
+                if linked is None:
+                    linked = os.path.samestat(mine_stat, theirs_stat)
+                if linked:
                     # theirs, mine points to same inode, link is OK but could still diff from what is in git db
-                    if ref in self.git_repo.untracked_files or self.git_repo.head.commit.diff(None, paths=ref):
+                    if git_state is None:
+                        git_state = GitState.collect(self.git_repo)
+                    if git_state.has_changes(ref):
                         return BrokenRefType.A(mine, theirs)
                 else:
                     return BrokenRefType.B(mine, theirs)
@@ -206,129 +465,242 @@ class App:
 
         ref = Pathspec.get_ref_from_repo(self.ref_store.get_repository(), Pathspec(params[0]))
 
-        log.debug("determine show for: " + ref)
+        log.debug("determine show for: %s", ref)
         status = self.determine_track_status(ref)
         if not status:
             status = self.determine_link_status(ref)
 
         if status:
-            if status.type == "A":
-                for diff in self.git_repo.head.commit.diff(None, paths=status.mine, create_patch=True):
-                    log.info(diff)
-            elif status.type == "B":
-                self.show_file_diff(status.mine, status.theirs)
-            elif status.type == "C":
-                self.show_file_diff(None, status.theirs)
-            elif status.type == "D":
-                self.show_file_diff(status.mine, None)
-            elif status.type == "E":
-                log.info(status.reason)
-            elif status.type == "F":
-                log.info("Untracked file. Nothing to show.")
-            else:
-                log.error("unknown status!")
+            with file_diff.output(self.config.get_option('pager', False)) as out:
+                if status.type == "A":
+                    for diff in self.git_repo.head.commit.diff(None, paths=status.mine, create_patch=True):
+                        out.write(str(diff) + "\n")
+                elif status.type == "B":
+                    file_diff.write_diff(status.mine, status.theirs, out)
+                elif status.type == "C":
+                    file_diff.write_diff(status.mine, None, out)
+                elif status.type == "D":
+                    file_diff.write_diff(None, status.theirs, out)
+                elif status.type == "E":
+                    log.info(status.reason)
+                elif status.type == "F":
+                    log.info("Untracked file. Nothing to show.")
+                elif status.type == "G":
+                    file_diff.write_diff(status.mine, None, out)
+                else:
+                    log.error("unknown status!")
         else:
             log.info(ref + " ... OK")
 
-    def show_file_diff(self, L, R):
-        if L:
-            log.info("Mine: {0}".format(L))
-            log.info("=======================================================")
-            with open(L, 'r') as fin:
-                log.info(fin.read())
-        else:
-            log.info("=======================================================")
-            log.info("<ref not present in index>")
-
-        if R:
-            log.info("Theirs: {0}".format(R))
-            log.info("=======================================================")
-            with open(R, 'r') as fin:
-                log.info(fin.read())
-        else:
-            log.info("=======================================================")
-            log.info("<ref not present in system>")
-
     # NOTE: sync always linked in direction from <system> to <repository> (by force)
     # commiting to verson control is NOT handled by sync. We hand that off to interacting with git directly
     def sync(self, params=None):
-        self.sync_internal(self.get_broken_refs())
+        plan_file = self.config.get_option('apply_plan')
+        if plan_file:
+            plan = self.check_saved_plan(SyncPlan.load(plan_file))
+        else:
+            plan = self.build_sync_plan(self.get_broken_refs())
+
+        save_file = self.config.get_option('save_plan')
+        if save_file:
+            plan.save(save_file)
+            log.info("Saved sync plan with {0} actions to: {1}".format(len(plan), save_file))
+        if self.config.get_option('dry_run'):
+            self.print_sync_plan(plan)
+            return
+        self.apply_sync_plan(plan)
+        self.refresh_status_snapshot()
 
     def sync_internal(self, refs=None):
         if not refs:
             return
-
+        self.apply_sync_plan(self.build_sync_plan(refs))
+
+    # MARK: - sync plan
+
+    # Decides what to do for every broken ref without changing anything. Refs that
+    # can not be decided by content comparison or sync policy become "ask" actions
+    # in interactive mode, otherwise they are skipped.
+    def build_sync_plan(self, refs) -> SyncPlan:
+        # even though inode could be different for 2 files content could be same.
+        # We can then auto merge and it does not matter if we use mine or theirs as base
+        conflicts = [(broken_ref.mine, broken_ref.theirs) for broken_ref in refs if broken_ref.type == "B"]
+        comparer = self.get_content_comparer()
+        identical = set(pair for pair, same in zip(conflicts, comparer.compare_many(conflicts)) if same)
+        comparer.save()
+
+        policy = self.get_sync_policy()
+        plan = SyncPlan()
         for broken_ref in refs:
+            mine, theirs = broken_ref.mine, broken_ref.theirs
             if broken_ref.type == "B":
-                # even though inode could be different for 2 files content could be same.
-                # We can then auto merge and it does not matter if we use mine or theirs as base
-                if filecmp.cmp(broken_ref.mine, broken_ref.theirs):
-                    self.linker.link_raw(broken_ref.mine, broken_ref.theirs, True)
+                ref_name = self.ref_from_mine(mine)
+                if (mine, theirs) in identical:
+                    action = SyncAction(sync_plan.RELINK, ref_name, mine, theirs, "B")
                 else:
-                    self.prompt_choose_ref_to_link(broken_ref.mine, broken_ref.theirs)
+                    action = self.decided_action("B", ref_name, mine, theirs, policy.prefer(ref_name, mine, theirs), policy.interactive)
+                action.stats = self.stat_signatures(mine, theirs)
+                plan.add(action)
             elif broken_ref.type == "C":
-                self.prompt_add_ref_to_index(broken_ref.mine)
+                ref_name = self.ref_from_mine(mine)
+                plan.add(self.decided_action("C", ref_name, mine, theirs, policy.decide(sync_policy.ON_UNLINKED, ref_name), policy.interactive))
             elif broken_ref.type == "D":
-                self.linker.link_raw(broken_ref.theirs, broken_ref.mine)
+                plan.add(SyncAction(sync_plan.LINK, self.ref_from_mine(mine), theirs, mine, "D"))
             elif broken_ref.type == "E":
-                self.prompt_remove_ref_from_index(broken_ref.mine)
+                ref_name = self.ref_from_mine(mine)
+                plan.add(self.decided_action("E", ref_name, mine, theirs, policy.decide(sync_policy.ON_MISSING, ref_name), policy.interactive))
             elif broken_ref.type == "F":
-                ps = Pathspec(broken_ref.theirs)
-                self.ref_store.add_ref(ps)
+                ref_name = Pathspec.get_ref_from_repo(self.ref_store.get_repository(), Pathspec.from_normalized(theirs))
+                plan.add(SyncAction(sync_plan.ADD_REF, ref_name, theirs, None, "F"))
+            elif broken_ref.type == "G":
+                plan.add(SyncAction(sync_plan.ADD, self.ref_from_mine(mine), mine, theirs, "G"))
             elif broken_ref.type == "A":
                 # do this last since we only want to commit data when in a clean state
                 continue
             else:
                 raise Exception("unknown broken ref type: {0}".format(broken_ref))
-            # continue rotation of fixing this perticular ref if more actions are needed
-            # self.sync_internal([self.determine_link_status(broken_ref.ref)])
+        return plan
+
+    # action for a broken ref of type B, C or E given a decision (None if undecided)
+    def decided_action(self, broken_type, ref_name, mine, theirs, decision, interactive=False) -> SyncAction:
+        if broken_type == "B" and decision == sync_policy.MINE:
+            return SyncAction(sync_plan.RELINK, ref_name, mine, theirs, broken_type)
+        if broken_type == "B" and decision == sync_policy.THEIRS:
+            return SyncAction(sync_plan.RELINK, ref_name, theirs, mine, broken_type)
+        if broken_type == "C" and decision == sync_policy.LINK:
+            return SyncAction(sync_plan.LINK, ref_name, mine, theirs, broken_type)
+        if broken_type == "E" and decision == sync_policy.REMOVE:
+            return SyncAction(sync_plan.REMOVE_REF, ref_name, mine, theirs, broken_type)
+        kind = sync_plan.ASK if decision is None and interactive else sync_plan.SKIP
+        return SyncAction(kind, ref_name, mine, theirs, broken_type)
+
+    @staticmethod
+    def stat_signatures(mine, theirs) -> dict:
+        mine_stat, theirs_stat = probe.probe_pair((mine, theirs))
+        return {side: list(StatCache.signature(st)) if st else None for side, st in (('mine', mine_stat), ('theirs', theirs_stat))}
+
+    # Actions of a saved plan whose ref is no longer broken the same way (or for type B,
+    # where either side changed since the plan was saved) are skipped, applying them
+    # could overwrite newer content.
+    def check_saved_plan(self, plan: SyncPlan) -> SyncPlan:
+        ref_names = sorted(set(action.ref for action in plan if action.kind != sync_plan.SKIP))
+        current = self.classify_refs(ref_names, self.collect_git_state(ref_names)) if ref_names else {}
+        checked = SyncPlan()
+        for action in plan:
+            broken_ref = current.get(action.ref)
+            if action.kind == sync_plan.SKIP:
+                holds = True
+            elif broken_ref is None or broken_ref.type != action.broken_type:
+                holds = False
+            elif action.broken_type == "B":
+                holds = action.stats is not None and action.stats == self.stat_signatures(broken_ref.mine, broken_ref.theirs)
+            else:
+                holds = True
+            if holds:
+                checked.add(action)
+            else:
+                log.info("Skipping: {0} (changed since plan was saved)".format(action.ref))
+        return checked
+
+    def print_sync_plan(self, plan: SyncPlan):
+        if not len(plan):
+            log.info("{0} - Nothing to sync".format(APP))
+            return
+        log.info("{0} - Sync plan ({1} actions):".format(APP, len(plan)))
+        for line in plan.describe():
+            log.info(line)
+
+    # Applies all mechanical actions first, then asks about all undecided refs at once
+    # and applies the answers. Each step writes the index once.
+    def apply_sync_plan(self, plan: SyncPlan):
+        with self.ref_store.transaction():
+            self.apply_actions(plan.actions)
+        pending = plan.by_kind(sync_plan.ASK)
+        if pending:
+            decided = self.prompt_pending(pending)
+            with self.ref_store.transaction():
+                self.apply_actions(decided)
+
+    # index changes are made in memory, links are made in bulk on the linker worker pool
+    def apply_actions(self, actions):
+        links, relinks, adds = [], [], []
+        for action in actions:
+            if action.kind == sync_plan.LINK:
+                links.append((action.src, action.dest))
+            elif action.kind == sync_plan.RELINK:
+                relinks.append((action.src, action.dest))
+            elif action.kind == sync_plan.ADD_REF:
+                self.ref_store.add_ref(Pathspec.from_normalized(action.src))
+            elif action.kind == sync_plan.ADD:
+                adds.append(Pathspec.from_normalized(action.src))
+            elif action.kind == sync_plan.REMOVE_REF:
+                self.ref_store.remove_ref(Pathspec.from_ref(action.ref), forced=True)
+            elif action.kind == sync_plan.SKIP:
+                log.info("Skipping: {0} (type {1})".format(action.ref, action.broken_type))
+
+        for result in self.linker.link_many(links):
+            if result.ok:
+                log.info("creating link: {0}".format(result.dest))
+            else:
+                log.error("Could not link {0}: {1}".format(result.dest, result.error))
+        for result in self.linker.link_many(relinks, forced=True):
+            if not result.ok:
+                log.error("Could not relink {0}: {1}".format(result.dest, result.error))
+        if adds:
+            log.info("{0} new files in tracked directories added".format(self.add_batch(adds)))
+
+    def get_content_comparer(self) -> ContentComparer:
+        if self.content_comparer is None:
+            self.content_comparer = ContentComparer(self.config.get_digest_cache_file(), self.config.get_workers())
+        return self.content_comparer
+
+    def get_sync_policy(self) -> SyncPolicy:
+        overrides = {key: self.config.get_option(key) for key in sync_policy.CHOICES}
+        return SyncPolicy.load(self.config.get_policy_file(), overrides)
+
+    # home relative ref name of a system path
+    def ref_from_mine(self, mine) -> str:
+        return Pathspec.from_normalized(mine).get_ref()
 
     # MARK: - prompt user for input
-    
-    def prompt_remove_ref_from_index(self, mine):
-        ref_name = mine[len(os.path.expanduser("~")):]
-        if ref_name.startswith("/"):
-            ref_name = ref_name[1:]
-        log.info("Ref '{0}' is only present as a name in index (file does not exist in either system or repository). Should I remove it from the index? (Y)es/(S)kip: ".format(ref_name))
-        choice = sys.stdin.readline().rstrip().lower()
-        if choice == "s":
-            return False
-        if choice == "y":
-            self.ref_store.remove_ref(ref_name, forced=True)
-            return True
-        else:
-            print("What?")
-            return self.prompt_remove_ref_from_index(mine)
-
-    def prompt_add_ref_to_index(self, mine):
-        log.info("Ref '{0}' exists in system and index but is not linked to repository. Should I add it? (Y)es/(N)o/(S)kip: ".format(mine))
-        choice = sys.stdin.readline().rstrip().lower()
-        if choice == "s":
-            return False
-        if choice == "y":
-            self.linker.link(Pathspec(mine))
-            return True
-        if choice == "n":
-            return False
-        else:
-            print("What?")
-            return self.prompt_add_ref_to_index(mine)
-
-    def prompt_choose_ref_to_link(self, mine, theirs):
-        ref = mine
-        log.info("Unresolvable file conflict for '{0}' (exists both in system and repository). Which should I pick? (M)ine/(T)heirs/(S)kip: ".format(ref))
-        choice = sys.stdin.readline().rstrip().lower()
-        if choice == "s":
-            return False
-        if choice == "m":
-            self.linker.link_raw(mine, theirs)
-            return True
-        if choice == "t":
-            self.linker.link_raw(theirs, mine, True)
-            return True
+
+    # Lists all undecided refs and asks for all answers on one line. Falls back to asking
+    # one ref at a time if answers are not given for all. Returns the decided actions.
+    def prompt_pending(self, pending) -> [SyncAction]:
+        log.info("\n{0} refs need a decision:".format(len(pending)))
+        for n, action in enumerate(pending, 1):
+            log.info("{0}) {1}: {2} [{3}]".format(n, _PENDING_LABELS[action.broken_type], action.ref, "/".join(_ANSWERS[action.broken_type])))
+        log.info("Answer all at once (one answer per ref separated by space, e.g. \"m y s\") or press enter to answer one at a time: ")
+        line = sys.stdin.readline()
+        if not line:
+            return []
+
+        answers = line.lower().split()
+        if len(answers) == len(pending) and all(answer in _ANSWERS[action.broken_type] for action, answer in zip(pending, answers)):
+            decisions = [_ANSWERS[action.broken_type][answer] for action, answer in zip(pending, answers)]
         else:
+            if answers:
+                log.error("Expected one valid answer for each of the {0} refs, asking one at a time".format(len(pending)))
+            decisions = [self.prompt(self.question(action), _ANSWERS[action.broken_type]) for action in pending]
+
+        return [self.decided_action(action.broken_type, action.ref, action.src, action.dest, decision)
+                for action, decision in zip(pending, decisions)]
+
+    def question(self, action: SyncAction) -> str:
+        if action.broken_type == "B":
+            return "Unresolvable file conflict for '{0}' (exists both in system and repository). Which should I pick? (M)ine/(T)heirs/(S)kip: ".format(action.src)
+        if action.broken_type == "C":
+            return "Ref '{0}' exists in system and index but is not linked to repository. Should I add it? (Y)es/(N)o/(S)kip: ".format(action.src)
+        return "Ref '{0}' is only present as a name in index (file does not exist in either system or repository). Should I remove it from the index? (Y)es/(S)kip: ".format(action.ref)
+
+    # asks until one of answers is given, returns the decision mapped to it (None on end of input)
+    def prompt(self, question, answers):
+        while True:
+            log.info(question)
+            line = sys.stdin.readline()
+            if not line:
+                return None
+            choice = line.rstrip().lower()
+            if choice in answers:
+                return answers[choice]
             print("What?")
-            return self.prompt_choose_ref_to_link(mine, theirs)
-
-
-
@@ -3,9 +3,7 @@ from app import App
 from ref_store import RefStore
 from linker import Linker
 from config import Config
-import git
-
-_ERROR_GIT_NOT_INITIALIZED = "Could not initialize git repository"
+from lazy_repo import LazyRepo
 
 class AppModule(Module):
     
@@ -21,19 +19,18 @@ class AppModule(Module):
 
     @singleton
     @provider
-    def provide_git_repo(self, ref_store: RefStore) -> git.Repo:
-        repo = git.Repo(ref_store.get_repository())
-        assert not repo.bare, _ERROR_GIT_NOT_INITIALIZED
-        return repo
+    def provide_git_repo(self, ref_store: RefStore) -> LazyRepo:
+        # git is only imported and repository opened when first used
+        return LazyRepo(ref_store.get_repository())
 
     @singleton
     @provider
-    def provide_linker(self, ref_store: RefStore) -> Linker:
-        return Linker(ref_store.get_repository())
+    def provide_linker(self, config: Config, ref_store: RefStore) -> Linker:
+        return Linker(ref_store.get_repository(), config.get_workers())
 
     @singleton
     @provider
-    def provide_app(self, config: Config, ref_store: RefStore, linker: Linker, git_repo: git.Repo) -> App:
+    def provide_app(self, config: Config, ref_store: RefStore, linker: Linker, git_repo: LazyRepo) -> App:
         return App(config, ref_store, linker, git_repo)
     
     
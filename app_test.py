@@ -2,9 +2,12 @@ from pathspec import Pathspec
 import os
 import pytest
 from mockito import when, mock, unstub, ANY
+from config import Config
+from ref_store import RefStore
+from linker import Linker
 import app
 
-ACTIONS = ["list", "status", "sync", "add", "remove", "show"]
+ACTIONS = ["list", "status", "sync", "add", "remove", "show", "daemon", "watch"]
 
 def test_availableActions_shouldContainAllOf():
     trakkApp = app.App(None, None, None, None)
@@ -17,4 +20,159 @@ def test_availableActions_shouldContainAllOf():
     available_actions = app.AVAILABLE_ACTIONS
     available_actions.sort()
     assert expected_actions == available_actions, "app is missing declaration of required action"
-    
\ No newline at end of file
+    
+# MARK: - sync plan
+
+def test_decidedAction_mapsDecisionsToActions():
+    trakkApp = app.App(None, None, None, None)
+    mine, theirs = "/home/.vimrc", "/home/repo/.vimrc"
+
+    relink_mine = trakkApp.decided_action("B", ".vimrc", mine, theirs, "mine")
+    relink_theirs = trakkApp.decided_action("B", ".vimrc", mine, theirs, "theirs")
+
+    assert (relink_mine.kind, relink_mine.src, relink_mine.dest) == ("relink", mine, theirs)
+    assert (relink_theirs.kind, relink_theirs.src, relink_theirs.dest) == ("relink", theirs, mine)
+    assert trakkApp.decided_action("C", ".vimrc", mine, theirs, "link").kind == "link"
+    assert trakkApp.decided_action("E", ".vimrc", mine, theirs, "remove").kind == "remove_ref"
+    assert trakkApp.decided_action("E", ".vimrc", mine, theirs, "skip", interactive=True).kind == "skip"
+    assert trakkApp.decided_action("C", ".vimrc", mine, theirs, None, interactive=True).kind == "ask"
+    assert trakkApp.decided_action("C", ".vimrc", mine, theirs, None, interactive=False).kind == "skip"
+
+# MARK: - add
+
+def test_resolveRoots_expandsGlobsDedupesAndMergesDirs(tmpdir, monkeypatch):
+    import pathspec
+    home = str(tmpdir)
+    monkeypatch.setattr(pathspec, '_home', home)
+    os.makedirs(os.path.join(home, ".config", "nvim"))
+    for name in [".vimrc", ".zshrc", ".zprofile", ".config/nvim/init.lua"]:
+        open(os.path.join(home, name), 'w').close()
+    trakkApp = app.App(None, None, None, None)
+
+    roots = trakkApp.resolve_roots([
+        os.path.join(home, ".z*"),
+        os.path.join(home, ".config/nvim/init.lua"),
+        os.path.join(home, ".config/nvim"),
+        os.path.join(home, ".vimrc"),
+        os.path.join(home, ".vimrc"),
+        os.path.join(home, "missing"),
+    ])
+
+    assert [root.get_abs_path() for root in roots] == [
+        os.path.join(home, ".config/nvim/"),
+        os.path.join(home, ".vimrc"),
+        os.path.join(home, ".zprofile"),
+        os.path.join(home, ".zshrc"),
+    ]
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    import pathspec
+    home = str(tmpdir)
+    monkeypatch.setenv('HOME', home)
+    monkeypatch.setattr(pathspec, '_home', home)
+    os.makedirs(os.path.join(home, "repo"))
+    return home
+
+@pytest.fixture
+def add_app(home):
+    config = mock(Config)
+    when(config).read_rc().thenReturn((os.path.join(home, "repo"), [".tracked"], []))
+    when(config).write_rc(ANY, ANY, ANY)
+    when(config).get_stat_cache_file().thenReturn(None)
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+    trakkApp = app.App(config, ref_store, Linker(os.path.join(home, "repo"), 4), None)
+    trakkApp.refresh_status_snapshot = lambda: None
+    yield trakkApp
+    unstub()
+
+def make_files(home, names):
+    for name in names:
+        path = os.path.join(home, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(name)
+
+def test_iterFiles_filePathspec_yieldsItself(home, add_app):
+    make_files(home, [".vimrc"])
+    ps = Pathspec(os.path.join(home, ".vimrc"))
+
+    assert list(add_app.iter_files(ps)) == [ps]
+
+def test_add_treeLargerThanOneBatch_addsAndLinksAll(home, add_app, monkeypatch):
+    monkeypatch.setattr(app, '_ADD_BATCH_SIZE', 3)
+    names = [".config/app/f{0}".format(i) for i in range(7)] + [".config/app/sub/g"]
+    make_files(home, names)
+
+    add_app.add([os.path.join(home, ".config/app")])
+
+    assert add_app.ref_store.get_index() == sorted(names + [".tracked"])
+    assert add_app.ref_store.get_dirs() == [".config/app/"]
+    for name in names:
+        assert os.path.samefile(os.path.join(home, name), os.path.join(home, "repo", name))
+
+def test_addBatch_alreadyTracked_skipped(home, add_app):
+    make_files(home, [".tracked", ".new"])
+
+    added = add_app.add_batch([Pathspec(os.path.join(home, ".tracked")), Pathspec(os.path.join(home, ".new"))])
+
+    assert added == 1
+    assert not os.path.exists(os.path.join(home, "repo", ".tracked"))
+    assert add_app.ref_store.contains_ref_name(".new")
+
+def test_addBatch_failedLink_notAddedToIndex(home, add_app):
+    make_files(home, [".a", ".b", "repo/.b"]) # existing file in repository makes linking .b fail
+
+    added = add_app.add_batch([Pathspec(os.path.join(home, ".a")), Pathspec(os.path.join(home, ".b"))])
+
+    assert added == 1
+    assert add_app.ref_store.contains_ref_name(".a")
+    assert not add_app.ref_store.contains_ref_name(".b")
+    assert not os.path.samefile(os.path.join(home, ".b"), os.path.join(home, "repo", ".b"))
+
+# MARK: - saved sync plan
+
+def test_checkSavedPlan_changedSinceSaved_skipsAction(home, add_app):
+    import sync_plan
+    from git_state import GitState
+    from sync_plan import SyncPlan, SyncAction
+    add_app.collect_git_state = lambda refs: GitState()
+    make_files(home, [".pulled", "repo/.pulled", ".edited", "repo/.edited", ".same", "repo/.same", ".back"])
+    for name in [".pulled", ".edited", ".same", ".back"]:
+        add_app.ref_store.add_ref(Pathspec(os.path.join(home, name)))
+    def relink(name):
+        mine, theirs = os.path.join(home, name), os.path.join(home, "repo", name)
+        return SyncAction(sync_plan.RELINK, name, mine, theirs, "B", add_app.stat_signatures(mine, theirs))
+    plan = SyncPlan([
+        relink(".pulled"),
+        relink(".edited"),
+        relink(".same"),
+        SyncAction(sync_plan.REMOVE_REF, ".back", os.path.join(home, ".back"), os.path.join(home, "repo", ".back"), "E"),
+        SyncAction(sync_plan.SKIP, ".other", None, None, "C"),
+    ])
+
+    # upstream copy replaced (e.g. by git pull), system file edited in place, file back in system
+    os.remove(os.path.join(home, "repo", ".pulled"))
+    make_files(home, ["repo/.pulled"])
+    with open(os.path.join(home, ".edited"), 'a') as f:
+        f.write(" more")
+
+    checked = add_app.check_saved_plan(plan)
+
+    assert [action.ref for action in checked] == [".same", ".other"]
+
+# MARK: - status
+
+def test_daemonBrokenRefs_staleTag_notUsed(home, add_app):
+    import daemon
+    from broken_ref_type import BrokenRefType
+    from status_snapshot import StatusSnapshot
+    broken_refs = [BrokenRefType.D(os.path.join(home, ".vimrc"), os.path.join(home, "repo", ".vimrc"))]
+    when(add_app.config).get_daemon_socket_file().thenReturn(os.path.join(home, "daemon.sock"))
+    when(daemon).query_status(ANY).thenReturn(StatusSnapshot({'head': "a"}, broken_refs))
+
+    add_app.status_snapshot_tag = lambda: {'head': "a"}
+    assert add_app.daemon_broken_refs() == broken_refs
+    add_app.status_snapshot_tag = lambda: {'head': "b"}
+    assert add_app.daemon_broken_refs() is None
@@ -33,4 +33,8 @@ class BrokenRefType:
 
     @staticmethod
     def F(theirs):
-        return BrokenRefType("F", "Untracked file", None, theirs)
\ No newline at end of file
+        return BrokenRefType("F", "Untracked file", None, theirs)
+
+    @staticmethod
+    def G(mine, theirs):
+        return BrokenRefType("G", "New file in tracked directory", mine, theirs)
\ No newline at end of file
@@ -1,58 +1,126 @@
 import os
-import json
 import log
+import profiler
+from storage import JsonStorage, SqliteStorage
 
 APP = "Trakk"
 VERSION = 0.5
 
 _TRAKK_CONFIG_FILENAME = '.trakk.config'
+_TRAKK_DB_SUFFIX = '.db'
+_TRAKK_STAT_CACHE_SUFFIX = '.stat'
+_TRAKK_DIGEST_CACHE_SUFFIX = '.digests'
+_TRAKK_POLICY_SUFFIX = '.policy'
+_TRAKK_STATUS_SNAPSHOT_SUFFIX = '.status'
+_TRAKK_DAEMON_SOCKET_SUFFIX = '.sock'
+_TRAKK_DIR_CACHE_SUFFIX = '.dirs'
 
-_JSON_KEY_REPOSITORY = 'repository'
-_JSON_KEY_REFS = 'refs' # the index
-_JSON_KEY_DIRS = 'dirs' # the index of tracked dirs
+# selects storage backend for the configuration, "json" or "sqlite". When not set
+# sqlite is used if a database already exists, otherwise json.
+_ENV_STORAGE = 'TRAKK_STORAGE'
+_STORAGE_JSON = 'json'
+_STORAGE_SQLITE = 'sqlite'
+
+# number of worker threads used for parallel filesystem work, overridden by --workers
+_ENV_WORKERS = 'TRAKK_WORKERS'
+_DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+_ERROR_UNKNOWN_STORAGE = "Unknown storage backend: {0} (expected json or sqlite)"
+_ERROR_INVALID_WORKERS = "Number of workers must be a positive integer: {0}"
 
 
 # returns a path to existing repository if exists and current index
 class Config:
 
+    def __init__(self):
+        self.storage = None
+        self.workers = None
+        self.options = {}
+
     # run-configuration file
     def get_rc_file(self): 
         return os.path.join(os.path.expanduser("~"), _TRAKK_CONFIG_FILENAME)
 
-    def read_rc(self):
-        rc = self.get_rc_file()
-        log.debug("reading configuration from: " + rc)
-        if not os.path.isfile(rc):
-            return None, [], []
-
-        data = None
-        with open(rc, 'r') as f:
-            data = json.loads(f.read())
-
-        if _JSON_KEY_REPOSITORY in data:
-            repo_path = data[_JSON_KEY_REPOSITORY]
-        else:
-            repo_path = None
-        
-        if _JSON_KEY_REFS in data:
-            index = data[_JSON_KEY_REFS]
-        else:
-            index = []
-
-        if _JSON_KEY_DIRS in data:
-            dirs = data[_JSON_KEY_DIRS]
-        else:
-            dirs = []
+    # run-configuration database, used by the sqlite storage backend
+    def get_db_file(self):
+        return self.get_rc_file() + _TRAKK_DB_SUFFIX
+
+    # stat info of refs last found clean, see StatCache
+    def get_stat_cache_file(self):
+        return self.get_rc_file() + _TRAKK_STAT_CACHE_SUFFIX
+
+    # content digests of files compared during sync, see ContentComparer
+    def get_digest_cache_file(self):
+        return self.get_rc_file() + _TRAKK_DIGEST_CACHE_SUFFIX
+
+    # sync policy defaults and per directory rules, see SyncPolicy
+    def get_policy_file(self):
+        return self.get_rc_file() + _TRAKK_POLICY_SUFFIX
+
+    # broken refs found by last full status run, see StatusSnapshot
+    def get_status_snapshot_file(self):
+        return self.get_rc_file() + _TRAKK_STATUS_SNAPSHOT_SUFFIX
+
+    # listings of tracked directories, see DirTracker
+    def get_dir_cache_file(self):
+        return self.get_rc_file() + _TRAKK_DIR_CACHE_SUFFIX
 
-        log.debug("read repository path: " + repo_path)
+    # unix socket a running status daemon (--daemon) listens on
+    def get_daemon_socket_file(self):
+        return self.get_rc_file() + _TRAKK_DAEMON_SOCKET_SUFFIX
+
+    # file the index of refs is stored in by the selected storage backend
+    def get_storage_file(self):
+        return self.get_storage().path
+
+    def get_storage(self):
+        if self.storage is None:
+            kind = os.environ.get(_ENV_STORAGE)
+            if not kind:
+                kind = _STORAGE_SQLITE if os.path.isfile(self.get_db_file()) else _STORAGE_JSON
+            if kind == _STORAGE_JSON:
+                self.storage = JsonStorage(self.get_rc_file())
+            elif kind == _STORAGE_SQLITE:
+                # existing JSON configuration is migrated on first read
+                self.storage = SqliteStorage(self.get_db_file(), self.get_rc_file())
+            else:
+                raise IOError(_ERROR_UNKNOWN_STORAGE.format(kind))
+            log.debug("using %s storage", kind)
+        return self.storage
+
+    # options given on command line for the current run
+    def set_option(self, key: str, value):
+        self.options[key] = value
+
+    def get_option(self, key: str, default=None):
+        return self.options.get(key, default)
+
+    def set_workers(self, workers: int):
+        if workers < 1:
+            raise ValueError(_ERROR_INVALID_WORKERS.format(workers))
+        self.workers = workers
+
+    def get_workers(self) -> int:
+        if self.workers is None:
+            workers = os.environ.get(_ENV_WORKERS)
+            if workers:
+                self.set_workers(int(workers))
+            else:
+                self.workers = _DEFAULT_WORKERS
+        return self.workers
+
+    @profiler.timed("config.read_rc")
+    def read_rc(self):
+        storage = self.get_storage()
+        log.debug("reading configuration using: %s", type(storage).__name__)
+        repo_path, index, dirs = storage.read()
+        log.debug("read repository path: %s", repo_path)
         return repo_path, index, dirs
 
     # Writes a config file with pointer to repository. Assumes repository path have been verified for correctness
-    def write_rc(self, repo_path: str, index: [str], dirs: [str]):
-        data = {_JSON_KEY_REPOSITORY: repo_path, _JSON_KEY_REFS: index, _JSON_KEY_DIRS: dirs}
-        encoded = json.dumps(data)
-        rc = self.get_rc_file()
-        log.debug("writing configuration to: " + rc + " with repository path: " + repo_path)
-        with open(rc, 'w') as f:
-            f.write(encoded)
-
+    @profiler.timed("config.write_rc")
+    def write_rc(self, repo_path: str, index: [str], dirs: [str] = None):
+        if dirs is None:
+            dirs = []
+        log.debug("writing configuration with repository path: %s", repo_path)
+        self.get_storage().write(repo_path, index, dirs)
@@ -1,5 +1,6 @@
 from mockito import when, mock, unstub
 from config import Config
+from storage import SqliteStorage
 import os
 
 def test_readAndWriteRC(tmpdir):
@@ -19,3 +20,45 @@ def test_rcName(tmpdir):
     c = Config()
     rc_name = os.path.basename(c.get_rc_file())
     assert rc_name == ".trakk.config"
+
+def test_readRC_noConfig_returnsEmpty(tmpdir):
+    c = Config()
+    when(c).get_rc_file().thenReturn(os.path.join(tmpdir, "dummy-rc-file"))
+    assert c.read_rc() == (None, [], [])
+    unstub()
+
+def test_readAndWriteRC_sqlite(tmpdir, monkeypatch):
+    monkeypatch.setenv("TRAKK_STORAGE", "sqlite")
+    c = Config()
+    when(c).get_rc_file().thenReturn(os.path.join(tmpdir, "dummy-rc-file"))
+    c.write_rc("some/repo/path", ["b/ref", "a/ref"], ["a/dir_ref"])
+    c.write_rc("some/repo/path", ["b/ref", "c/ref"], [])
+
+    repo_path, index, dirs = SqliteStorage(c.get_db_file()).read()
+
+    assert repo_path == "some/repo/path"
+    assert index == ["b/ref", "c/ref"]
+    assert dirs == []
+    unstub()
+
+def test_sqlite_existingJsonConfig_isMigrated(tmpdir, monkeypatch):
+    rc_file = os.path.join(tmpdir, "dummy-rc-file")
+    json_config = Config()
+    when(json_config).get_rc_file().thenReturn(rc_file)
+    json_config.write_rc("some/repo/path", ["a/ref", "b/ref"], ["a/dir_ref"])
+
+    monkeypatch.setenv("TRAKK_STORAGE", "sqlite")
+    c = Config()
+    when(c).get_rc_file().thenReturn(rc_file)
+    repo_path, index, dirs = c.read_rc()
+
+    assert (repo_path, index, dirs) == ("some/repo/path", ["a/ref", "b/ref"], ["a/dir_ref"])
+    assert os.path.isfile(c.get_db_file())
+    assert not os.path.isfile(rc_file)
+
+    # database is picked up without having to select storage again
+    monkeypatch.delenv("TRAKK_STORAGE")
+    c = Config()
+    when(c).get_rc_file().thenReturn(rc_file)
+    assert c.read_rc() == ("some/repo/path", ["a/ref", "b/ref"], ["a/dir_ref"])
+    unstub()
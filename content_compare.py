@@ -0,0 +1,134 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import json
+import time
+import mmap
+import hashlib
+import log
+from workers import map_parallel
+
+# ContentComparer - decides if pairs of files have identical content
+#
+# Sizes are compared first, only files of equal size are hashed. Files are read through
+# mmap and hashed on a worker pool (hashlib releases the GIL while hashing large buffers).
+# Digests are cached by (dev, inode, mtime_ns, size), so files not modified since the
+# last run are not read again. Files modified within _RACY_WINDOW_NS of being hashed are
+# not cached: a same size change within the mtime granularity would keep the same key
+# (same reasoning as StatCache).
+
+_CACHE_VERSION = 1
+_KEY_VERSION = 'version'
+_KEY_DIGESTS = 'digests'
+
+# when cache grows larger than this, digests not used in current run are dropped on save
+_MAX_CACHE_ENTRIES = 100000
+
+_RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+def _cache_key(stat) -> str:
+    return "{0}:{1}:{2}:{3}".format(stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        # mmap can not map empty files
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+    return digest.hexdigest()
+
+class ContentComparer:
+
+    # cache_path may be None, digests are then only cached in memory
+    def __init__(self, cache_path: str = None, workers: int = 1):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.digests = None
+        self.used = set()
+        self.dirty = False
+
+    def load(self):
+        if self.digests is not None:
+            return
+        self.digests = {}
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.loads(f.read())
+            if data.get(_KEY_VERSION) == _CACHE_VERSION:
+                self.digests = dict(data[_KEY_DIGESTS])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("discarding unreadable digest cache: %s", e)
+            self.digests = {}
+
+    # digests for (path, stat) items, in same order. Only files not in cache are read
+    def digest_many(self, items) -> [str]:
+        self.load()
+        keys = [_cache_key(stat) for _, stat in items]
+        missing = {}
+        for (path, stat), key in zip(items, keys):
+            if key not in self.digests and key not in missing:
+                missing[key] = (path, stat)
+
+        uncached = {} # digests of racy files, only used in this call
+        if missing:
+            log.debug("hashing %s files", len(missing))
+            racy_limit = time.time_ns() - _RACY_WINDOW_NS
+            computed = map_parallel(self.try_digest, [path for path, _ in missing.values()], self.workers, min_parallel=2)
+            for (key, (_, stat)), digest in zip(missing.items(), computed):
+                if digest is None:
+                    continue
+                if stat.st_mtime_ns >= racy_limit:
+                    uncached[key] = digest
+                else:
+                    self.digests[key] = digest
+                    self.dirty = True
+
+        self.used.update(keys)
+        return [self.digests.get(key, uncached.get(key)) for key in keys]
+
+    def try_digest(self, path):
+        try:
+            return file_digest(path)
+        except (OSError, ValueError) as e:
+            log.debug("could not hash %s: %s", path, e)
+            return None
+
+    # True for pairs of (mine, theirs) paths with identical content, in same order as pairs
+    def compare_many(self, pairs) -> [bool]:
+        results = [False] * len(pairs)
+        to_hash = [] # indexes of pairs with equal sizes
+        items = []
+        for i, (mine, theirs) in enumerate(pairs):
+            try:
+                mine_stat, theirs_stat = os.stat(mine), os.stat(theirs)
+            except OSError:
+                continue
+            if mine_stat.st_size != theirs_stat.st_size:
+                continue
+            to_hash.append(i)
+            items.append((mine, mine_stat))
+            items.append((theirs, theirs_stat))
+
+        digests = self.digest_many(items)
+        for n, i in enumerate(to_hash):
+            mine_digest, theirs_digest = digests[2 * n], digests[2 * n + 1]
+            results[i] = mine_digest is not None and mine_digest == theirs_digest
+        return results
+
+    def compare(self, mine: str, theirs: str) -> bool:
+        return self.compare_many([(mine, theirs)])[0]
+
+    def save(self):
+        if not self.dirty or not self.cache_path:
+            return
+        digests = self.digests
+        if len(digests) > _MAX_CACHE_ENTRIES:
+            digests = {key: digest for key, digest in digests.items() if key in self.used}
+        data = {_KEY_VERSION: _CACHE_VERSION, _KEY_DIGESTS: digests}
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(data))
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
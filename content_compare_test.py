@@ -0,0 +1,74 @@
+import os
+from mockito import when, unstub, verify, ANY
+import content_compare
+from content_compare import ContentComparer
+
+def write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+# modified well before racy window
+def backdate(*paths):
+    for path in paths:
+        os.utime(path, (1000000000, 1000000000))
+
+def test_compareMany_identicalDifferentAndMissing(tmpdir):
+    paths = {name: os.path.join(tmpdir, name) for name in ["a", "b", "c", "d", "e", "f"]}
+    write(paths["a"], "same")
+    write(paths["b"], "same")
+    write(paths["c"], "diff")
+    write(paths["d"], "different length")
+    write(paths["e"], "")
+    write(paths["f"], "")
+
+    comparer = ContentComparer(workers=4)
+    result = comparer.compare_many([
+        (paths["a"], paths["b"]),
+        (paths["a"], paths["c"]),
+        (paths["a"], paths["d"]),
+        (paths["e"], paths["f"]),
+        (paths["a"], os.path.join(tmpdir, "missing")),
+    ])
+
+    assert result == [True, False, False, True, False]
+
+def test_compare_differentSizes_notHashed(tmpdir):
+    write(os.path.join(tmpdir, "a"), "short")
+    write(os.path.join(tmpdir, "b"), "much longer")
+    when(content_compare).file_digest(ANY).thenReturn("digest")
+
+    assert not ContentComparer().compare(os.path.join(tmpdir, "a"), os.path.join(tmpdir, "b"))
+    verify(content_compare, times=0).file_digest(ANY)
+    unstub()
+
+def test_compare_cachedDigests_notReadAgain(tmpdir):
+    cache_path = os.path.join(tmpdir, "digests")
+    a, b = os.path.join(tmpdir, "a"), os.path.join(tmpdir, "b")
+    write(a, "same")
+    write(b, "same")
+    backdate(a, b)
+    comparer = ContentComparer(cache_path)
+    assert comparer.compare(a, b)
+    comparer.save()
+
+    when(content_compare).file_digest(ANY).thenReturn("digest")
+    assert ContentComparer(cache_path).compare(a, b)
+    verify(content_compare, times=0).file_digest(ANY)
+    unstub()
+
+def test_compare_recentlyModified_digestNotCached(tmpdir):
+    cache_path = os.path.join(tmpdir, "digests")
+    a, b = os.path.join(tmpdir, "a"), os.path.join(tmpdir, "b")
+    write(a, "same")
+    write(b, "same")
+    backdate(a)
+    comparer = ContentComparer(cache_path)
+    assert comparer.compare(a, b)
+    comparer.save()
+
+    # same size change keeping the same mtime (within mtime granularity)
+    st = os.stat(b)
+    write(b, "diff")
+    os.utime(b, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert not ContentComparer(cache_path).compare(a, b)
@@ -0,0 +1,273 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import time
+import errno
+import select
+import signal
+import socket
+import contextlib
+import log
+import inotify
+import git_head
+from git_state import GitState
+from pathspec import home
+from status_snapshot import StatusSnapshot
+
+# StatusDaemon - keeps broken refs live and answers status queries over a unix socket
+#
+# On start a full status is run. After that inotify events on directories holding tracked
+# files (in system and repository) are collected and, once a burst of events has settled,
+# only refs named by the events are classified again. Changes in .git (commit, checkout,
+# git add) refresh git state and reclassify refs whose git status changed. A change of
+# the trakk configuration (e.g. --add from another shell) reloads everything.
+#
+# Protocol: client connects, sends "status\n" and reads the broken refs encoded as a
+# status snapshot (see StatusSnapshot) until the daemon closes the connection. The snapshot
+# is tagged with the git state and configuration the broken refs were computed from (see
+# status_snapshot.current_tag), a client seeing another tag has changes the daemon has not
+# handled yet and should not trust the answer.
+
+_REQUEST_STATUS = b"status"
+_MAX_REQUEST_BYTES = 64
+_CLIENT_TIMEOUT_SECONDS = 1.0
+
+# events are handled once none has arrived for this long
+_DEBOUNCE_SECONDS = 0.05
+
+# entries in .git that tell git state may have changed (lock files, objects, logs do not)
+_GIT_STATE_FILES = ('HEAD', 'index', 'packed-refs')
+_GIT_REFS_DIR = 'refs'
+_GIT_LOCK_SUFFIX = '.lock'
+
+_ERROR_ALREADY_RUNNING = "A status daemon is already running on: {0}"
+
+
+class _Stopped(Exception):
+    pass
+
+def _stop(signum, frame):
+    raise _Stopped()
+
+
+# status snapshot from a running daemon or None if no daemon answers
+def query_status(socket_path: str, timeout: float = _CLIENT_TIMEOUT_SECONDS):
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall(_REQUEST_STATUS + b"\n")
+            chunks = []
+            for chunk in iter(lambda: client.recv(65536), b''):
+                chunks.append(chunk)
+        snapshot = StatusSnapshot.from_json(b''.join(chunks).decode())
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log.debug("no status daemon: %s", e)
+        return None
+    return snapshot
+
+
+class StatusDaemon:
+
+    def __init__(self, app, socket_path: str):
+        self.app = app
+        self.ref_store = app.ref_store
+        self.socket_path = socket_path
+        self.notify = None
+        self.repo = None
+        self.git_dir = None
+        self.storage_file = None
+        self.broken = {} # <repository> relative ref name -> broken ref
+        self.git_state = None
+        self.tag = {} # status snapshot tag of what broken refs were computed from
+        self.pending = []
+        self.deadline = None
+
+    def run(self):
+        signal.signal(signal.SIGTERM, _stop)
+        with inotify.Inotify() as notify, self.listen() as server:
+            self.notify = notify
+            self.reload()
+            log.info("Status daemon listening on: {0}".format(self.socket_path))
+            try:
+                self.loop(server)
+            except (_Stopped, KeyboardInterrupt):
+                log.info("Status daemon stopped")
+
+    def loop(self, server):
+        notify = self.notify
+        while True:
+            # blocks without timeout when there is nothing to do
+            timeout = None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+            readable, _, _ = select.select([notify, server], [], [], timeout)
+            if notify in readable:
+                self.pending.extend(notify.read_events())
+                self.deadline = time.monotonic() + _DEBOUNCE_SECONDS
+            if self.deadline is not None and (server in readable or time.monotonic() >= self.deadline):
+                self.process()
+            if server in readable:
+                self.serve(server)
+
+    @contextlib.contextmanager
+    def listen(self):
+        if query_status(self.socket_path) is not None:
+            raise OSError(_ERROR_ALREADY_RUNNING.format(self.socket_path))
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path) # left behind by a daemon that did not exit cleanly
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            old_umask = os.umask(0o077)
+            try:
+                server.bind(self.socket_path)
+            finally:
+                os.umask(old_umask)
+            server.listen()
+            yield server
+        finally:
+            server.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+
+    def serve(self, server):
+        try:
+            connection, _ = server.accept()
+        except OSError:
+            return
+        with connection:
+            try:
+                connection.settimeout(_CLIENT_TIMEOUT_SECONDS)
+                request = connection.recv(_MAX_REQUEST_BYTES).strip()
+                if request == _REQUEST_STATUS:
+                    connection.sendall(StatusSnapshot(self.tag, self.broken_refs()).to_json().encode())
+            except OSError as e:
+                log.debug("status query failed: %s", e)
+
+    def broken_refs(self):
+        return list(self.broken.values())
+
+    # MARK: - state
+
+    def reload(self):
+        self.ref_store.reload()
+        self.repo = self.ref_store.get_repository()
+        self.git_dir = git_head.git_dir(self.repo)
+        self.storage_file = self.app.config.get_storage_file()
+        self.git_state = self.app.collect_git_state(self.ref_store.get_index())
+        self.broken = {self.ref_name(ref): ref for ref in self.app.get_broken_refs(self.git_state)}
+        self.tag = self.app.status_snapshot_tag()
+        self.update_watches()
+        log.debug("daemon reloaded, %s broken refs", len(self.broken))
+
+    def ref_name(self, broken_ref) -> str:
+        return os.path.relpath(broken_ref.theirs, self.repo)
+
+    # directories to watch: parents of tracked files in system, all of repository and git state
+    def wanted_watches(self) -> set:
+        user_home = home()
+        wanted = {user_home, self.git_dir}
+        for ref_name in self.ref_store.get_index():
+            mine, _ = self.app.mine_theirs_from_ref(ref_name)
+            # nearest existing parent, creating missing directories is then seen
+            directory = os.path.dirname(mine)
+            while not os.path.isdir(directory) and directory.startswith(user_home + os.sep):
+                directory = os.path.dirname(directory)
+            wanted.add(directory)
+        # tracked directories in system, new files in them are reported
+        tops = [os.path.join(user_home, dir_name.rstrip("/")) for dir_name in self.ref_store.get_dirs()]
+        for top in [self.repo, os.path.join(self.git_dir, _GIT_REFS_DIR)] + tops:
+            for directory, dirs, _ in os.walk(top):
+                if directory == self.repo:
+                    dirs[:] = [name for name in dirs if name != '.git']
+                wanted.add(directory)
+        return wanted
+
+    def update_watches(self):
+        wanted = self.wanted_watches()
+        for path in list(self.notify.watches):
+            if path not in wanted:
+                self.notify.remove_watch(path)
+        for path in wanted - set(self.notify.watches):
+            try:
+                self.notify.add_watch(path)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    log.error("inotify watch limit reached (fs.inotify.max_user_watches), not watching: {0}".format(path))
+                else:
+                    log.debug("could not watch %s: %s", path, e)
+
+    # MARK: - events
+
+    def process(self):
+        events, self.pending, self.deadline = self.pending, [], None
+        affected = set()
+        git_changed = False
+        dirs_changed = False
+
+        for event in events:
+            path = event.path
+            if event.mask & inotify.IN_Q_OVERFLOW or path == self.storage_file:
+                log.debug("daemon reloading after: %s", event)
+                self.reload()
+                return
+            if self.is_in(path, self.git_dir):
+                git_changed = git_changed or self.is_git_state_change(path)
+                dirs_changed = dirs_changed or event.is_dir()
+                continue
+
+            if event.is_dir() or event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+                dirs_changed = True
+                affected.update(self.refs_under(path))
+            if self.is_in(path, self.repo):
+                affected.add(os.path.relpath(path, self.repo))
+            elif self.is_in(path, home()):
+                ref_name = os.path.relpath(path, home())
+                if self.ref_store.contains_ref_name(ref_name) or self.ref_store.in_tracked_dir(ref_name):
+                    affected.add(ref_name)
+
+        if dirs_changed:
+            self.update_watches()
+
+        if git_changed:
+            old_changes = self.git_state.untracked | self.git_state.changed_paths()
+            self.git_state = self.app.collect_git_state(self.ref_store.get_index())
+            affected.update(old_changes ^ (self.git_state.untracked | self.git_state.changed_paths()))
+        elif affected:
+            self.git_state.update(GitState.collect(self.app.git_repo, sorted(affected)), affected)
+
+        if affected:
+            for ref_name, broken_ref in self.app.classify_refs(sorted(affected), self.git_state).items():
+                if broken_ref:
+                    self.broken[ref_name] = broken_ref
+                else:
+                    self.broken.pop(ref_name, None)
+            log.debug("daemon reclassified %s refs", len(affected))
+        # read after collecting, git status may refresh .git/index
+        self.tag = self.app.status_snapshot_tag()
+
+    # refs (tracked, broken, files in repository or in tracked directories) below a created,
+    # moved or deleted directory
+    def refs_under(self, path: str):
+        if self.is_in(path, self.repo):
+            base = self.repo
+        elif self.is_in(path, home()):
+            base = home()
+        else:
+            return set()
+        prefix = os.path.relpath(path, base) + "/"
+        refs = set(self.ref_store.get_refs_under(prefix))
+        refs.update(ref for ref in self.broken if ref.startswith(prefix))
+        if os.path.isdir(path) and (base == self.repo or self.ref_store.in_tracked_dir(prefix)):
+            for directory, _, files in os.walk(path):
+                refs.update(os.path.relpath(os.path.join(directory, name), base) for name in files)
+        return refs
+
+    def is_git_state_change(self, path: str) -> bool:
+        if path.endswith(_GIT_LOCK_SUFFIX):
+            return False
+        rel_path = os.path.relpath(path, self.git_dir)
+        return rel_path in _GIT_STATE_FILES or rel_path.startswith(_GIT_REFS_DIR + os.sep)
+
+    @staticmethod
+    def is_in(path: str, directory: str) -> bool:
+        return path == directory or path.startswith(directory + os.sep)
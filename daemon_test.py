@@ -0,0 +1,140 @@
+import os
+import socket
+import subprocess
+import threading
+import pytest
+import daemon
+import inotify
+from app import App
+from config import Config
+from ref_store import RefStore
+from linker import Linker
+from lazy_repo import LazyRepo
+from broken_ref_type import BrokenRefType
+from status_snapshot import StatusSnapshot
+from daemon import StatusDaemon
+
+def test_queryStatus_noDaemon_returnsNone(tmpdir):
+    assert daemon.query_status(os.path.join(tmpdir, "missing.sock")) is None
+
+def test_queryStatus_staleSocketFile_returnsNone(tmpdir):
+    path = os.path.join(tmpdir, "stale.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.close()
+
+    assert daemon.query_status(path) is None
+
+def test_queryStatus_decodesBrokenRefs(tmpdir):
+    path = os.path.join(tmpdir, "daemon.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+
+    def answer():
+        connection, _ = server.accept()
+        with connection:
+            assert connection.recv(64).strip() == b"status"
+            connection.sendall(StatusSnapshot({}, [BrokenRefType.D("/home/.vimrc", "/repo/.vimrc")]).to_json().encode())
+    thread = threading.Thread(target=answer)
+    thread.start()
+
+    snapshot = daemon.query_status(path)
+    thread.join()
+    server.close()
+
+    assert [(ref.type, ref.theirs) for ref in snapshot.broken_refs] == [("D", "/repo/.vimrc")]
+
+# MARK: - processing events
+
+class FakeNotify:
+
+    def __init__(self):
+        self.watches = {}
+
+    def add_watch(self, path):
+        self.watches[path] = len(self.watches) + 1
+
+    def remove_watch(self, path):
+        del self.watches[path]
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    import pathspec
+    home = str(tmpdir)
+    monkeypatch.setenv('HOME', home)
+    monkeypatch.setattr(pathspec, '_home', home)
+    for name in ['GIT_AUTHOR_NAME', 'GIT_COMMITTER_NAME']:
+        monkeypatch.setenv(name, "test")
+    for name in ['GIT_AUTHOR_EMAIL', 'GIT_COMMITTER_EMAIL']:
+        monkeypatch.setenv(name, "test@example.com")
+    return home
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", repo] + list(args), check=True, stdout=subprocess.DEVNULL)
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+# repository with linked and committed .vimrc and tracked directory .config/app/, and a
+# daemon that has loaded it (without inotify)
+@pytest.fixture
+def status_daemon(home):
+    repo = os.path.join(home, "repo")
+    git(home, "init", "-q", repo)
+    for name in [".vimrc", ".config/app/settings"]:
+        write(os.path.join(home, name), "original")
+        os.makedirs(os.path.dirname(os.path.join(repo, name)), exist_ok=True)
+        os.link(os.path.join(home, name), os.path.join(repo, name))
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "initial")
+    config = Config()
+    config.write_rc(repo, [".config/app/settings", ".vimrc"], [".config/app/"])
+    ref_store = RefStore(config)
+    ref_store.reload()
+    app = App(config, ref_store, Linker(repo), LazyRepo(repo))
+    status_daemon = StatusDaemon(app, config.get_daemon_socket_file())
+    status_daemon.notify = FakeNotify()
+    status_daemon.reload()
+    assert status_daemon.broken_refs() == []
+    return status_daemon
+
+def process(status_daemon, path, mask):
+    status_daemon.pending = [inotify.Event(1, mask, 0, path)]
+    status_daemon.process()
+    return {ref_name: ref.type for ref_name, ref in status_daemon.broken.items()}
+
+def test_process_trackedFileModified_reportsUncommittedChanges(home, status_daemon):
+    write(os.path.join(home, ".vimrc"), "modified in place")
+
+    assert process(status_daemon, os.path.join(home, ".vimrc"), inotify.IN_CLOSE_WRITE) == {".vimrc": "A"}
+
+def test_process_newFileInTrackedDir_reportsNewFile(home, status_daemon):
+    write(os.path.join(home, ".config/app/new"), "new")
+
+    assert process(status_daemon, os.path.join(home, ".config/app/new"), inotify.IN_CREATE) == {".config/app/new": "G"}
+
+def test_process_gitIndexChanged_reclassifiesRefs(home, status_daemon):
+    repo = status_daemon.repo
+    git(repo, "rm", "-q", "--cached", ".vimrc")
+
+    assert process(status_daemon, os.path.join(repo, ".git", "index"), inotify.IN_MOVED_TO) == {".vimrc": "A"}
+    assert status_daemon.tag == status_daemon.app.status_snapshot_tag()
+
+def test_process_storageFileRewritten_reloads(home, status_daemon):
+    status_daemon.app.config.write_rc(status_daemon.repo, [".config/app/settings"], [".config/app/"])
+
+    assert process(status_daemon, status_daemon.storage_file, inotify.IN_CLOSE_WRITE) == {".vimrc": "F"}
+    assert status_daemon.tag == status_daemon.app.status_snapshot_tag()
+
+def test_process_lockFileInGit_ignored(home, status_daemon):
+    write(os.path.join(status_daemon.repo, ".git", "index.lock"), "")
+
+    assert process(status_daemon, os.path.join(status_daemon.repo, ".git", "index.lock"), inotify.IN_CREATE) == {}
+
+def test_process_trackedDirMoved_reportsRefsUnder(home, status_daemon):
+    os.rename(os.path.join(home, ".config/app"), os.path.join(home, ".config/moved"))
+
+    assert process(status_daemon, os.path.join(home, ".config/app"), inotify.IN_MOVED_FROM | inotify.IN_ISDIR) == {".config/app/settings": "D"}
@@ -0,0 +1,113 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import json
+import time
+import log
+
+# DirTracker - lists files below tracked directories, re-reading only directories that changed
+#
+# For every directory below a tracked directory (in system) its mtime and the names of its
+# files and subdirectories are recorded. A directory's mtime changes whenever an entry is
+# created, removed or renamed in it, so as long as the mtime is the same the recorded
+# entries are still valid and the directory is not listed again. Finding all files below
+# a tracked directory then costs one stat per directory instead of a full walk.
+#
+# Listings taken within _RACY_WINDOW_NS of the directory mtime are not trusted on the next
+# run, an entry added in the same mtime granularity could otherwise go unnoticed.
+
+_CACHE_VERSION = 1
+_KEY_VERSION = 'version'
+_KEY_DIRS = 'dirs'
+
+_RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+class DirTracker:
+
+    # path may be None, listings are then only kept in memory
+    def __init__(self, path: str = None):
+        self.path = path
+        self.dirs = None # abs dir path -> [mtime_ns, listed_ns, files, subdirs]
+        self.visited = set()
+        self.dirty = False
+        self.listed = 0 # directories listed (not answered from cache) in this run
+
+    def load(self):
+        if self.dirs is not None:
+            return
+        self.dirs = {}
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.loads(f.read())
+            if data.get(_KEY_VERSION) == _CACHE_VERSION:
+                self.dirs = data[_KEY_DIRS]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("discarding unreadable directory cache: %s", e)
+            self.dirs = {}
+
+    # file paths below root, relative root and using "/" separators. Symlinked dirs are not followed
+    def list_files(self, root: str) -> [str]:
+        self.load()
+        root = root.rstrip("/")
+        files = []
+        stack = [("", root)]
+        while stack:
+            rel_dir, path = stack.pop()
+            entry = self.entries(path)
+            if entry is None:
+                continue
+            _, _, names, subdirs = entry
+            prefix = rel_dir + "/" if rel_dir else ""
+            files.extend(prefix + name for name in names)
+            stack.extend((prefix + name, path + "/" + name) for name in subdirs)
+        return files
+
+    # [mtime_ns, listed_ns, files, subdirs] of directory, from cache if unchanged. None if not a directory
+    def entries(self, path: str):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self.drop(path)
+            return None
+        self.visited.add(path)
+        cached = self.dirs.get(path)
+        if cached and cached[0] == mtime_ns and cached[1] - mtime_ns >= _RACY_WINDOW_NS:
+            return cached
+
+        names, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for dir_entry in it:
+                    try:
+                        is_dir = dir_entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    (subdirs if is_dir else names).append(dir_entry.name)
+        except OSError as e:
+            log.debug("skipping unreadable directory: %s", e)
+            return None
+        entry = [mtime_ns, time.time_ns(), sorted(names), sorted(subdirs)]
+        self.dirs[path] = entry
+        self.dirty = True
+        self.listed += 1
+        return entry
+
+    def drop(self, path: str):
+        if self.dirs.pop(path, None) is not None:
+            self.dirty = True
+
+    # directories not visited in this run (no longer tracked or removed) are dropped
+    def save(self):
+        if self.dirs is None or not self.path:
+            return
+        stale = [path for path in self.dirs if path not in self.visited]
+        for path in stale:
+            del self.dirs[path]
+        if not self.dirty and not stale:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({_KEY_VERSION: _CACHE_VERSION, _KEY_DIRS: self.dirs}))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
@@ -0,0 +1,51 @@
+import os
+import time
+from dir_tracker import DirTracker
+
+_OLD_NS = time.time_ns() - 60 * 1000 * 1000 * 1000
+
+def make_tree(root, files):
+    for name in files:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+    # directories modified long ago, so their listings are trusted
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, ns=(_OLD_NS, _OLD_NS))
+
+def test_listFiles_allFilesRelativeToRoot(tmpdir):
+    root = str(tmpdir.join("nvim"))
+    make_tree(root, ["init.lua", "lua/a.lua", "lua/deep/b.lua"])
+
+    assert sorted(DirTracker().list_files(root)) == ["init.lua", "lua/a.lua", "lua/deep/b.lua"]
+
+def test_listFiles_unchangedDirs_notListedAgain(tmpdir):
+    root = str(tmpdir.join("nvim"))
+    cache = str(tmpdir.join("cache"))
+    make_tree(root, ["init.lua", "lua/a.lua", "other/c.lua"])
+    first = DirTracker(cache)
+    first.list_files(root)
+    first.save()
+
+    open(os.path.join(root, "lua", "new.lua"), 'w').close()
+    second = DirTracker(cache)
+    files = second.list_files(root)
+
+    assert "lua/new.lua" in files
+    assert second.listed == 1
+
+def test_listFiles_removedDir_droppedFromCache(tmpdir):
+    root = str(tmpdir.join("nvim"))
+    cache = str(tmpdir.join("cache"))
+    make_tree(root, ["lua/a.lua"])
+    first = DirTracker(cache)
+    first.list_files(root)
+    first.save()
+
+    os.remove(os.path.join(root, "lua", "a.lua"))
+    os.rmdir(os.path.join(root, "lua"))
+    second = DirTracker(cache)
+
+    assert second.list_files(root) == []
+    second.save()
+    assert os.path.join(root, "lua") not in second.dirs
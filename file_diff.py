@@ -0,0 +1,145 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import sys
+import shlex
+import re
+import difflib
+import hashlib
+import itertools
+import collections
+import subprocess
+import contextlib
+
+# Memory bounded diff output for --show.
+#
+# Text files up to _MAX_DIFF_BYTES are shown as a unified diff. Larger text files are
+# streamed past their common beginning and a unified diff is shown for a window of at
+# most _WINDOW_LINES lines (_WINDOW_BYTES bytes) of each side from the first difference,
+# followed by a note that the diff was truncated if more content follows. Lines longer
+# than _CHUNK_BYTES are read (and counted) in pieces so memory stays bounded. Binary files
+# (a NUL byte within the first _BINARY_SNIFF_BYTES) are never printed, instead size and
+# digest of each side are shown. Files present on one side only are streamed in full.
+
+_BINARY_SNIFF_BYTES = 8192
+_MAX_DIFF_BYTES = 1024 * 1024
+_CHUNK_BYTES = 64 * 1024
+_WINDOW_LINES = 1000
+_WINDOW_BYTES = 256 * 1024
+_CONTEXT_LINES = 3
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@')
+_TRUNCATED = "... diff truncated after line {0} of theirs and line {1} of mine, files too large for a full diff\n"
+
+_DEFAULT_PAGER = 'less -R'
+
+def is_binary(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return b'\0' in f.read(_BINARY_SNIFF_BYTES)
+
+# "<size> bytes, sha256 <digest>" read in chunks
+def summary(path: str) -> str:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_BYTES), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return "{0} bytes, sha256 {1}".format(size, digest.hexdigest())
+
+def _open_text(path: str):
+    return open(path, 'r', errors='replace')
+
+# writes a diff from theirs (repository) to mine (system), either may be None if missing
+def write_diff(mine: str, theirs: str, out):
+    out.write("--- theirs: {0}\n".format(theirs if theirs else "<ref not present in repository>"))
+    out.write("+++ mine: {0}\n".format(mine if mine else "<ref not present in system>"))
+
+    if not mine or not theirs:
+        present, marker = (mine, "+") if mine else (theirs, "-")
+        if is_binary(present):
+            out.write("Binary file: {0}\n".format(summary(present)))
+            return
+        with _open_text(present) as f:
+            for line in f:
+                out.write(marker + line)
+        return
+
+    if is_binary(mine) or is_binary(theirs):
+        out.write("Binary files differ\n")
+        out.write("theirs: {0}\n".format(summary(theirs)))
+        out.write("mine:   {0}\n".format(summary(mine)))
+        return
+
+    if os.path.getsize(mine) <= _MAX_DIFF_BYTES and os.path.getsize(theirs) <= _MAX_DIFF_BYTES:
+        with _open_text(theirs) as theirs_file, _open_text(mine) as mine_file:
+            theirs_lines, mine_lines = theirs_file.readlines(), mine_file.readlines()
+        _write_lines(itertools.islice(difflib.unified_diff(theirs_lines, mine_lines, n=_CONTEXT_LINES), 2, None), out)
+        return
+
+    write_truncated_diff(mine, theirs, out)
+
+def _write_lines(lines, out):
+    for line in lines:
+        out.write(line if line.endswith("\n") else line + "\n")
+
+def _read_chunks(f):
+    return iter(lambda: f.readline(_CHUNK_BYTES), '')
+
+# up to _WINDOW_LINES lines or _WINDOW_BYTES bytes starting with first, and whether more follows
+def _read_window(first, chunks):
+    lines = [first] if first is not None else []
+    size = len(first) if first is not None else 0
+    for line in chunks:
+        if len(lines) >= _WINDOW_LINES or size >= _WINDOW_BYTES:
+            return lines, True
+        lines.append(line)
+        size += len(line)
+    return lines, False
+
+# streams both files past their common beginning and diffs a bounded window from the first difference
+def write_truncated_diff(mine: str, theirs: str, out):
+    out.write("theirs: {0}\n".format(summary(theirs)))
+    out.write("mine:   {0}\n".format(summary(mine)))
+    with _open_text(theirs) as theirs_file, _open_text(mine) as mine_file:
+        theirs_chunks, mine_chunks = _read_chunks(theirs_file), _read_chunks(mine_file)
+        context = collections.deque(maxlen=_CONTEXT_LINES)
+        line_number = 0
+        for theirs_line, mine_line in itertools.zip_longest(theirs_chunks, mine_chunks):
+            if theirs_line != mine_line:
+                break
+            context.append(theirs_line)
+            line_number += 1
+        else:
+            out.write("Files have identical content\n")
+            return
+
+        theirs_lines, theirs_more = _read_window(theirs_line, theirs_chunks)
+        mine_lines, mine_more = _read_window(mine_line, mine_chunks)
+
+    # hunk headers count from the first context line, shift them to line numbers in the files
+    offset = line_number - len(context)
+    def shift(match):
+        return "@@ -{0}{1} +{2}{3} @@".format(int(match.group(1)) + offset, match.group(2) or "",
+                                             int(match.group(3)) + offset, match.group(4) or "")
+    diff = difflib.unified_diff(list(context) + theirs_lines, list(context) + mine_lines, n=_CONTEXT_LINES)
+    _write_lines((_HUNK_HEADER.sub(shift, line) for line in itertools.islice(diff, 2, None)), out)
+    if theirs_more or mine_more:
+        out.write(_TRUNCATED.format(line_number + len(theirs_lines), line_number + len(mine_lines)))
+
+# Stream to write output to. With paging enabled output goes through $PAGER (default
+# "less -R") when stdout is a terminal, otherwise it is written to stdout directly.
+@contextlib.contextmanager
+def output(paged: bool = False):
+    if not paged or not sys.stdout.isatty():
+        yield sys.stdout
+        return
+
+    pager = subprocess.Popen(shlex.split(os.environ.get('PAGER') or _DEFAULT_PAGER), stdin=subprocess.PIPE, text=True, errors='replace')
+    try:
+        yield pager.stdin
+    except BrokenPipeError:
+        pass # pager closed before all output was written
+    finally:
+        with contextlib.suppress(BrokenPipeError):
+            pager.stdin.close()
+        pager.wait()
@@ -0,0 +1,77 @@
+import io
+import os
+import file_diff
+
+def write(tmpdir, name, content):
+    path = os.path.join(tmpdir, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def test_writeDiff_textFiles_unifiedDiff(tmpdir):
+    mine = write(tmpdir, "mine", b"a\nb\nc\n")
+    theirs = write(tmpdir, "theirs", b"a\nx\nc\n")
+    out = io.StringIO()
+
+    file_diff.write_diff(mine, theirs, out)
+
+    lines = out.getvalue().splitlines()
+    assert "-x" in lines
+    assert "+b" in lines
+
+def test_writeDiff_binaryFile_showsSummary(tmpdir):
+    mine = write(tmpdir, "mine", b"\0\1\2")
+    theirs = write(tmpdir, "theirs", b"text\n")
+    out = io.StringIO()
+
+    file_diff.write_diff(mine, theirs, out)
+
+    assert "Binary files differ" in out.getvalue()
+    assert "3 bytes, sha256" in out.getvalue()
+
+def test_writeDiff_largeFiles_diffsFromFirstDifference(tmpdir, monkeypatch):
+    monkeypatch.setattr(file_diff, '_MAX_DIFF_BYTES', 4)
+    lines = ["line {0}\n".format(n) for n in range(1, 11)]
+    mine = write(tmpdir, "mine", "".join(lines[:6] + ["mine\n"] + lines[7:]).encode())
+    theirs = write(tmpdir, "theirs", "".join(lines).encode())
+    out = io.StringIO()
+
+    file_diff.write_diff(mine, theirs, out)
+
+    output = out.getvalue().splitlines()
+    assert "@@ -4,7 +4,7 @@" in output
+    assert "-line 7" in output
+    assert "+mine" in output
+    assert not any(line.startswith("... diff truncated") for line in output)
+
+def test_writeDiff_largeFiles_truncatesDiff(tmpdir, monkeypatch):
+    monkeypatch.setattr(file_diff, '_MAX_DIFF_BYTES', 4)
+    monkeypatch.setattr(file_diff, '_WINDOW_LINES', 2)
+    mine = write(tmpdir, "mine", b"same\n" + b"mine\n" * 10)
+    theirs = write(tmpdir, "theirs", b"same\n" + b"theirs\n" * 10)
+    out = io.StringIO()
+
+    file_diff.write_diff(mine, theirs, out)
+
+    output = out.getvalue().splitlines()
+    assert output.count("-theirs") == 2
+    assert output.count("+mine") == 2
+    assert output[-1] == "... diff truncated after line 3 of theirs and line 3 of mine, files too large for a full diff"
+
+def test_writeDiff_largeIdenticalFiles_saysSo(tmpdir, monkeypatch):
+    monkeypatch.setattr(file_diff, '_MAX_DIFF_BYTES', 4)
+    mine = write(tmpdir, "mine", b"same\n" * 10)
+    theirs = write(tmpdir, "theirs", b"same\n" * 10)
+    out = io.StringIO()
+
+    file_diff.write_diff(mine, theirs, out)
+
+    assert out.getvalue().splitlines()[-1] == "Files have identical content"
+
+def test_writeDiff_missingSide_streamsOtherSide(tmpdir):
+    theirs = write(tmpdir, "theirs", b"one\ntwo\n")
+    out = io.StringIO()
+
+    file_diff.write_diff(None, theirs, out)
+
+    assert out.getvalue().splitlines()[-2:] == ["-one", "-two"]
@@ -0,0 +1,197 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import zlib
+import struct
+import bisect
+
+# Reads git metadata directly from files in .git without spawning git (or loading GitPython).
+# Used where only a cheap check is needed, e.g. to see if HEAD moved since last run.
+
+_GIT_DIR = '.git'
+_GITDIR_PREFIX = 'gitdir: '
+_SYMREF_PREFIX = 'ref: '
+_PACKED_REFS = 'packed-refs'
+_INDEX = 'index'
+_MAX_SYMREF_DEPTH = 5
+_COMMONDIR = 'commondir'
+_OBJECTS_DIR = 'objects'
+_PACK_DIR = 'pack'
+
+_COMMIT_TREE_PREFIX = b'tree '
+_SHA_HEX_LENGTH = 40
+
+# pack index v2: magic, version, 256 entry fanout table, then sha, crc and offset tables
+_PACK_IDX_MAGIC = b'\377tOc'
+_PACK_IDX_HEADER = struct.Struct('>4sI')
+_PACK_IDX_FANOUT_SIZE = 256 * 4
+_PACK_OBJ_COMMIT = 1
+_PACK_LARGE_OFFSET = 0x80000000
+# a commit starts with its tree, no need to inflate more than this
+_COMMIT_HEAD_BYTES = 512
+
+# path to git dir of a working tree, handles .git being a file (worktrees, submodules)
+def git_dir(repo: str) -> str:
+    path = os.path.join(repo, _GIT_DIR)
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            content = f.read().strip()
+        if content.startswith(_GITDIR_PREFIX):
+            path = os.path.join(repo, content[len(_GITDIR_PREFIX):])
+    return path
+
+# sha of commit HEAD points to or None if it can not be resolved (e.g. no commits yet)
+def read_head(repo: str):
+    directory = git_dir(repo)
+    ref = 'HEAD'
+    for _ in range(_MAX_SYMREF_DEPTH):
+        value = _read_ref(directory, ref)
+        if value is None:
+            return None
+        if not value.startswith(_SYMREF_PREFIX):
+            return value
+        ref = value[len(_SYMREF_PREFIX):]
+    return None
+
+# HEAD commit and (mtime_ns, size) of .git/index, as a JSON friendly list. Changes with
+# any commit, checkout or change staged in git
+def state_tag(repo: str) -> list:
+    try:
+        st = os.stat(os.path.join(git_dir(repo), _INDEX))
+        index_stamp = [st.st_mtime_ns, st.st_size]
+    except OSError:
+        index_stamp = [None, None]
+    return [read_head(repo)] + index_stamp
+
+def _read_ref(directory, ref):
+    try:
+        with open(os.path.join(directory, ref), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(directory, _PACKED_REFS), 'r') as f:
+            for line in f:
+                if line.startswith('#') or line.startswith('^'):
+                    continue
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+# directory holding objects, shared by all worktrees of a repository
+def objects_dir(repo: str) -> str:
+    directory = git_dir(repo)
+    try:
+        with open(os.path.join(directory, _COMMONDIR), 'r') as f:
+            directory = os.path.join(directory, f.read().strip())
+    except OSError:
+        pass
+    return os.path.join(directory, _OBJECTS_DIR)
+
+# sha of tree HEAD commit points to or None if it can not be read without git
+# (no commits yet, commit stored as a delta in a pack, alternates, ...)
+def read_head_tree(repo: str):
+    head = read_head(repo)
+    if head is None or len(head) != _SHA_HEX_LENGTH:
+        return None
+    directory = objects_dir(repo)
+    data = _read_loose_object(directory, head)
+    if data is None:
+        data = _read_packed_commit(directory, head)
+    if data is None:
+        return None
+    header_end = data.find(b'\0')
+    if header_end >= 0 and data.startswith(b'commit '):
+        data = data[header_end + 1:]
+    if not data.startswith(_COMMIT_TREE_PREFIX):
+        return None
+    return data[len(_COMMIT_TREE_PREFIX):len(_COMMIT_TREE_PREFIX) + _SHA_HEX_LENGTH].decode()
+
+def _inflate_start(data: bytes):
+    try:
+        return zlib.decompressobj().decompress(data, _COMMIT_HEAD_BYTES)
+    except zlib.error:
+        return None
+
+def _read_loose_object(directory: str, sha: str):
+    try:
+        with open(os.path.join(directory, sha[:2], sha[2:]), 'rb') as f:
+            return _inflate_start(f.read(_COMMIT_HEAD_BYTES))
+    except OSError:
+        return None
+
+def _read_packed_commit(directory: str, sha: str):
+    pack_dir = os.path.join(directory, _PACK_DIR)
+    try:
+        names = [name for name in os.listdir(pack_dir) if name.endswith('.idx')]
+    except OSError:
+        return None
+    binary_sha = bytes.fromhex(sha)
+    for name in names:
+        offset = _find_in_pack_index(os.path.join(pack_dir, name), binary_sha)
+        if offset is not None:
+            return _read_pack_entry(os.path.join(pack_dir, name[:-len('.idx')] + '.pack'), offset)
+    return None
+
+# offset of object in pack or None if not in this pack
+def _find_in_pack_index(path: str, binary_sha: bytes):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _PACK_IDX_HEADER.size + _PACK_IDX_FANOUT_SIZE:
+        return None
+    magic, version = _PACK_IDX_HEADER.unpack_from(data)
+    if magic != _PACK_IDX_MAGIC or version != 2:
+        return None
+    fanout_start = _PACK_IDX_HEADER.size
+    count = struct.unpack_from('>I', data, fanout_start + 255 * 4)[0]
+    first = binary_sha[0]
+    low = struct.unpack_from('>I', data, fanout_start + (first - 1) * 4)[0] if first else 0
+    high = struct.unpack_from('>I', data, fanout_start + first * 4)[0]
+
+    shas_start = fanout_start + _PACK_IDX_FANOUT_SIZE
+    shas = _ShaTable(data, shas_start)
+    i = bisect.bisect_left(shas, binary_sha, low, high)
+    if i >= high or shas[i] != binary_sha:
+        return None
+
+    offsets_start = shas_start + count * 20 + count * 4
+    offset = struct.unpack_from('>I', data, offsets_start + i * 4)[0]
+    if offset & _PACK_LARGE_OFFSET:
+        large_start = offsets_start + count * 4
+        offset = struct.unpack_from('>Q', data, large_start + (offset & ~_PACK_LARGE_OFFSET) * 8)[0]
+    return offset
+
+# sorted sha table of a pack index, indexable for bisect without copying
+class _ShaTable:
+
+    def __init__(self, data: bytes, start: int):
+        self.data = data
+        self.start = start
+
+    def __getitem__(self, i: int) -> bytes:
+        position = self.start + i * 20
+        return self.data[position:position + 20]
+
+# inflated start of a commit stored whole (not as a delta) in a pack
+def _read_pack_entry(path: str, offset: int):
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(_COMMIT_HEAD_BYTES + 16)
+    except OSError:
+        return None
+    if not data:
+        return None
+    kind = (data[0] >> 4) & 0x7
+    if kind != _PACK_OBJ_COMMIT:
+        return None
+    # object header: type and size as a little endian varint
+    i = 0
+    while data[i] & 0x80:
+        i += 1
+    return _inflate_start(data[i + 1:])
@@ -0,0 +1,363 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import stat
+import struct
+import hashlib
+import log
+import git_head
+from git_state import GitState
+from workers import map_parallel
+
+# Reader for the git index (.git/index, "dircache" format versions 2, 3 and 4).
+#
+# Gives stat data and blob sha of every path staged in git. collect_state() uses it to
+# build a GitState in process, the way "git status" does: a file whose stat data matches
+# its index entry is unchanged, only files whose stat data differs are read and hashed.
+# Staged changes are ruled out by comparing the cached tree of the index (TREE extension)
+# with the tree of HEAD. Whatever can not be decided this way falls back to running git,
+# as do repositories where git config (system, global or repository) or attribute files
+# change how files are turned into blobs (e.g. core.autocrlf, filters).
+
+_SIGNATURE = b'DIRC'
+_HEADER = struct.Struct('>4sII')
+# ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size, sha1, flags
+_ENTRY = struct.Struct('>10I20sH')
+_EXTENDED_FLAGS = struct.Struct('>H')
+_EXTENSION_HEADER = struct.Struct('>4sI')
+_SHA_SIZE = 20
+_SUPPORTED_VERSIONS = (2, 3, 4)
+
+_FLAG_ASSUME_VALID = 0x8000
+_FLAG_EXTENDED = 0x4000
+_FLAG_STAGE_MASK = 0x3000
+_FLAG_STAGE_SHIFT = 12
+_EXTENDED_SKIP_WORKTREE = 0x4000
+_EXTENDED_INTENT_TO_ADD = 0x2000
+
+_EXTENSION_TREE = b'TREE'
+
+_MODE_TYPE_MASK = 0o170000
+_MODE_FILE = 0o100000
+_MODE_SYMLINK = 0o120000
+_MODE_GITLINK = 0o160000
+
+_UINT32 = 0xFFFFFFFF
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+# core settings that change how working tree files map to blobs, not modelled here
+_UNSUPPORTED_CORE_SETTINGS = {
+    'autocrlf': ('true', 'yes', 'on', '1', 'input'),
+    'filemode': ('false', 'no', 'off', '0'),
+    'symlinks': ('false', 'no', 'off', '0'),
+}
+# any attributes file set in config
+_CORE_ATTRIBUTES_FILE = 'attributesfile'
+_INCLUDE_SECTIONS = ('include', 'includeif')
+
+_SYSTEM_CONFIG = '/etc/gitconfig'
+_SYSTEM_ATTRIBUTES = '/etc/gitattributes'
+_ENV_CONFIG_NOSYSTEM = 'GIT_CONFIG_NOSYSTEM'
+_ENV_CONFIG_SYSTEM = 'GIT_CONFIG_SYSTEM'
+_ENV_CONFIG_GLOBAL = 'GIT_CONFIG_GLOBAL'
+_ENV_ATTR_NOSYSTEM = 'GIT_ATTR_NOSYSTEM'
+_ENV_XDG_CONFIG_HOME = 'XDG_CONFIG_HOME'
+# config given in environment (GIT_CONFIG_COUNT/KEY_n/VALUE_n, git -c passed to child processes)
+_ENV_CONFIG_COUNT = 'GIT_CONFIG_COUNT'
+_ENV_CONFIG_PARAMETERS = 'GIT_CONFIG_PARAMETERS'
+_ATTRIBUTES_FILE = '.gitattributes'
+
+_ERROR_NOT_AN_INDEX = "Not a git index file: {0}"
+_ERROR_UNSUPPORTED = "Unsupported git index: {0}"
+
+
+class GitIndexError(ValueError):
+    pass
+
+
+class IndexEntry:
+
+    __slots__ = ('path', 'ctime_s', 'ctime_ns', 'mtime_s', 'mtime_ns', 'dev', 'ino', 'mode', 'uid', 'gid', 'size', 'sha', 'flags', 'extended_flags')
+
+    def __init__(self, path, fields, flags, extended_flags=0):
+        self.path = path
+        (self.ctime_s, self.ctime_ns, self.mtime_s, self.mtime_ns, self.dev, self.ino,
+         self.mode, self.uid, self.gid, self.size, sha) = fields
+        self.sha = sha.hex()
+        self.flags = flags
+        self.extended_flags = extended_flags
+
+    def __repr__(self):
+        return "IndexEntry: {0} {1:o} {2}".format(self.path, self.mode, self.sha)
+
+    @property
+    def stage(self) -> int:
+        return (self.flags & _FLAG_STAGE_MASK) >> _FLAG_STAGE_SHIFT
+
+    # git trusts these entries without looking at the working tree
+    def is_assumed_unchanged(self) -> bool:
+        return bool(self.flags & _FLAG_ASSUME_VALID or self.extended_flags & _EXTENDED_SKIP_WORKTREE)
+
+    def is_intent_to_add(self) -> bool:
+        return bool(self.extended_flags & _EXTENDED_INTENT_TO_ADD)
+
+    # same checks as git (ie_match_stat): times, inode, owner, size and file type
+    def matches_stat(self, st) -> bool:
+        return (self.mtime_s == st.st_mtime_ns // 1000000000 & _UINT32
+                and self.mtime_ns == st.st_mtime_ns % 1000000000
+                and self.ctime_s == st.st_ctime_ns // 1000000000 & _UINT32
+                and self.ctime_ns == st.st_ctime_ns % 1000000000
+                and self.ino == st.st_ino & _UINT32
+                and self.uid == st.st_uid & _UINT32
+                and self.gid == st.st_gid & _UINT32
+                and self.size == st.st_size & _UINT32
+                and self.mode_matches(st))
+
+    def mode_matches(self, st) -> bool:
+        if self.mode & _MODE_TYPE_MASK == _MODE_SYMLINK:
+            return stat.S_ISLNK(st.st_mode)
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        return bool(self.mode & 0o100) == bool(st.st_mode & 0o100)
+
+    # stat data can not be trusted for files modified in same instant the index was written
+    def is_racy(self, index_mtime_ns: int) -> bool:
+        return self.mtime_s * 1000000000 + self.mtime_ns >= index_mtime_ns
+
+
+class GitIndex:
+
+    def __init__(self, version: int, entries: dict, tree: str = None, mtime_ns: int = 0):
+        self.version = version
+        self.entries = entries # path -> IndexEntry (stage 0), conflicted paths have one per stage in conflicts
+        self.tree = tree # sha of root tree if cached tree is valid, else None
+        self.mtime_ns = mtime_ns
+        self.conflicts = set()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.entries or path in self.conflicts
+
+    @staticmethod
+    def read(path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        index = GitIndex.parse(data)
+        index.mtime_ns = mtime_ns
+        return index
+
+    @staticmethod
+    def parse(data: bytes):
+        if len(data) < _HEADER.size + _SHA_SIZE:
+            raise GitIndexError(_ERROR_NOT_AN_INDEX.format("too short"))
+        signature, version, count = _HEADER.unpack_from(data)
+        if signature != _SIGNATURE:
+            raise GitIndexError(_ERROR_NOT_AN_INDEX.format(signature))
+        if version not in _SUPPORTED_VERSIONS:
+            raise GitIndexError(_ERROR_UNSUPPORTED.format("version {0}".format(version)))
+
+        entries = {}
+        conflicts = set()
+        offset = _HEADER.size
+        previous_name = b''
+        for _ in range(count):
+            start = offset
+            fields = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            flags = fields[-1]
+            extended_flags = 0
+            if flags & _FLAG_EXTENDED:
+                extended_flags = _EXTENDED_FLAGS.unpack_from(data, offset)[0]
+                offset += _EXTENDED_FLAGS.size
+
+            if version == 4:
+                # name is stored as: bytes to strip from previous name, then suffix
+                strip, offset = _read_offset(data, offset)
+                end = data.index(b'\0', offset)
+                name = previous_name[:len(previous_name) - strip] + data[offset:end]
+                offset = end + 1
+            else:
+                end = data.index(b'\0', offset)
+                name = data[offset:end]
+                # entries are padded with 1-8 NUL bytes to a multiple of 8
+                offset = start + ((end - start) // 8 + 1) * 8
+            previous_name = name
+
+            entry = IndexEntry(os.fsdecode(name), fields[:-1], flags, extended_flags)
+            if entry.stage:
+                conflicts.add(entry.path)
+            else:
+                entries[entry.path] = entry
+
+        tree = None
+        end_of_extensions = len(data) - _SHA_SIZE
+        while offset + _EXTENSION_HEADER.size <= end_of_extensions:
+            signature, size = _EXTENSION_HEADER.unpack_from(data, offset)
+            offset += _EXTENSION_HEADER.size
+            if signature == _EXTENSION_TREE:
+                tree = _parse_root_tree(data[offset:offset + size])
+            elif not b'A' <= signature[:1] <= b'Z':
+                # lower case extensions (split index, sparse dirs) must be understood to read the index
+                raise GitIndexError(_ERROR_UNSUPPORTED.format("extension {0}".format(signature)))
+            offset += size
+
+        index = GitIndex(version, entries, tree)
+        index.conflicts = conflicts
+        return index
+
+
+# varint used by index v4 (and pack offsets): 7 bits per byte, each continuation adds one
+def _read_offset(data: bytes, offset: int):
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
+
+# TREE extension starts with the root: "" NUL entry_count SP subtrees LF [sha]
+# entry_count is -1 when the cached tree is invalid (index changed since it was computed)
+def _parse_root_tree(data: bytes):
+    path_end = data.find(b'\0')
+    line_end = data.find(b'\n', path_end)
+    if path_end != 0 or line_end < 0:
+        return None
+    entry_count = int(data[path_end + 1:line_end].split(b' ')[0])
+    if entry_count < 0:
+        return None
+    return data[line_end + 1:line_end + 1 + _SHA_SIZE].hex()
+
+# sha of file as git blob, symlinks are stored as their target
+def blob_sha(path: str, st) -> str:
+    digest = hashlib.sha1()
+    if stat.S_ISLNK(st.st_mode):
+        target = os.fsencode(os.readlink(path))
+        digest.update(b'blob %d\0' % len(target))
+        digest.update(target)
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        digest.update(b'blob %d\0' % os.fstat(f.fileno()).st_size)
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _lstat_or_none(path: str):
+    try:
+        return os.lstat(path)
+    except OSError:
+        return None
+
+# git config files in the order git reads them (later ones override earlier)
+def _config_files(repo: str) -> [str]:
+    files = []
+    if not os.environ.get(_ENV_CONFIG_NOSYSTEM):
+        files.append(os.environ.get(_ENV_CONFIG_SYSTEM) or _SYSTEM_CONFIG)
+    if os.environ.get(_ENV_CONFIG_GLOBAL):
+        files.append(os.environ[_ENV_CONFIG_GLOBAL])
+    else:
+        files.append(os.path.join(_xdg_git_dir(), 'config'))
+        files.append(os.path.join(os.path.expanduser("~"), '.gitconfig'))
+    files.append(os.path.join(git_head.git_dir(repo), 'config'))
+    return files
+
+def _xdg_git_dir() -> str:
+    return os.path.join(os.environ.get(_ENV_XDG_CONFIG_HOME) or os.path.join(os.path.expanduser("~"), '.config'), 'git')
+
+# (key, value) of core settings in a git config file, lowercased. None if the file
+# includes other files (not followed here)
+def _core_settings(path: str):
+    try:
+        with open(path, 'r', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    settings = []
+    section = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            end = line.find(']')
+            section = line[1:end].split('"')[0].strip().lower()
+            if section in _INCLUDE_SECTIONS:
+                return None
+            line = line[end + 1:].strip() # a setting may follow on the same line
+        if section != 'core' or not line or line[0] in '#;':
+            continue
+        key, sep, value = line.partition('=')
+        value = value.split('#')[0].split(';')[0].strip().strip('"') if sep else 'true' # bare key is true
+        settings.append((key.strip().lower(), value.lower()))
+    return settings
+
+# true if git config (system, global or repository) or attributes change how files are
+# turned into blobs
+def _has_unsupported_config(repo: str) -> bool:
+    if os.environ.get(_ENV_CONFIG_COUNT) or os.environ.get(_ENV_CONFIG_PARAMETERS):
+        return True
+    attributes = [os.path.join(git_head.git_dir(repo), 'info', 'attributes'), os.path.join(_xdg_git_dir(), 'attributes')]
+    if not os.environ.get(_ENV_ATTR_NOSYSTEM):
+        attributes.append(_SYSTEM_ATTRIBUTES)
+    if any(os.path.isfile(path) for path in attributes):
+        return True
+    core = {}
+    for path in _config_files(repo):
+        settings = _core_settings(path)
+        if settings is None:
+            return True
+        core.update(settings)
+    if core.get(_CORE_ATTRIBUTES_FILE):
+        return True
+    return any(core.get(key) in values for key, values in _UNSUPPORTED_CORE_SETTINGS.items())
+
+# GitState for <repository> built from .git/index, or None when git has to be asked instead.
+# refs are the <repository> relative refs caller is interested in: those not in git index
+# are untracked unless ignored, which is only known by git (asked for just those paths).
+def collect_state(repo: str, git_repo, refs, workers: int = 1):
+    try:
+        index = GitIndex.read(os.path.join(git_head.git_dir(repo), 'index'))
+    except (OSError, GitIndexError) as e:
+        log.debug("reading git index failed, using git: %s", e)
+        return None
+    if index.conflicts or any(entry.is_intent_to_add() for entry in index.entries.values()):
+        log.debug("git index has conflicts or intent to add entries, using git")
+        return None
+    if index.tree is None or index.tree != git_head.read_head_tree(repo):
+        log.debug("git index tree does not match HEAD, using git")
+        return None
+    if _has_unsupported_config(repo) or any(os.path.basename(path) == _ATTRIBUTES_FILE for path in index.entries):
+        log.debug("git attributes or core settings in use, using git")
+        return None
+
+    state = GitState()
+    entries = [entry for entry in index.entries.values()
+               if not entry.is_assumed_unchanged() and entry.mode & _MODE_TYPE_MASK != _MODE_GITLINK]
+    stats = map_parallel(_lstat_or_none, [os.path.join(repo, entry.path) for entry in entries], workers)
+    to_hash = []
+    for entry, st in zip(entries, stats):
+        if st is None or not entry.mode_matches(st):
+            state.modified.add(entry.path)
+        elif st.st_size & _UINT32 != entry.size:
+            state.modified.add(entry.path)
+        elif not entry.matches_stat(st) or entry.is_racy(index.mtime_ns):
+            to_hash.append((entry, st))
+
+    def is_modified(item):
+        entry, st = item
+        try:
+            return blob_sha(os.path.join(repo, entry.path), st) != entry.sha
+        except OSError:
+            return True
+    if to_hash:
+        log.debug("hashing %s files with changed stat data", len(to_hash))
+    for (entry, _), modified in zip(to_hash, map_parallel(is_modified, to_hash, workers, min_parallel=2)):
+        if modified:
+            state.modified.add(entry.path)
+
+    candidates = [ref for ref in refs if ref not in index]
+    if candidates:
+        state.update(GitState.collect(git_repo, candidates), candidates)
+    log.debug("collected git state from index: %s", state)
+    return state
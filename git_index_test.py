@@ -0,0 +1,147 @@
+import os
+import time
+import subprocess
+import pytest
+import git
+import git_head
+import git_index
+from git_index import GitIndex, GitIndexError
+from git_state import GitState
+
+def run_git(repo, *args):
+    return subprocess.check_output(["git", "-C", repo, "-c", "user.email=x@y", "-c", "user.name=x"] + list(args)).decode()
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+# global and system git config of the machine running tests is not read
+@pytest.fixture(autouse=True)
+def git_config_home(tmpdir, monkeypatch):
+    home = str(tmpdir.join("home"))
+    os.makedirs(home)
+    monkeypatch.setenv('HOME', home)
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', "1")
+    monkeypatch.setenv('GIT_ATTR_NOSYSTEM', "1")
+    for name in ['XDG_CONFIG_HOME', 'GIT_CONFIG_GLOBAL', 'GIT_CONFIG_COUNT', 'GIT_CONFIG_PARAMETERS']:
+        monkeypatch.delenv(name, raising=False)
+    return home
+
+@pytest.fixture
+def repo(tmpdir):
+    path = str(tmpdir.join("repo"))
+    os.makedirs(path)
+    run_git(path, "init", "-q")
+    for name in ["a", "dir/b", "dir/sub/c", "dir/sub/d", "e"]:
+        write(os.path.join(path, name), name + "\n")
+    run_git(path, "add", "-A")
+    run_git(path, "commit", "-q", "-m", "init")
+    # files must be older than index for stat data to be trusted (racy git)
+    time.sleep(0.01)
+    run_git(path, "update-index", "--refresh")
+    return path
+
+def staged_entries(repo):
+    entries = {}
+    for line in run_git(repo, "ls-files", "-s").splitlines():
+        info, path = line.split("\t")
+        mode, sha, _ = info.split()
+        entries[path] = (int(mode, 8), sha)
+    return entries
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_read_allVersions_sameAsLsFiles(repo, version):
+    run_git(repo, "update-index", "--index-version", str(version))
+
+    index = GitIndex.read(os.path.join(repo, ".git", "index"))
+
+    # git only writes version 3 when an entry needs extended flags
+    assert index.version == (2 if version == 3 else version)
+    assert {path: (entry.mode, entry.sha) for path, entry in index.entries.items()} == staged_entries(repo)
+
+def test_read_cachedTree_matchesHeadTree(repo):
+    run_git(repo, "write-tree")
+    index = GitIndex.read(os.path.join(repo, ".git", "index"))
+
+    assert index.tree == run_git(repo, "rev-parse", "HEAD^{tree}").strip()
+    assert git_head.read_head_tree(repo) == index.tree
+
+def test_readHeadTree_packedCommit(repo):
+    run_git(repo, "gc", "-q")
+    assert not os.path.exists(os.path.join(repo, ".git", "objects", run_git(repo, "rev-parse", "HEAD")[:2]))
+
+    assert git_head.read_head_tree(repo) == run_git(repo, "rev-parse", "HEAD^{tree}").strip()
+
+def test_parse_notAnIndex_raises():
+    with pytest.raises(GitIndexError):
+        GitIndex.parse(b"NOPE" + b"\0" * 40)
+
+def test_collectState_sameAsGitStatus(repo):
+    run_git(repo, "write-tree")
+    write(os.path.join(repo, "a"), "changed\n")
+    write(os.path.join(repo, "dir/sub/c"), "dir/sub/c\n") # rewritten, same content
+    os.remove(os.path.join(repo, "e"))
+    write(os.path.join(repo, "untracked"), "new\n")
+    git_repo = git.Repo(repo)
+
+    fast = git_index.collect_state(repo, git_repo, ["a", "dir/b", "untracked"])
+    expected = GitState.collect(git_repo)
+
+    assert fast is not None
+    assert fast.modified == expected.modified == {"a", "e"}
+    assert fast.staged == expected.staged == set()
+    assert fast.untracked == {"untracked"}
+
+def test_collectState_stagedChanges_fallsBack(repo):
+    write(os.path.join(repo, "a"), "staged\n")
+    run_git(repo, "add", "a")
+
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
+
+def test_read_extendedFlags_version3(repo):
+    run_git(repo, "update-index", "--skip-worktree", "dir/b")
+
+    index = GitIndex.read(os.path.join(repo, ".git", "index"))
+
+    assert index.version == 3
+    assert index.entries["dir/b"].is_assumed_unchanged()
+    assert not index.entries["a"].is_assumed_unchanged()
+
+def test_collectState_repositoryConfig_fallsBack(repo):
+    run_git(repo, "config", "core.autocrlf", "input")
+
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
+
+@pytest.mark.parametrize("config_file", [".gitconfig", ".config/git/config"])
+def test_collectState_globalConfig_fallsBack(repo, git_config_home, config_file):
+    assert git_index.collect_state(repo, git.Repo(repo), []) is not None
+    write(os.path.join(git_config_home, config_file), "[core]\n\tautocrlf = true\n")
+
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
+
+def test_collectState_globalOverriddenByRepository_supported(repo, git_config_home):
+    write(os.path.join(git_config_home, ".gitconfig"), "[core]\n\tfilemode = false\n")
+    run_git(repo, "config", "core.filemode", "true")
+
+    assert git_index.collect_state(repo, git.Repo(repo), []) is not None
+
+def test_collectState_systemConfig_fallsBack(repo, git_config_home, monkeypatch):
+    system_config = os.path.join(git_config_home, "gitconfig")
+    write(system_config, "[core]\n\tsymlinks = false\n")
+    monkeypatch.delenv('GIT_CONFIG_NOSYSTEM')
+    monkeypatch.setenv('GIT_CONFIG_SYSTEM', system_config)
+
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
+
+def test_collectState_attributesFileOrInclude_fallsBack(repo, git_config_home):
+    write(os.path.join(git_config_home, ".gitconfig"), "[core]\n\tattributesFile = ~/.gitattributes\n")
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
+
+    write(os.path.join(git_config_home, ".gitconfig"), "[include]\n\tpath = ~/.gitconfig.local\n")
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
+
+def test_collectState_defaultGlobalAttributes_fallsBack(repo, git_config_home):
+    write(os.path.join(git_config_home, ".config/git/attributes"), "* text=auto\n")
+
+    assert git_index.collect_state(repo, git.Repo(repo), []) is None
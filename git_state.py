@@ -0,0 +1,103 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import log
+
+# GitState - snapshot of what git considers changed in <repository>
+#
+# Collected with a single "git status --porcelain=v2 -z" invocation instead of asking
+# git once per ref. All paths are <repository> relative (same format as refs in index)
+# and kept in sets so each ref can be classified with constant time lookups.
+#
+# untracked: files unknown to git
+# modified:  tracked files with changes not staged (working tree differs from git index)
+# staged:    files with changes staged for commit (git index differs from HEAD)
+
+_STATUS_ARGS = ["--porcelain=v2", "-z", "--untracked-files=all"]
+# refs are file names, not patterns
+_LITERAL_PATHSPEC = ":(literal)"
+
+# porcelain v2 entry kinds
+_ORDINARY = "1"
+_RENAMED = "2"
+_UNMERGED = "u"
+_UNTRACKED = "?"
+_IGNORED = "!"
+
+_UNCHANGED = "."
+
+class GitState:
+
+    def __init__(self, untracked=None, modified=None, staged=None):
+        self.untracked = untracked if untracked is not None else set()
+        self.modified = modified if modified is not None else set()
+        self.staged = staged if staged is not None else set()
+
+    def __repr__(self) -> str:
+        return "GitState: untracked {0} modified {1} staged {2}".format(len(self.untracked), len(self.modified), len(self.staged))
+
+    # true if ref differs in any way from what is committed in HEAD (or is unknown to git)
+    def has_changes(self, ref: str) -> bool:
+        return ref in self.untracked or ref in self.modified or ref in self.staged
+
+    # paths known to git that have uncommitted changes (staged or not)
+    def changed_paths(self) -> set:
+        return self.modified | self.staged
+
+    # replaces what is known about given paths with what other (collected for those paths) says
+    def update(self, other, paths):
+        paths = set(paths)
+        self.untracked = (self.untracked - paths) | other.untracked
+        self.modified = (self.modified - paths) | other.modified
+        self.staged = (self.staged - paths) | other.staged
+
+    # paths limits collection to given <repository> relative paths, all of repository if None
+    @staticmethod
+    def collect(git_repo, paths=None):
+        args = _STATUS_ARGS
+        if paths is not None:
+            args = args + ["--"] + [_LITERAL_PATHSPEC + path for path in paths]
+        output = git_repo.git.status(*args)
+        state = GitState.parse(output)
+        log.debug("collected git state: %s", state)
+        return state
+
+    # parses output of "git status --porcelain=v2 -z"
+    @staticmethod
+    def parse(output: str):
+        state = GitState()
+        entries = output.split("\0")
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if not entry:
+                continue
+
+            kind = entry[0]
+            if kind == _UNTRACKED:
+                state.untracked.add(entry[2:])
+                continue
+            if kind == _IGNORED:
+                continue
+
+            if kind == _ORDINARY:
+                fields = entry.split(" ", 8)
+                paths = [fields[8]]
+            elif kind == _RENAMED:
+                # followed by a separate entry holding the original path
+                fields = entry.split(" ", 9)
+                paths = [fields[9], entries[i]]
+                i += 1
+            elif kind == _UNMERGED:
+                fields = entry.split(" ", 10)
+                paths = [fields[10]]
+            else:
+                log.debug("unknown git status entry: %s", entry)
+                continue
+
+            staged_status, worktree_status = fields[1][0], fields[1][1]
+            for path in paths:
+                if staged_status != _UNCHANGED:
+                    state.staged.add(path)
+                if worktree_status != _UNCHANGED:
+                    state.modified.add(path)
+        return state
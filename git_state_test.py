@@ -0,0 +1,50 @@
+from git_state import GitState
+
+def test_parse_emptyOutput_noChanges():
+    state = GitState.parse("")
+    assert not state.has_changes("somefile")
+    assert state.changed_paths() == set()
+
+def test_parse_ordinaryEntries_splitIntoStagedAndModified():
+    output = "\0".join([
+        "1 .M N... 100644 100644 100644 3b18e512dba79e4c8300dd08aeb37f8e728b8dad 3b18e512dba79e4c8300dd08aeb37f8e728b8dad .vimrc",
+        "1 M. N... 100644 100644 100644 3b18e512dba79e4c8300dd08aeb37f8e728b8dad 4b18e512dba79e4c8300dd08aeb37f8e728b8dad dir/some file",
+        "1 D. N... 100644 000000 000000 3b18e512dba79e4c8300dd08aeb37f8e728b8dad 0000000000000000000000000000000000000000 removed",
+        "? new/untracked",
+        "! ignored",
+    ]) + "\0"
+
+    state = GitState.parse(output)
+
+    assert state.modified == {".vimrc"}
+    assert state.staged == {"dir/some file", "removed"}
+    assert state.untracked == {"new/untracked"}
+    assert state.changed_paths() == {".vimrc", "dir/some file", "removed"}
+    assert state.has_changes("new/untracked")
+    assert not state.has_changes("ignored")
+
+def test_parse_renamedEntry_bothPathsStaged():
+    output = "2 R. N... 100644 100644 100644 3b18e512dba79e4c8300dd08aeb37f8e728b8dad 3b18e512dba79e4c8300dd08aeb37f8e728b8dad R100 new name\0old name\0? after\0"
+
+    state = GitState.parse(output)
+
+    assert state.staged == {"new name", "old name"}
+    assert state.untracked == {"after"}
+
+def test_parse_unmergedEntry_stagedAndModified():
+    output = "u UU N... 100644 100644 100644 100644 3b18e512dba79e4c8300dd08aeb37f8e728b8dad 3b18e512dba79e4c8300dd08aeb37f8e728b8dad 3b18e512dba79e4c8300dd08aeb37f8e728b8dad conflict\0"
+
+    state = GitState.parse(output)
+
+    assert state.staged == {"conflict"}
+    assert state.modified == {"conflict"}
+
+def test_update_replacesStateOfGivenPathsOnly():
+    state = GitState(untracked={"a"}, modified={"b", "c"}, staged={"c"})
+    partial = GitState(staged={"b"})
+
+    state.update(partial, ["b", "c"])
+
+    assert state.untracked == {"a"}
+    assert state.modified == set()
+    assert state.staged == {"b"}
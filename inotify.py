@@ -0,0 +1,162 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import errno
+import struct
+import ctypes
+import ctypes.util
+
+# Minimal inotify(7) binding using ctypes (Linux only, no extra dependencies).
+#
+# Inotify watches directories; events name the entry within the watched directory that
+# changed. The file descriptor is non blocking and can be used with select/poll, reading
+# returns all queued events at once.
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# any change to entries of a directory
+IN_DIR_CHANGES = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: int wd, uint32 mask, uint32 cookie, uint32 len, char name[len]
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+_ERROR_NOT_SUPPORTED = "inotify is not available on this platform"
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(_ERROR_NOT_SUPPORTED)
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+def is_supported() -> bool:
+    try:
+        _load_libc()
+        return True
+    except OSError:
+        return False
+
+def _check(result: int, path: str = None) -> int:
+    if result < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code), path)
+    return result
+
+
+class Event:
+
+    __slots__ = ('wd', 'mask', 'cookie', 'path')
+
+    # path is watched directory joined with name of entry (the directory itself for self events)
+    def __init__(self, wd: int, mask: int, cookie: int, path: str):
+        self.wd = wd
+        self.mask = mask
+        self.cookie = cookie
+        self.path = path
+
+    def __repr__(self):
+        return "Event: {0} mask {1:#x}".format(self.path, self.mask)
+
+    def is_dir(self) -> bool:
+        return bool(self.mask & IN_ISDIR)
+
+
+class Inotify:
+
+    def __init__(self):
+        self.libc = _load_libc()
+        self.fd = _check(self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC))
+        self.paths = {} # wd -> watched path
+        self.watches = {} # watched path -> wd
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    # watching an already watched path replaces its mask and returns same descriptor
+    def add_watch(self, path: str, mask: int = IN_DIR_CHANGES) -> int:
+        wd = _check(self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask), path)
+        self.paths[wd] = path
+        self.watches[path] = wd
+        return wd
+
+    def remove_watch(self, path: str):
+        wd = self.watches.pop(path, None)
+        if wd is None:
+            return
+        self.paths.pop(wd, None)
+        # fails if watch is already gone (e.g. directory was deleted)
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def is_watched(self, path: str) -> bool:
+        return path in self.watches
+
+    # all queued events, empty list if there are none
+    def read_events(self) -> [Event]:
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                break
+            events.extend(self.parse(data))
+        return events
+
+    def parse(self, data: bytes) -> [Event]:
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            directory = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                # watch removed by kernel (directory deleted or unmounted)
+                if directory is not None:
+                    self.paths.pop(wd, None)
+                    self.watches.pop(directory, None)
+            if directory is None and not mask & IN_Q_OVERFLOW:
+                continue
+            path = os.path.join(directory, name) if name and directory else directory
+            events.append(Event(wd, mask, cookie, path))
+        return events
@@ -0,0 +1,36 @@
+import os
+import select
+import pytest
+import inotify
+
+pytestmark = pytest.mark.skipif(not inotify.is_supported(), reason="inotify not available")
+
+def wait_for_events(notify):
+    select.select([notify], [], [], 2.0)
+    return notify.read_events()
+
+def test_readEvents_renameOverFile_reportsMovedTo(tmpdir):
+    target = os.path.join(tmpdir, "target")
+    tmp = os.path.join(tmpdir, "target.tmp")
+    open(target, 'w').close()
+    with inotify.Inotify() as notify:
+        notify.add_watch(str(tmpdir))
+        with open(tmp, 'w') as f:
+            f.write("new")
+        os.replace(tmp, target)
+
+        events = wait_for_events(notify)
+
+    moved_to = [event for event in events if event.mask & inotify.IN_MOVED_TO]
+    assert [event.path for event in moved_to] == [target]
+
+def test_readEvents_nothingHappened_empty(tmpdir):
+    with inotify.Inotify() as notify:
+        notify.add_watch(str(tmpdir))
+        assert notify.read_events() == []
+
+def test_removeWatch_forgetsPath(tmpdir):
+    with inotify.Inotify() as notify:
+        notify.add_watch(str(tmpdir))
+        notify.remove_watch(str(tmpdir))
+        assert not notify.is_watched(str(tmpdir))
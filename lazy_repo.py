@@ -0,0 +1,31 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import log
+
+# LazyRepo - git repository opened on first use
+#
+# Importing GitPython and opening a repository is the most expensive part of starting trakk,
+# and commands like --list never touch git. LazyRepo stands in for git.Repo: attribute access
+# (e.g. repo.git.status(), repo.head) imports git and opens the repository the first time.
+
+_ERROR_GIT_NOT_INITIALIZED = "Could not initialize git repository"
+
+class LazyRepo:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.repo = None
+
+    def is_open(self) -> bool:
+        return self.repo is not None
+
+    def get(self):
+        if self.repo is None:
+            import git
+            log.debug("opening git repository: %s", self.path)
+            repo = git.Repo(self.path)
+            assert not repo.bare, _ERROR_GIT_NOT_INITIALIZED
+            self.repo = repo
+        return self.repo
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
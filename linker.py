@@ -1,7 +1,9 @@
 # author: Samuel Wejeus (samuel@isalldigital.com)
 import os
 import log
+import profiler
 from pathspec import Pathspec
+from workers import map_parallel
 # from types import type
 import types
 # Links must be hard links in order to harness the power of inodes!
@@ -11,25 +13,96 @@ import types
 _ERROR_NOT_PATHSPEC = "target must be of type Pathspec"
 _ERROR_INVALID_USER_ABS_PATH = "target must be an absolute path rooted in user home dir"
 
+_FORCED_TMP_SUFFIX = ".trakk-link"
+
+# outcome of linking a single (src, dest) pair in a bulk link
+class LinkResult:
+
+    def __init__(self, src, dest, error: OSError = None):
+        self.src = src
+        self.dest = dest
+        self.error = error
+
+    def __repr__(self):
+        return "LinkResult: {0} -> {1} {2}".format(self.src, self.dest, self.error or "OK")
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 # Note: src and dest must be of pathspec type!
 class Linker:
 
-    def __init__(self, repository):
+    def __init__(self, repository, workers: int = 1):
         self.repo = repository
+        self.workers = workers
+        # parent dirs known to exist, so each is only checked/created once
+        self.created_dirs = set()
 
     # src, dest must be absolute paths
+    @profiler.timed("linker.link_raw")
     def link_raw(self, src, dest, forced=False):
         assert src.startswith(os.path.expanduser("~")), _ERROR_INVALID_USER_ABS_PATH
         assert dest.startswith(os.path.expanduser("~")), _ERROR_INVALID_USER_ABS_PATH
         # handle missing parent dirs
         self.make_dirs_if_needed(dest)
-        if forced:
-            os.remove(dest)
-        os.link(src, dest)
+        self.link_file(src, dest, forced)
+
+    # forced replaces an existing dest atomically (dest is never missing if linking fails)
+    def link_file(self, src, dest, forced=False):
+        if not forced:
+            os.link(src, dest)
+            return
+        tmp = dest + _FORCED_TMP_SUFFIX
+        os.link(src, tmp)
+        try:
+            os.replace(tmp, dest)
+        except OSError:
+            os.remove(tmp)
+            raise
+
+    # Links a batch of (src, dest) absolute path pairs. Parent dirs are created once per
+    # dir and the links are made on a worker pool. Never raises on a failing link, instead
+    # returns a LinkResult per pair (in same order as pairs).
+    @profiler.timed("linker.link_many")
+    def link_many(self, pairs, forced=False) -> [LinkResult]:
+        home = os.path.expanduser("~")
+        pairs = list(pairs)
+        results = [None] * len(pairs)
+        pending = []
+        for i, (src, dest) in enumerate(pairs):
+            assert src.startswith(home) and dest.startswith(home), _ERROR_INVALID_USER_ABS_PATH
+            try:
+                self.make_dirs_if_needed(dest)
+                pending.append(i)
+            except OSError as e:
+                results[i] = LinkResult(src, dest, e)
+
+        def link_pair(i):
+            src, dest = pairs[i]
+            try:
+                self.link_file(src, dest, forced)
+                return LinkResult(src, dest)
+            except OSError as e:
+                return LinkResult(src, dest, e)
+
+        for i, result in zip(pending, map_parallel(link_pair, pending, self.workers)):
+            results[i] = result
+        return results
+
+    # bulk version of link(), returns a LinkResult per pathspec
+    def link_pathspecs(self, pathspecs) -> [LinkResult]:
+        pairs = []
+        for pathspec in pathspecs:
+            assert type(pathspec) is Pathspec, _ERROR_NOT_PATHSPEC
+            pairs.append((pathspec.get_abs_path(), os.path.join(self.repo, pathspec.get_ref())))
+        log.debug("creating %s links", len(pairs))
+        return self.link_many(pairs)
 
     # a link requires src and destination but since we link an existing 
     # file under a new location (but with same relative path) one pathspec
     # is enough to determine linking
+    @profiler.timed("linker.link")
     def link(self, pathspec):
         assert type(pathspec) is Pathspec, _ERROR_NOT_PATHSPEC
         log.info("creating link: {0}".format(pathspec))
@@ -42,9 +115,10 @@ class Linker:
     # both if the file is actually linked (2 files point to same inode)
     # of if file is out of sync and has no target. In both cases the file
     # in the repo dir is removed.
+    @profiler.timed("linker.unlink")
     def unlink(self, dest):
         assert type(dest) is Pathspec, _ERROR_NOT_PATHSPEC
-        log.debug("Unlinking: {0}".format(dest.get_abs_path()))
+        log.debug("Unlinking: %s", dest.get_abs_path())
         name = Pathspec.get_ref_from_repo(self.repo, dest)
         path = os.path.join(self.repo, name)
         wasUnlinked = True
@@ -55,8 +129,42 @@ class Linker:
             wasUnlinked = False
         return wasUnlinked
 
+    # Bulk version of unlink() for <repository> relative ref names, files are removed on the
+    # worker pool. Directories left empty below prune_root (a ref name of a directory) are
+    # removed too. Returns the ref names whose file was removed.
+    @profiler.timed("linker.unlink_many")
+    def unlink_many(self, ref_names, prune_root: str = None) -> [str]:
+        ref_names = list(ref_names)
+        log.debug("removing %s files from repository", len(ref_names))
+        def remove(name):
+            try:
+                os.remove(os.path.join(self.repo, name))
+                return True
+            except OSError:
+                return False
+        removed = [name for name, ok in zip(ref_names, map_parallel(remove, ref_names, self.workers)) if ok]
+        if prune_root:
+            self.prune_empty_dirs(os.path.join(self.repo, prune_root))
+        return removed
+
+    @profiler.timed("linker.prune_empty_dirs")
+    def prune_empty_dirs(self, root):
+        root = root.rstrip("/")
+        if not os.path.isdir(root):
+            return
+        for dir_path, _, _ in os.walk(root, topdown=False):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                pass # not empty
+        # removed dirs must be created again when linking into them
+        self.created_dirs.clear()
+
     def make_dirs_if_needed(self, path):
         assert path.startswith(os.path.expanduser("~")), _ERROR_INVALID_USER_ABS_PATH
         dir_path = os.path.dirname(path)
+        if dir_path in self.created_dirs:
+            return
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
+        self.created_dirs.add(dir_path)
@@ -0,0 +1,93 @@
+import os
+import pytest
+from linker import Linker
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    home = str(tmpdir)
+    monkeypatch.setenv('HOME', home)
+    os.makedirs(os.path.join(home, "repo"))
+    return home
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def test_linkMany_failingPair_doesNotAbortBatch(home):
+    linker = Linker(os.path.join(home, "repo"))
+    pairs = [(os.path.join(home, name), os.path.join(home, "repo", name)) for name in [".a", ".missing", ".b"]]
+    write(pairs[0][0], "a")
+    write(pairs[2][0], "b")
+
+    results = linker.link_many(pairs)
+
+    assert [result.ok for result in results] == [True, False, True]
+    assert isinstance(results[1].error, OSError)
+    assert os.path.samefile(pairs[0][0], pairs[0][1])
+    assert os.path.samefile(pairs[2][0], pairs[2][1])
+
+def test_linkMany_manyPairsOnWorkers_resultsInInputOrder(home):
+    linker = Linker(os.path.join(home, "repo"), workers=8)
+    names = ["dir{0}/f{1}".format(i % 7, i) for i in range(300)]
+    pairs = [(os.path.join(home, name), os.path.join(home, "repo", name)) for name in names]
+    for i, (src, _) in enumerate(pairs):
+        if i % 10: # every tenth source is missing
+            write(src, str(i))
+
+    results = linker.link_many(pairs)
+
+    assert [(result.src, result.dest) for result in results] == pairs
+    assert [result.ok for result in results] == [bool(i % 10) for i in range(len(pairs))]
+
+def test_linkFile_forcedLinkFails_keepsDestination(home):
+    linker = Linker(os.path.join(home, "repo"))
+    dest = os.path.join(home, "repo", ".vimrc")
+    write(dest, "theirs")
+
+    with pytest.raises(OSError):
+        linker.link_file(os.path.join(home, ".missing"), dest, forced=True)
+
+    assert read(dest) == "theirs"
+    assert os.listdir(os.path.join(home, "repo")) == [".vimrc"]
+
+def test_linkFile_forcedReplaceFails_removesTemporaryLink(home):
+    linker = Linker(os.path.join(home, "repo"))
+    src = os.path.join(home, ".vim")
+    dest = os.path.join(home, "repo", ".vim")
+    write(src, "mine")
+    write(os.path.join(dest, "keep"), "theirs") # a directory can not be replaced by a file
+
+    with pytest.raises(OSError):
+        linker.link_file(src, dest, forced=True)
+
+    assert read(os.path.join(dest, "keep")) == "theirs"
+    assert os.listdir(os.path.join(home, "repo")) == [".vim"]
+
+def test_linkFile_forced_replacesDestination(home):
+    linker = Linker(os.path.join(home, "repo"))
+    src, dest = os.path.join(home, ".vimrc"), os.path.join(home, "repo", ".vimrc")
+    write(src, "mine")
+    write(dest, "theirs")
+
+    linker.link_file(src, dest, forced=True)
+
+    assert os.path.samefile(src, dest)
+
+def test_linkRaw_afterPruningDirs_createsParentAgain(home):
+    repo = os.path.join(home, "repo")
+    linker = Linker(repo)
+    src = os.path.join(home, ".config", "app", "rc")
+    write(src, "rc")
+    linker.link_raw(src, os.path.join(repo, ".config", "app", "rc"))
+
+    assert linker.unlink_many([".config/app/rc"], prune_root=".config") == [".config/app/rc"]
+    assert not os.path.exists(os.path.join(repo, ".config"))
+    assert linker.created_dirs == set()
+
+    linker.link_raw(src, os.path.join(repo, ".config", "app", "rc"))
+    assert os.path.samefile(src, os.path.join(repo, ".config", "app", "rc"))
@@ -1,13 +1,107 @@
 # author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import sys
+import atexit
 
-__DEBUG = False
+# Leveled logging.
+#
+# Messages take %-style arguments that are only formatted when the level is enabled, so
+# debug calls in hot loops cost a level check when debug is off:
+#   log.debug("contains ref: %s -> %s", pathspec, exists)
+#
+# info and error are user facing output (command results and failures), always printed
+# to stdout. debug and warning are diagnostics, printed to stderr when enabled by level.
+# stderr output can be buffered and written in one go at exit, it then does not
+# interleave with output and prompts and costs no write per message.
+#
+# Level is set with TRAKK_LOG (debug, info, warning or error, default info) or -v/--verbose.
+# TRAKK_LOG_BUFFERED=1 buffers stderr output.
 
-def debug(message):
-    if __DEBUG:
-        print("DEBUG: " + message)
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
 
-def error(message):
-    print("ERROR: {0}".format(message))
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
 
-def info(message):
-    print(message)
+_ENV_LEVEL = 'TRAKK_LOG'
+_ENV_BUFFERED = 'TRAKK_LOG_BUFFERED'
+
+# buffered output is written once this many lines are pending (long running --daemon/--watch)
+_MAX_BUFFERED_LINES = 1024
+
+_ERROR_UNKNOWN_LEVEL = "Unknown log level: {0} (expected debug, info, warning or error)"
+
+_level = INFO
+_buffer = None # list of pending stderr lines when buffered
+
+
+def set_level(level):
+    global _level
+    if isinstance(level, str):
+        if level.lower() not in LEVELS:
+            raise ValueError(_ERROR_UNKNOWN_LEVEL.format(level))
+        level = LEVELS[level.lower()]
+    _level = level
+
+def get_level() -> int:
+    return _level
+
+def is_enabled_for(level: int) -> bool:
+    return level >= _level
+
+def set_buffered(buffered: bool):
+    global _buffer
+    if buffered and _buffer is None:
+        _buffer = []
+    elif not buffered and _buffer is not None:
+        flush()
+        _buffer = None
+
+# writes buffered stderr output
+def flush():
+    if _buffer:
+        lines = "".join(_buffer)
+        _buffer.clear()
+        sys.stderr.write(lines)
+        sys.stderr.flush()
+
+def _format(message, args) -> str:
+    return message % args if args else str(message)
+
+def _diagnostic(prefix: str, message, args):
+    line = prefix + _format(message, args) + "\n"
+    if _buffer is not None:
+        _buffer.append(line)
+        if len(_buffer) >= _MAX_BUFFERED_LINES:
+            flush()
+    else:
+        sys.stderr.write(line)
+
+def debug(message, *args):
+    if DEBUG >= _level:
+        _diagnostic("DEBUG: ", message, args)
+
+def warning(message, *args):
+    if WARNING >= _level:
+        _diagnostic("WARNING: ", message, args)
+
+def info(message, *args):
+    print(_format(message, args))
+
+def error(message, *args):
+    print("ERROR: {0}".format(_format(message, args)))
+
+# level and buffering from environment, an unknown level is reported and ignored
+def _configure_from_env():
+    level = os.environ.get(_ENV_LEVEL)
+    if level:
+        try:
+            set_level(level)
+        except ValueError as e:
+            sys.stderr.write("WARNING: {0}\n".format(e))
+    if os.environ.get(_ENV_BUFFERED, '').lower() in ('1', 'true', 'yes'):
+        set_buffered(True)
+
+_configure_from_env()
+atexit.register(flush)
@@ -0,0 +1,61 @@
+import pytest
+import log
+
+@pytest.fixture(autouse=True)
+def restore_level():
+    level = log.get_level()
+    yield
+    log.set_buffered(False)
+    log.set_level(level)
+
+class Exploding:
+    def __repr__(self):
+        raise AssertionError("formatted while disabled")
+    __str__ = __repr__
+
+def test_debug_disabled_argumentsNotFormatted(capsys):
+    log.set_level(log.INFO)
+
+    log.debug("value: %s", Exploding())
+
+    assert capsys.readouterr().err == ""
+
+def test_debug_enabled_formatsToStderr(capsys):
+    log.set_level("debug")
+
+    log.debug("%s is dir? %s", "/home/user/dir/", True)
+
+    captured = capsys.readouterr()
+    assert captured.err == "DEBUG: /home/user/dir/ is dir? True\n"
+    assert captured.out == ""
+
+def test_infoAndError_errorLevel_stillPrintedToStdout(capsys):
+    log.set_level(log.ERROR)
+
+    log.info("~/.vimrc")
+    log.error(IOError("broken"))
+    log.warning("hidden")
+
+    captured = capsys.readouterr()
+    assert captured.out == "~/.vimrc\nERROR: broken\n"
+    assert captured.err == ""
+
+def test_info_messageWithPercentAndNoArgs_printedAsIs(capsys):
+    log.info("100% done")
+
+    assert capsys.readouterr().out == "100% done\n"
+
+def test_buffered_writtenOnFlush(capsys):
+    log.set_level(log.DEBUG)
+    log.set_buffered(True)
+
+    log.debug("first")
+    log.warning("second %d", 2)
+    assert capsys.readouterr().err == ""
+
+    log.flush()
+    assert capsys.readouterr().err == "DEBUG: first\nWARNING: second 2\n"
+
+def test_setLevel_unknown_raises():
+    with pytest.raises(ValueError):
+        log.set_level("chatty")
@@ -15,41 +15,85 @@ import log
 
 _ERROR_NOT_PATHSPEC_TYPE = "invalid type, must be of type Pathspec"
 
+_home = None
+
+# users home dir, resolved once per process
+def home() -> str:
+    global _home
+    if _home is None:
+        _home = os.path.expanduser("~")
+    return _home
+
 class Pathspec:
 
+    __slots__ = ('abspath', 'userpath', 'is_dir', 'stat_result')
+
     # The constructor needs a real <path> that points to an existing file located under users home dir
     def __init__(self, path: str):
+        userpath = home()
         if path.startswith("~"):
             path = os.path.expanduser(path)
         
         abspath = os.path.abspath(path)
-        if os.path.isdir(abspath):
+        is_dir = os.path.isdir(abspath)
+        if is_dir:
             abspath = abspath + "/"
-            log.debug("{0} resolved as directory".format(abspath))
-        userpath = os.path.expanduser("~")
+            log.debug("%s resolved as directory", abspath)
 
         if not abspath.startswith(userpath):
             raise IOError("Path not located under users home (~/): {0}".format(abspath))
 
         self.abspath = abspath
         self.userpath = userpath
-        log.debug("Built pathspec: {0}".format(self.abspath))
+        self.is_dir = is_dir
+        self.stat_result = None
+        log.debug("Built pathspec: %s", self.abspath)
+
+    # Cheap constructor for paths already known to be normalized absolute paths under users
+    # home dir, such as paths from index or a directory scan. Does not touch the filesystem.
+    @staticmethod
+    def from_normalized(abspath: str, is_dir: bool = False, stat=None):
+        ps = Pathspec.__new__(Pathspec)
+        if is_dir and not abspath.endswith("/"):
+            abspath = abspath + "/"
+        ps.abspath = abspath
+        ps.userpath = home()
+        ps.is_dir = is_dir
+        ps.stat_result = stat
+        return ps
+
+    # pathspec from a <ref> (home dir relative name)
+    @staticmethod
+    def from_ref(ref: str):
+        return Pathspec.from_normalized(os.path.join(home(), ref), ref.endswith("/"))
 
     def __repr__(self) -> str:
         return self.abspath
 
     def is_dir_ref(self) -> bool:
-        isDir = os.path.isdir(self.abspath)
-        log.debug("{0} is dir? {1}".format(self.abspath, isDir))
-        return isDir
+        log.debug("%s is dir? %s", self.abspath, self.is_dir)
+        return self.is_dir
+
+    # stat result, looked up once and then cached. None if path does not exist
+    def stat(self):
+        if self.stat_result is None:
+            try:
+                self.stat_result = os.stat(self.abspath)
+            except OSError:
+                return None
+        return self.stat_result
 
     def get_abs_path(self) -> str:
         return self.abspath
     
     # the ref format stored in index. Example of ref: "git/private/system/Library/.DS_Store"
     def get_ref(self) -> str:
-        ref = os.path.relpath(self.abspath, self.userpath)
-        if os.path.isdir(self.abspath):
+        home_len = len(self.userpath)
+        if self.abspath[home_len:home_len + 1] == "/":
+            ref = self.abspath[home_len + 1:].rstrip("/") or "."
+        else:
+            ref = os.path.relpath(self.abspath, self.userpath)
+        if self.is_dir:
             ref = ref + "/"
         return ref
 
@@ -67,8 +111,9 @@ class Pathspec:
     @staticmethod
     def get_ref_from_repo(repo, pathspec) -> str:
         assert type(pathspec) is Pathspec, _ERROR_NOT_PATHSPEC_TYPE
-        user_rel_repo = repo[len(os.path.expanduser("~")):]
-        path = pathspec.get_abs_path()[len(os.path.expanduser("~")):]
+        home_len = len(home())
+        user_rel_repo = repo[home_len:]
+        path = pathspec.get_abs_path()[home_len:]
         if path.startswith(user_rel_repo):
             path = path[len(user_rel_repo):]
         if path.startswith("/"):
@@ -1,4 +1,5 @@
 from pathspec import Pathspec
+import pathspec
 import os
 import pytest
 from mockito import when, mock, unstub, ANY
@@ -6,6 +7,7 @@ from mockito import when, mock, unstub, ANY
 
 def test_create():
     path = "somefile"
+    when(pathspec).home().thenReturn("/Users/myuser")
     when(os.path).expanduser(ANY).thenReturn("/Users/myuser/somefile")
     when(os.path).abspath(ANY).thenReturn("/Users/myuser/somefile")
     try:
@@ -83,6 +85,25 @@ def test_getRefDirs_isDirRelativeCurrentDir_returnRelativeDirs():
         assert ps.get_ref_dirs() == relWorkingDir + "/" + expected
     unstub()
 
+# MARK: Test cheap constructors
+
+def test_fromNormalized_sameAsConstructor():
+    expected = Pathspec("~/someDir/someFile")
+    ps = Pathspec.from_normalized(os.path.expanduser("~/someDir/someFile"))
+    assert ps.get_ref() == expected.get_ref()
+    assert ps.get_abs_path() == expected.get_abs_path()
+    assert not ps.is_dir_ref()
+
+def test_fromRef_dirRef_keepsTrailingSlash():
+    ps = Pathspec.from_ref("someDir/extraDir/")
+    assert ps.is_dir_ref()
+    assert ps.get_ref() == "someDir/extraDir/"
+    assert ps.get_abs_path() == os.path.join(os.path.expanduser("~"), "someDir/extraDir/")
+
+def test_stat_missingFile_returnsNone():
+    ps = Pathspec.from_ref("someDir/missingFile")
+    assert ps.stat() is None
+
 # MARK: Test ref in repository
 
 # def test_getRefFromRepo():
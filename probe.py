@@ -0,0 +1,30 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+from workers import map_parallel
+
+# Filesystem probing of paths or (mine, theirs) path pairs.
+#
+# Stats every path once and hands back os.stat_result pairs (None for paths that do
+# not exist) so link status can be classified without touching the filesystem again.
+# Stats are issued from a bounded thread pool since on network mounted homes or cold
+# caches each stat is mostly waiting on I/O.
+
+# stat result for path or None if it does not exist (same semantics as os.path.exists)
+def stat_or_none(path):
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+def probe_pair(pair):
+    mine, theirs = pair
+    return stat_or_none(mine), stat_or_none(theirs)
+
+# returns list of stat results (or None) in same order as given paths
+def probe_paths(paths, workers: int = 1):
+    return map_parallel(stat_or_none, paths, workers)
+
+# returns list of (mine_stat, theirs_stat) in same order as given pairs
+def probe_pairs(pairs, workers: int = 1):
+    stats = probe_paths((path for pair in pairs for path in pair), workers)
+    return list(zip(stats[0::2], stats[1::2]))
@@ -0,0 +1,29 @@
+import os
+import probe
+
+def test_statOrNone_missingPath_returnsNone(tmpdir):
+    assert probe.stat_or_none(os.path.join(tmpdir, "missing")) is None
+
+def test_probePairs_parallel_sameOrderAsSerial(tmpdir):
+    pairs = []
+    for i in range(200):
+        mine = os.path.join(tmpdir, "mine{0}".format(i))
+        theirs = os.path.join(tmpdir, "theirs{0}".format(i))
+        if i % 3 != 0:
+            with open(mine, 'w') as f:
+                f.write(str(i))
+        if i % 2 == 0 and os.path.exists(mine):
+            os.link(mine, theirs)
+        elif i % 2 == 0:
+            open(theirs, 'w').close()
+        pairs.append((mine, theirs))
+
+    serial = probe.probe_pairs(pairs, 1)
+    parallel = probe.probe_pairs(pairs, 8)
+
+    assert len(parallel) == len(pairs)
+    for (mine, theirs), (mine_stat, theirs_stat), (serial_mine, serial_theirs) in zip(pairs, parallel, serial):
+        assert (mine_stat is None) == (not os.path.exists(mine))
+        assert (theirs_stat is None) == (not os.path.exists(theirs))
+        assert (mine_stat and mine_stat.st_ino) == (serial_mine and serial_mine.st_ino)
+        assert (theirs_stat and theirs_stat.st_ino) == (serial_theirs and serial_theirs.st_ino)
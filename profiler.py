@@ -0,0 +1,221 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import sys
+import json
+import time
+import functools
+import threading
+import contextlib
+
+# Instrumentation for finding where time goes (--profile).
+#
+# Phases are timed with phase() (a context manager) or timed() (a decorator). Phases
+# opened inside another phase are nested below it in the report, a phase entered several
+# times is reported once with its number of calls and total time.
+#
+# Counters are kept for stat calls, directory listings, opened files and subprocesses
+# (git ones separately). Stat calls are counted by wrapping os.stat/os.lstat (os.path
+# helpers go through these, DirEntry.stat from scandir does not), the rest through
+# audit hooks. Bytes read is taken from /proc/self/io (Linux) and covers everything the
+# process read, files as well as output of git. Counters are process wide, the counts of
+# a phase include work done by worker threads while it was open.
+#
+# Profiling is off until enable() is called, phase() and timed() then cost next to nothing.
+
+TEXT = 'text'
+JSON = 'json'
+FORMATS = (TEXT, JSON)
+
+STAT = 'stat calls'
+SCANDIR = 'directory listings'
+OPEN = 'files opened'
+SUBPROCESS = 'subprocesses'
+GIT = 'git subprocesses'
+BYTES_READ = 'bytes read'
+
+_COUNTERS = (STAT, SCANDIR, OPEN, SUBPROCESS, GIT)
+
+_PROC_IO = '/proc/self/io'
+_PROC_IO_READ = 'rchar'
+
+_enabled = False
+_started = None
+_start_bytes_read = None
+_counts = dict.fromkeys(_COUNTERS, 0)
+_phases = {} # tuple of phase names (outer first) -> [calls, seconds, counts]
+_lock = threading.Lock()
+_local = threading.local()
+_hooks_installed = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+def enable():
+    global _enabled
+    _install_hooks()
+    reset()
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    global _started, _start_bytes_read
+    with _lock:
+        for name in _counts:
+            _counts[name] = 0
+        _phases.clear()
+    _started = time.perf_counter()
+    _start_bytes_read = _bytes_read()
+
+def count(name: str, n: int = 1):
+    if _enabled:
+        with _lock:
+            _counts[name] = _counts.get(name, 0) + n
+
+def counts() -> dict:
+    with _lock:
+        return dict(_counts)
+
+@contextlib.contextmanager
+def _timed_phase(name: str):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(name)
+    key = tuple(stack)
+    counts_before = counts()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stack.pop()
+        with _lock:
+            entry = _phases.setdefault(key, [0, 0.0, dict.fromkeys(_counts, 0)])
+            entry[0] += 1
+            entry[1] += seconds
+            for counter, value in _counts.items():
+                entry[2][counter] = entry[2].get(counter, 0) + value - counts_before.get(counter, 0)
+
+_NOT_TIMED = contextlib.nullcontext()
+
+# times the enclosed block as phase <name>
+def phase(name: str):
+    if not _enabled:
+        return _NOT_TIMED
+    return _timed_phase(name)
+
+# decorator timing every call of function as phase <name>
+def timed(name: str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _timed_phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# MARK: - counting hooks
+
+def _counting(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _enabled:
+            count(name)
+        return function(*args, **kwargs)
+    return wrapper
+
+def _audit(event, args):
+    if not _enabled:
+        return
+    if event == 'open':
+        count(OPEN)
+    elif event == 'os.scandir':
+        count(SCANDIR)
+    elif event == 'subprocess.Popen':
+        count(SUBPROCESS)
+        executable, argv = args[0], args[1]
+        program = argv[0] if isinstance(argv, (list, tuple)) and argv else argv
+        if any(os.path.basename(os.fsdecode(name)) == 'git' for name in (executable, program) if isinstance(name, (str, bytes))):
+            count(GIT)
+
+# audit hooks can not be removed, once installed they check _enabled on every event
+def _install_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    os.stat = _counting(os.stat, STAT)
+    os.lstat = _counting(os.lstat, STAT)
+    sys.addaudithook(_audit)
+    _hooks_installed = True
+
+# bytes read by this process so far, None where not available
+def _bytes_read():
+    try:
+        with open(_PROC_IO, 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key == _PROC_IO_READ:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+# MARK: - report
+
+def report() -> dict:
+    total = time.perf_counter() - _started if _started is not None else 0.0
+    totals = counts()
+    bytes_read = _bytes_read()
+    if bytes_read is not None and _start_bytes_read is not None:
+        totals[BYTES_READ] = bytes_read - _start_bytes_read
+    with _lock:
+        phases = [{
+            'name': "/".join(key),
+            'depth': len(key) - 1,
+            'calls': calls,
+            'seconds': seconds,
+            'counts': dict(phase_counts),
+        } for key, (calls, seconds, phase_counts) in _phases.items()]
+    return {'seconds': total, 'phases': _ordered(phases), 'counts': totals}
+
+# phases below their parent, in order first entered (parents finish after their children)
+def _ordered(phases):
+    children = {}
+    for entry in phases:
+        parent = entry['name'].rpartition("/")[0] if entry['depth'] else None
+        children.setdefault(parent, []).append(entry)
+    ordered = []
+    def visit(parent):
+        for entry in children.get(parent, []):
+            ordered.append(entry)
+            visit(entry['name'])
+    visit(None)
+    return ordered
+
+def format_text(data: dict) -> str:
+    lines = ["profile: {0:.3f}s".format(data['seconds']),
+             "  {0:<40} {1:>7} {2:>9} {3:>9} {4:>5}".format("phase", "calls", "seconds", "stats", "git")]
+    for entry in data['phases']:
+        name = "  " * entry['depth'] + entry['name'].rpartition("/")[2]
+        lines.append("  {0:<40} {1:>7} {2:>9.3f} {3:>9} {4:>5}".format(
+            name, entry['calls'], entry['seconds'], entry['counts'].get(STAT, 0), entry['counts'].get(GIT, 0)))
+    lines.append("counters:")
+    for name, value in data['counts'].items():
+        lines.append("  {0:<40} {1:>9}".format(name, value))
+    return "\n".join(lines)
+
+# writes report to stream (stderr by default, output of commands stays untouched)
+def write_report(output_format: str = TEXT, stream=None):
+    stream = stream or sys.stderr
+    data = report()
+    if output_format == JSON:
+        stream.write(json.dumps(data) + "\n")
+    else:
+        stream.write(format_text(data) + "\n")
+    stream.flush()
@@ -0,0 +1,84 @@
+import io
+import os
+import json
+import subprocess
+import pytest
+import profiler
+
+@pytest.fixture
+def enabled():
+    profiler.enable()
+    yield
+    profiler.disable()
+    profiler.reset()
+
+def phases_by_name():
+    return {entry['name']: entry for entry in profiler.report()['phases']}
+
+def test_phase_disabled_recordsNothing():
+    profiler.reset()
+
+    with profiler.phase("outer"):
+        os.stat(".")
+
+    assert profiler.report()['phases'] == []
+    assert profiler.counts()[profiler.STAT] == 0
+
+def test_phase_nested_reportedBelowParent(enabled):
+    with profiler.phase("outer"):
+        for _ in range(2):
+            with profiler.phase("inner"):
+                os.stat(".")
+
+    phases = profiler.report()['phases']
+
+    assert [entry['name'] for entry in phases] == ["outer", "outer/inner"]
+    assert phases[0]['calls'] == 1
+    assert phases[1]['calls'] == 2
+    assert phases[1]['depth'] == 1
+    assert phases[1]['counts'][profiler.STAT] == 2
+    assert phases[0]['seconds'] >= phases[1]['seconds']
+
+def test_timed_function_recordedAsPhase(enabled):
+    @profiler.timed("work")
+    def work(path):
+        return os.lstat(path)
+
+    with profiler.phase("outer"):
+        work(".")
+
+    assert phases_by_name()["outer/work"]['counts'][profiler.STAT] == 1
+
+def test_counts_gitSubprocess_countedSeparately(enabled):
+    subprocess.run(["git", "--version"], stdout=subprocess.DEVNULL)
+    subprocess.run(["true"])
+
+    counts = profiler.counts()
+
+    assert counts[profiler.SUBPROCESS] == 2
+    assert counts[profiler.GIT] == 1
+
+def test_writeReport_json_isParsable(enabled, tmpdir):
+    with profiler.phase("read"):
+        with open(str(tmpdir.join("file")), 'w') as f:
+            f.write("content")
+    out = io.StringIO()
+
+    profiler.write_report(profiler.JSON, out)
+
+    data = json.loads(out.getvalue())
+    assert data['phases'][0]['name'] == "read"
+    assert data['phases'][0]['counts'][profiler.OPEN] == 1
+
+def test_writeReport_text_listsPhasesAndCounters(enabled):
+    with profiler.phase("outer"):
+        with profiler.phase("inner"):
+            pass
+    out = io.StringIO()
+
+    profiler.write_report(profiler.TEXT, out)
+
+    lines = out.getvalue().splitlines()
+    assert any(line.split()[0] == "outer" for line in lines)
+    assert any(line.startswith("    inner") for line in lines)
+    assert any(profiler.STAT in line for line in lines)
@@ -0,0 +1,76 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import bisect
+
+# RefIndex - in-memory index of ref names
+#
+# Keeps every ref both in a set (constant time membership tests) and in a
+# sorted list (ordered listing and persistence). The sorted list is what
+# get_index() hands out and what gets written to config, so the stored
+# index is always sorted. Since refs sharing a prefix (e.g. all refs in a
+# directory) are adjacent in sorted order, they are found by binary search.
+
+class RefIndex:
+
+    def __init__(self, refs=None):
+        self.refs = set(refs) if refs else set()
+        self.ordered = sorted(self.refs)
+
+    def __contains__(self, ref) -> bool:
+        return ref in self.refs
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def __iter__(self):
+        return iter(self.ordered)
+
+    def __repr__(self) -> str:
+        return "RefIndex({0})".format(self.ordered)
+
+    # returns False if ref is already present
+    def add(self, ref: str) -> bool:
+        if ref in self.refs:
+            return False
+        self.refs.add(ref)
+        bisect.insort(self.ordered, ref)
+        return True
+
+    # returns False if ref is not present
+    def remove(self, ref: str) -> bool:
+        if ref not in self.refs:
+            return False
+        self.refs.remove(ref)
+        del self.ordered[bisect.bisect_left(self.ordered, ref)]
+        return True
+
+    # sorted refs starting with prefix, e.g. "dir/" gives all refs below dir
+    def refs_under(self, prefix: str) -> [str]:
+        start, end = self.prefix_range(prefix)
+        return self.ordered[start:end]
+
+    # removes all refs starting with prefix in one go, returns them (sorted)
+    def remove_under(self, prefix: str) -> [str]:
+        start, end = self.prefix_range(prefix)
+        removed = self.ordered[start:end]
+        del self.ordered[start:end]
+        self.refs.difference_update(removed)
+        return removed
+
+    # start and end of the range in sorted list holding refs starting with prefix
+    def prefix_range(self, prefix: str):
+        if not prefix:
+            return 0, len(self.ordered)
+        start = bisect.bisect_left(self.ordered, prefix)
+        # first string sorting after every string starting with prefix
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return start, bisect.bisect_left(self.ordered, upper, start)
+
+    def copy(self):
+        index = RefIndex()
+        index.refs = set(self.refs)
+        index.ordered = list(self.ordered)
+        return index
+
+    # sorted list of all refs. Note: this is the backing list, do not modify it
+    def to_list(self) -> [str]:
+        return self.ordered
@@ -1,10 +1,13 @@
 # author: Samuel Wejeus (samuel@isalldigital.com)
 import os
 import json
+import contextlib
 import config
 import log
 from pathspec import Pathspec
 from config import Config
+from ref_index import RefIndex
+from stat_cache import StatCache
 
 # a <ref> is pointer to a local file given by its <user_home> relative path.
 # Example: "<track dir>/.gitconfig is the ref to the real file ~/.gitconfig
@@ -22,7 +25,7 @@ from config import Config
 # +---------------------------------------------+
 # | RefStore                                    |
 # | +------------------+ +--------------------+ |
-# | | Index[Pathspecs] | | Repository         | |
+# | | Index[RefIndex]  | | Repository         | |
 # | +------------------+ +--------------------+ |
 # +---------------------------------------------+
 
@@ -37,10 +40,16 @@ class RefStore:
 
     def __init__(self, config: Config):
         self.config = config
+        self.transaction_depth = 0
+        self.transaction_dirty = False
+        self.rollback_actions = []
         self.reload()
 
     def reload(self):
-        self.repo, self.index, self.dirs = self.config.read_rc()
+        self.repo, index, dirs = self.config.read_rc()
+        self.index = RefIndex(index)
+        self.dirs = RefIndex(dirs)
+        self.stat_cache = StatCache(self.config.get_stat_cache_file())
 
     def check_valid(self):
         if not self.repo:
@@ -63,11 +72,10 @@ class RefStore:
         assert type(pathspec) is Pathspec, _ERROR_NOT_PATHSPEC
         self.check_valid()
         name = Pathspec.get_ref_from_repo(self.repo, pathspec)
-        if name in self.index:
+        if not self.index.add(name):
             return False
-        else:
-            self.index.append(name)
-            self.commit()
+        self.stat_cache.invalidate(name)
+        self.commit()
         return True
 
     def add_dir_ref(self, pathspec: Pathspec) -> bool:
@@ -75,11 +83,9 @@ class RefStore:
         self.check_valid()
         if pathspec.is_dir_ref:
             name = Pathspec.get_ref_from_repo(self.repo, pathspec)
-            if name in self.dirs:
+            if not self.dirs.add(name):
                 return False
-            else:
-                self.dirs.append(name)
-                self.commit()
+            self.commit()
             return True
         return False
     
@@ -92,37 +98,129 @@ class RefStore:
         if not forced:
             name = Pathspec.get_ref_from_repo(self.repo, pathspec)
 
-        if name in self.index:
-            self.index.remove(name)
-            self.commit()
-            return True
-        else:
+        if not self.index.remove(name):
             return False
+        self.stat_cache.invalidate(name)
+        self.commit()
+        return True
+
+    # Removes every ref below a directory (given as <repository> relative name, e.g. ".config/nvim/")
+    # and the directory entries for it and any directory below it. Returns removed refs (sorted).
+    def remove_refs_under(self, dir_name: str) -> [str]:
+        self.check_valid()
+        if not dir_name.endswith("/"):
+            dir_name = dir_name + "/"
+        removed = self.index.remove_under(dir_name)
+        for name in removed:
+            self.stat_cache.invalidate(name)
+        removed_dirs = self.dirs.remove_under(dir_name)
+        if removed or removed_dirs:
+            self.commit()
+        return removed
+
+    # sorted refs below a directory given as <repository> relative name
+    def get_refs_under(self, dir_name: str) -> [str]:
+        self.check_valid()
+        if not dir_name.endswith("/"):
+            dir_name = dir_name + "/"
+        return self.index.refs_under(dir_name)
 
     def contains_ref(self, pathspec: Pathspec) -> bool:
         assert type(pathspec) is Pathspec, _ERROR_NOT_PATHSPEC
         self.check_valid()
         name = Pathspec.get_ref_from_repo(self.repo, pathspec)
-        exists = False
-        for ref in self.index:
-            if ref == name:
-                exists = True
-                break
-        log.debug("Contains ref: {0} -> {1}".format(pathspec, exists))
+        exists = name in self.index
+        log.debug("Contains ref: %s -> %s", pathspec, exists)
         return exists
 
+    # same as contains_ref but for an already resolved <repository> relative ref name
+    def contains_ref_name(self, name: str) -> bool:
+        return name in self.index
+
+    # true if <repository> relative ref name is below a tracked directory (see add_dir_ref)
+    def in_tracked_dir(self, name: str) -> bool:
+        position = name.find("/")
+        while position >= 0:
+            if name[:position + 1] in self.dirs:
+                return True
+            position = name.find("/", position + 1)
+        return False
+
+    # stat info of refs last found clean, entries are dropped when refs are added or removed
+    def get_stat_cache(self) -> StatCache:
+        return self.stat_cache
+
+    # sorted list of refs
     def get_index(self):
         self.check_valid()
-        return self.index
+        return self.index.to_list()
 
+    # sorted list of dir refs
     def get_dirs(self):
         self.check_valid()
-        return self.dirs
+        return self.dirs.to_list()
 
+    # index and dirs are kept sorted so they are always saved in order.
+    # Inside a transaction the write is deferred until the transaction ends.
     def commit(self):
         self.check_valid()
-        log.error("TODO: Sort refs in ref_store.commit() before saving!")
-        self.config.write_rc(self.repo, self.index, self.dirs)
+        if self.transaction_depth > 0:
+            self.transaction_dirty = True
+            return
+        self.config.write_rc(self.repo, self.index.to_list(), self.dirs.to_list())
+        self.stat_cache.save()
+
+    # Groups any number of index changes into a single config write:
+    #
+    #   with ref_store.transaction():
+    #       ref_store.add_ref(ps)
+    #       linker.link(ps)
+    #       ref_store.on_rollback(lambda: linker.unlink(ps))
+    #
+    # If the block raises, index and dirs are restored to what they were when the
+    # transaction started, registered rollback actions are run (newest first),
+    # nothing is written and the exception is re-raised. Nested transactions
+    # are joined into the outermost one.
+    @contextlib.contextmanager
+    def transaction(self):
+        if self.transaction_depth > 0:
+            self.transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self.transaction_depth -= 1
+            return
+
+        snapshot = (self.index.copy(), self.dirs.copy())
+        self.transaction_depth = 1
+        self.transaction_dirty = False
+        self.rollback_actions = []
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth = 0
+            self.index, self.dirs = snapshot
+            self.rollback()
+            raise
+        self.transaction_depth = 0
+        self.rollback_actions = []
+        if self.transaction_dirty:
+            self.transaction_dirty = False
+            self.commit()
+
+    # registers an action undoing a side effect (e.g. a created link) of the current transaction
+    def on_rollback(self, action):
+        if self.transaction_depth > 0:
+            self.rollback_actions.append(action)
+
+    def rollback(self):
+        actions, self.rollback_actions = self.rollback_actions, []
+        self.transaction_dirty = False
+        for action in reversed(actions):
+            try:
+                action()
+            except Exception as e:
+                log.error("rollback failed: {0}".format(e))
 
     def is_pathspec_in_repo_dir(self, pathspec: Pathspec) -> bool:
         assert type(pathspec) is Pathspec
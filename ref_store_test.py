@@ -4,6 +4,7 @@ import pytest
 from mockito import when, mock, unstub, verify, verifyZeroInteractions, ANY
 from config import Config
 from ref_store import RefStore
+from ref_index import RefIndex
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -15,6 +16,7 @@ def config(initial_index):
     config = mock(Config)
     when(config).read_rc().thenReturn(("", initial_index, []))
     when(config).write_rc(ANY, ANY, ANY)
+    when(config).get_stat_cache_file().thenReturn(None)
     yield config
     unstub()
 
@@ -43,6 +45,17 @@ def test_addRef_multipleRefs_addsAllRefs(config):
     assert ref_store.get_index() == ["somefile1", "somefile2"]
     verify(config, times=2).write_rc(ANY, ANY, [])
 
+@pytest.mark.parametrize('initial_index', [["somefile3", "somefile1"]])
+def test_addRef_unsortedIndex_keepsIndexSorted(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+
+    added = ref_store.add_ref(Pathspec("~/somefile2"))
+
+    assert added == True
+    assert ref_store.get_index() == ["somefile1", "somefile2", "somefile3"]
+    verify(config).write_rc("", ["somefile1", "somefile2", "somefile3"], [])
+
 @pytest.mark.parametrize('initial_index', [["somefile"]])
 def test_addRef_refAlreadyExists_doNothing(config):
     ref_store = RefStore(config)
@@ -85,6 +98,14 @@ def test_removeRef_removeSingleExistingWhenMultipleExists_leaveRemainingUnchange
     assert ref_store.get_index() == ["somefile2"]
     verify(config).write_rc(ANY, ANY, [])
 
+@pytest.mark.parametrize('initial_index', [["somefile1", "somefile2"]])
+def test_containsRef_trackedAndUntracked(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+
+    assert ref_store.contains_ref(Pathspec("~/somefile2")) == True
+    assert ref_store.contains_ref(Pathspec("~/somefile3")) == False
+
 @pytest.mark.parametrize('initial_index', [["somefile"]])
 def test_removeRef_refNotTracked_doNothing(config):
     ref_store = RefStore(config)
@@ -101,4 +122,93 @@ def test_removeRef_paramNotPathspec_throwException(config):
     ref_store = RefStore(config)
     when(ref_store).check_valid().thenReturn(True)
     with pytest.raises(Exception):
-        ref_store.remove_ref(4711)
\ No newline at end of file
+        ref_store.remove_ref(4711)
+
+@pytest.mark.parametrize('initial_index', [[".config/nvim/init.lua", ".config/nvim/lua/a.lua", ".config/nvim-extra/x", ".vimrc"]])
+def test_removeRefsUnder_directory_removesRefsAndDirsInOneWrite(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+    ref_store.dirs = RefIndex([".config/nvim/", ".config/nvim/lua/", ".config/nvim-extra/"])
+
+    removed = ref_store.remove_refs_under(".config/nvim")
+
+    assert removed == [".config/nvim/init.lua", ".config/nvim/lua/a.lua"]
+    assert ref_store.get_index() == [".config/nvim-extra/x", ".vimrc"]
+    assert ref_store.get_dirs() == [".config/nvim-extra/"]
+    verify(config, times=1).write_rc(ANY, ANY, ANY)
+
+def test_refIndex_refsUnder_onlyRefsWithPrefix():
+    index = RefIndex(["a/1", "a/2", "a0", "ab", "a.txt", "b"])
+
+    assert index.refs_under("a/") == ["a/1", "a/2"]
+    assert index.refs_under("c/") == []
+    assert index.refs_under("") == index.to_list()
+
+# MARK: - test stat cache
+
+@pytest.mark.parametrize('initial_index', [["somefile"]])
+def test_removeRef_cachedAsClean_dropsStatCacheEntry(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+    old_stat = os.stat_result((0o100644, 1, 2, 1, 0, 0, 3, 0, 0, 0, 0.0, 0.0, 0.0, 0, 1000, 0))
+    ref_store.get_stat_cache().mark_clean("somefile", old_stat, old_stat)
+    assert ref_store.get_stat_cache().is_clean("somefile", old_stat, old_stat)
+
+    ref_store.remove_ref(Pathspec("~/somefile"))
+
+    assert not ref_store.get_stat_cache().is_clean("somefile", old_stat, old_stat)
+
+# MARK: - test transaction
+
+@pytest.mark.parametrize('initial_index', [[]])
+def test_transaction_multipleAdds_writesOnce(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+
+    with ref_store.transaction():
+        ref_store.add_ref(Pathspec("~/somefile1"))
+        ref_store.add_ref(Pathspec("~/somefile2"))
+        verify(config, times=0).write_rc(ANY, ANY, ANY)
+
+    assert ref_store.get_index() == ["somefile1", "somefile2"]
+    verify(config, times=1).write_rc("", ["somefile1", "somefile2"], [])
+
+@pytest.mark.parametrize('initial_index', [[]])
+def test_transaction_nothingChanged_noWrite(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+
+    with ref_store.transaction():
+        pass
+
+    verify(config, times=0).write_rc(ANY, ANY, ANY)
+
+@pytest.mark.parametrize('initial_index', [["somefile"]])
+def test_transaction_failure_rollsBackIndexAndRunsRollbackActions(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+    undone = []
+
+    with pytest.raises(OSError):
+        with ref_store.transaction():
+            ref_store.add_ref(Pathspec("~/somefile1"))
+            ref_store.on_rollback(lambda: undone.append("somefile1"))
+            ref_store.remove_ref(Pathspec("~/somefile"))
+            raise OSError("link failed")
+
+    assert undone == ["somefile1"]
+    assert ref_store.get_index() == ["somefile"]
+    verify(config, times=0).write_rc(ANY, ANY, ANY)
+
+@pytest.mark.parametrize('initial_index', [[]])
+def test_transaction_nested_writesOnceWhenOutermostEnds(config):
+    ref_store = RefStore(config)
+    when(ref_store).check_valid().thenReturn(True)
+
+    with ref_store.transaction():
+        with ref_store.transaction():
+            ref_store.add_ref(Pathspec("~/somefile1"))
+        verify(config, times=0).write_rc(ANY, ANY, ANY)
+        ref_store.add_ref(Pathspec("~/somefile2"))
+
+    verify(config, times=1).write_rc("", ["somefile1", "somefile2"], [])
@@ -0,0 +1,83 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import log
+
+# Directory scanning based on os.scandir.
+#
+# walk_files() is an iterative (no recursion limit) generator over all files below a root.
+# Directories directly below root named in prune are never entered, so .git (and its object
+# store) is skipped during traversal instead of being listed and filtered out afterwards.
+# Directories with those names deeper down are walked as usual.
+# Like os.walk symlinks to directories are not followed.
+
+_GIT_DIR = '.git'
+
+# yields (rel_path, entry) for every non directory below root, rel_path uses "/" separators
+def walk_files(root: str, prune=()):
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except OSError as e:
+            log.debug("skipping unreadable directory: %s", e)
+            continue
+        with it:
+            for entry in it:
+                rel_path = rel_dir + "/" + entry.name if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not (rel_dir == "" and entry.name in prune) and not entry.is_symlink():
+                        stack.append(rel_path)
+                    continue
+                yield rel_path, entry
+
+
+# RepoScan - one pass over <repository> (excluding .git)
+#
+# files:  <repository> relative ref name -> stat result (None if it could not be stat'ed, e.g. broken symlink)
+# inodes: (dev, inode) -> ref names of repository files with that inode
+#
+# The inode map lets hard link integrity be checked from stat data of the system file
+# alone: a ref is linked if the inode of its system file maps back to the ref itself.
+class RepoScan:
+
+    def __init__(self):
+        self.files = {}
+        self.inodes = {}
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    @staticmethod
+    def scan(repo: str):
+        scan = RepoScan()
+        for ref_name, entry in walk_files(repo, prune=(_GIT_DIR,)):
+            try:
+                stat = entry.stat()
+            except OSError:
+                stat = None
+            scan.add(ref_name, stat)
+        log.debug("scanned %s files in repository", len(scan))
+        return scan
+
+    def add(self, ref_name: str, stat):
+        self.files[ref_name] = stat
+        if stat is not None:
+            self.inodes.setdefault((stat.st_dev, stat.st_ino), []).append(ref_name)
+
+    # stat result of ref in repository or None if it does not exist
+    def stat(self, ref_name: str):
+        return self.files.get(ref_name)
+
+    # true if system file with given stat is a hard link to ref in repository
+    def is_linked(self, ref_name: str, mine_stat) -> bool:
+        if mine_stat is None:
+            return False
+        return ref_name in self.inodes.get((mine_stat.st_dev, mine_stat.st_ino), ())
@@ -0,0 +1,50 @@
+import os
+from scanner import walk_files, RepoScan
+
+def write(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def test_walkFiles_prunesGitDir(tmpdir):
+    root = str(tmpdir)
+    write(os.path.join(root, ".git", "objects", "ab", "cdef"))
+    write(os.path.join(root, ".gitconfig"))
+    write(os.path.join(root, "a", "b", "c"))
+
+    names = sorted(rel_path for rel_path, _ in walk_files(root, prune=(".git",)))
+
+    assert names == [".gitconfig", "a/b/c"]
+
+def test_walkFiles_nestedGitDir_isWalked(tmpdir):
+    root = str(tmpdir)
+    write(os.path.join(root, ".git", "HEAD"))
+    write(os.path.join(root, ".vim", "bundle", "plugin", ".git", "config"))
+
+    names = sorted(rel_path for rel_path, _ in walk_files(root, prune=(".git",)))
+
+    assert names == [".vim/bundle/plugin/.git/config"]
+
+def test_walkFiles_doesNotFollowDirSymlinks(tmpdir):
+    root = str(tmpdir)
+    write(os.path.join(root, "real", "file"))
+    os.symlink(os.path.join(root, "real"), os.path.join(root, "alias"))
+
+    names = sorted(rel_path for rel_path, _ in walk_files(root))
+
+    assert names == ["real/file"]
+
+def test_repoScan_isLinked_usesInodeMap(tmpdir):
+    repo = os.path.join(str(tmpdir), "repo")
+    write(os.path.join(repo, "linked"))
+    write(os.path.join(repo, "copied"))
+    os.link(os.path.join(repo, "linked"), os.path.join(str(tmpdir), "linked"))
+    write(os.path.join(str(tmpdir), "copied"))
+
+    scan = RepoScan.scan(repo)
+
+    assert sorted(scan) == ["copied", "linked"]
+    assert scan.is_linked("linked", os.stat(os.path.join(str(tmpdir), "linked")))
+    assert not scan.is_linked("copied", os.stat(os.path.join(str(tmpdir), "copied")))
+    assert not scan.is_linked("copied", os.stat(os.path.join(str(tmpdir), "linked")))
+    assert scan.stat("missing") is None
@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import subprocess
+
+# Guards cold start of the CLI: trakk runs on every shell start, read only commands
+# must not pay for importing GitPython. Checked through imported modules, which is
+# deterministic, startup time itself is measured by trakk_bench.py.
+
+_TRAKK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trakk.py")
+
+def run_trakk(home, *args):
+    env = dict(os.environ, HOME=str(home))
+    env.pop('TRAKK_STORAGE', None)
+    return subprocess.run([sys.executable, "-X", "importtime", _TRAKK] + list(args),
+                          env=env, capture_output=True, text=True, cwd=str(home))
+
+def imported_modules(importtime_output):
+    modules = set()
+    for line in importtime_output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+def make_home(tmpdir):
+    repo = os.path.join(tmpdir, "repo")
+    os.makedirs(repo)
+    with open(os.path.join(tmpdir, ".trakk.config"), 'w') as f:
+        f.write(json.dumps({"repository": repo, "refs": [".vimrc"], "dirs": []}))
+    return tmpdir
+
+def test_list_doesNotImportGit(tmpdir):
+    home = make_home(tmpdir)
+
+    result = run_trakk(home, "--list")
+
+    assert result.returncode == 0
+    assert "~/.vimrc" in result.stdout
+    modules = imported_modules(result.stderr)
+    assert "git" not in modules
+    assert "injector" in modules
+
+def test_banner_doesNotImportGit(tmpdir):
+    home = make_home(tmpdir)
+
+    result = run_trakk(home)
+
+    assert "Trakk is live in" in result.stdout
+    assert "git" not in imported_modules(result.stderr)
@@ -0,0 +1,100 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import json
+import time
+import log
+
+# StatCache - remembers stat info of refs that were found clean
+#
+# Similar to the stat info git keeps in its index. After a ref has been checked and found
+# clean the (dev, inode, size, mtime_ns, nlink) of its mine and theirs sides are recorded.
+# As long as both sides stat the same on a later run the ref is still clean and needs no
+# git or content checks. Any change to either side (new inode after a save, size or mtime
+# change, link count change) makes it a cache miss and the ref is checked as usual.
+#
+# The cache is tagged with the state of git in <repository> (HEAD commit and stat of
+# .git/index, see git_head.state_tag) since moving HEAD or staging (e.g. git rm --cached)
+# can make a ref dirty without touching the file. Files modified within _RACY_WINDOW_NS of the check
+# are never recorded since a later change within the same mtime granularity could go
+# unnoticed (same reasoning as git "racy clean" entries).
+
+_CACHE_VERSION = 2
+_KEY_VERSION = 'version'
+_KEY_TAG = 'tag'
+_KEY_ENTRIES = 'entries'
+
+_RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+class StatCache:
+
+    # path may be None, the cache is then only kept in memory
+    def __init__(self, path: str = None):
+        self.path = path
+        self.entries = None
+        self.tag = None
+        self.dirty = False
+
+    @staticmethod
+    def signature(stat):
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_nlink)
+
+    def load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.loads(f.read())
+            if data.get(_KEY_VERSION) == _CACHE_VERSION:
+                self.tag = data.get(_KEY_TAG)
+                self.entries = {ref: (tuple(mine), tuple(theirs)) for ref, (mine, theirs) in data[_KEY_ENTRIES].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("discarding unreadable stat cache: %s", e)
+            self.entries = {}
+
+    # drops all entries if tag differs from the one cache was recorded at
+    def check_tag(self, tag):
+        self.load()
+        if tag != self.tag:
+            if self.entries:
+                log.debug("git state changed, discarding %s stat cache entries", len(self.entries))
+                self.entries = {}
+            self.tag = tag
+            self.dirty = True
+
+    def is_clean(self, ref, mine_stat, theirs_stat) -> bool:
+        if mine_stat is None or theirs_stat is None:
+            return False
+        self.load()
+        entry = self.entries.get(ref)
+        if entry is None:
+            return False
+        return entry == (StatCache.signature(mine_stat), StatCache.signature(theirs_stat))
+
+    def mark_clean(self, ref, mine_stat, theirs_stat):
+        self.load()
+        racy_limit = time.time_ns() - _RACY_WINDOW_NS
+        if mine_stat.st_mtime_ns >= racy_limit or theirs_stat.st_mtime_ns >= racy_limit:
+            self.invalidate(ref)
+            return
+        entry = (StatCache.signature(mine_stat), StatCache.signature(theirs_stat))
+        if self.entries.get(ref) != entry:
+            self.entries[ref] = entry
+            self.dirty = True
+
+    def invalidate(self, ref):
+        self.load()
+        if self.entries.pop(ref, None) is not None:
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        data = {_KEY_VERSION: _CACHE_VERSION, _KEY_TAG: self.tag, _KEY_ENTRIES: self.entries}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(data))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
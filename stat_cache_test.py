@@ -0,0 +1,69 @@
+import os
+import time
+import subprocess
+import git_head
+from stat_cache import StatCache
+
+def make_stat(ino, size=3, mtime_ns=1000, nlink=2):
+    # (mode, ino, dev, nlink, uid, gid, size, atime, mtime, ctime, float atime, mtime, ctime, atime_ns, mtime_ns, ctime_ns)
+    mtime = mtime_ns // 10**9
+    return os.stat_result((0o100644, ino, 1, nlink, 0, 0, size, 0, mtime, 0, 0.0, float(mtime), 0.0, 0, mtime_ns, 0))
+
+def test_isClean_unknownRef_false():
+    cache = StatCache()
+    assert not cache.is_clean("ref", make_stat(1), make_stat(1))
+
+def test_markClean_sameStat_isClean():
+    cache = StatCache()
+    cache.mark_clean("ref", make_stat(1), make_stat(1))
+    assert cache.is_clean("ref", make_stat(1), make_stat(1))
+
+def test_markClean_changedInodeOrMtime_notClean():
+    cache = StatCache()
+    cache.mark_clean("ref", make_stat(1), make_stat(1))
+    assert not cache.is_clean("ref", make_stat(2), make_stat(1))
+    assert not cache.is_clean("ref", make_stat(1, mtime_ns=2000), make_stat(1, mtime_ns=2000))
+    assert not cache.is_clean("ref", make_stat(1), None)
+
+def test_markClean_recentlyModified_notRecorded():
+    cache = StatCache()
+    now = time.time_ns()
+    cache.mark_clean("ref", make_stat(1, mtime_ns=now), make_stat(1, mtime_ns=now))
+    assert not cache.is_clean("ref", make_stat(1, mtime_ns=now), make_stat(1, mtime_ns=now))
+
+def test_checkTag_tagChanged_dropsEntries():
+    cache = StatCache()
+    cache.check_tag(["abc", 1, 10])
+    cache.mark_clean("ref", make_stat(1), make_stat(1))
+    cache.check_tag(["abc", 1, 10])
+    assert cache.is_clean("ref", make_stat(1), make_stat(1))
+    cache.check_tag(["abc", 2, 10])
+    assert not cache.is_clean("ref", make_stat(1), make_stat(1))
+
+def test_save_reload_keepsEntries(tmpdir):
+    path = os.path.join(tmpdir, "stat-cache")
+    cache = StatCache(path)
+    cache.check_tag(["abc", 1, 10])
+    cache.mark_clean("ref", make_stat(1), make_stat(1))
+    cache.save()
+
+    reloaded = StatCache(path)
+    reloaded.check_tag(["abc", 1, 10])
+    assert reloaded.is_clean("ref", make_stat(1), make_stat(1))
+
+def test_checkTag_refUnstaged_dropsEntries(tmpdir):
+    repo = str(tmpdir)
+    git = ["git", "-C", repo, "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(["git", "init", "-q", repo], check=True)
+    with open(os.path.join(repo, "ref"), 'w') as f:
+        f.write("ref")
+    subprocess.run(git + ["add", "ref"], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "ref"], check=True)
+    cache = StatCache()
+    cache.check_tag(git_head.state_tag(repo))
+    cache.mark_clean("ref", make_stat(1), make_stat(1))
+
+    subprocess.run(git + ["rm", "-q", "--cached", "ref"], check=True)
+    cache.check_tag(git_head.state_tag(repo))
+
+    assert not cache.is_clean("ref", make_stat(1), make_stat(1))
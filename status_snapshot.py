@@ -0,0 +1,87 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import json
+import time
+import log
+import git_head
+from broken_ref_type import BrokenRefType
+
+# StatusSnapshot - broken refs found by the last full status run, for --status --cached
+#
+# A snapshot is tagged with what it was computed from: the commit HEAD points to, the
+# modification time of .git/index and of the trakk configuration (index of refs). Checking
+# the tag needs a few small reads and two stats, no git, no scan of repository or system.
+#
+# Changes made to system files directly (e.g. an editor replacing a linked file) do not
+# show in the tag, so a snapshot is only trusted for _MAX_AGE_SECONDS. After that (or when
+# the tag differs) --cached falls back to a full status run, which writes a new snapshot.
+
+_SNAPSHOT_VERSION = 1
+_KEY_VERSION = 'version'
+_KEY_TAG = 'tag'
+_KEY_CREATED = 'created'
+_KEY_BROKEN = 'broken'
+
+_MAX_AGE_SECONDS = 600
+
+_GIT_INDEX = 'index'
+
+def _mtime_ns(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+# what a snapshot of repository with given configuration (storage) file depends on
+def current_tag(repo: str, rc_file: str) -> dict:
+    return {
+        'head': git_head.read_head(repo),
+        'git_index': _mtime_ns(os.path.join(git_head.git_dir(repo), _GIT_INDEX)),
+        'rc': _mtime_ns(rc_file),
+    }
+
+class StatusSnapshot:
+
+    def __init__(self, tag: dict, broken_refs: [BrokenRefType], created: float = None):
+        self.tag = tag
+        self.broken_refs = broken_refs
+        self.created = created if created is not None else time.time()
+
+    def is_valid(self, tag: dict, now: float = None) -> bool:
+        if now is None:
+            now = time.time()
+        if self.tag != tag:
+            log.debug("status snapshot is stale, tag changed")
+            return False
+        if not 0 <= now - self.created <= _MAX_AGE_SECONDS:
+            log.debug("status snapshot is stale, too old")
+            return False
+        return True
+
+    def to_json(self) -> str:
+        broken = [[ref.type, ref.reason, ref.mine, ref.theirs] for ref in self.broken_refs]
+        return json.dumps({_KEY_VERSION: _SNAPSHOT_VERSION, _KEY_TAG: self.tag, _KEY_CREATED: self.created, _KEY_BROKEN: broken})
+
+    @staticmethod
+    def from_json(encoded: str):
+        data = json.loads(encoded)
+        if data.get(_KEY_VERSION) != _SNAPSHOT_VERSION:
+            return None
+        broken_refs = [BrokenRefType(*fields) for fields in data[_KEY_BROKEN]]
+        return StatusSnapshot(data[_KEY_TAG], broken_refs, data[_KEY_CREATED])
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_json())
+        os.replace(tmp_path, path)
+
+    # snapshot or None if missing or unreadable
+    @staticmethod
+    def load(path: str):
+        try:
+            with open(path, 'r') as f:
+                return StatusSnapshot.from_json(f.read())
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.debug("no usable status snapshot: %s", e)
+            return None
@@ -0,0 +1,54 @@
+import os
+import status_snapshot
+from status_snapshot import StatusSnapshot
+from broken_ref_type import BrokenRefType
+
+def make_repo(tmpdir):
+    repo = os.path.join(tmpdir, "repo")
+    os.makedirs(os.path.join(repo, ".git", "refs", "heads"))
+    with open(os.path.join(repo, ".git", "HEAD"), 'w') as f:
+        f.write("ref: refs/heads/master\n")
+    with open(os.path.join(repo, ".git", "refs", "heads", "master"), 'w') as f:
+        f.write("a" * 40 + "\n")
+    rc_file = os.path.join(tmpdir, ".trakk.config")
+    open(rc_file, 'w').close()
+    return repo, rc_file
+
+def test_saveLoad_roundTrip(tmpdir):
+    path = os.path.join(tmpdir, "snapshot")
+    refs = [BrokenRefType.B("/home/mine", "/repo/theirs"), BrokenRefType.F("/repo/untracked")]
+    tag = {'head': "a" * 40, 'git_index': 1, 'rc': 2}
+
+    StatusSnapshot(tag, refs, created=10.0).save(path)
+    loaded = StatusSnapshot.load(path)
+
+    assert loaded.tag == tag
+    assert [(ref.type, ref.reason, ref.mine, ref.theirs) for ref in loaded.broken_refs] == \
+           [(ref.type, ref.reason, ref.mine, ref.theirs) for ref in refs]
+
+def test_load_missingOrCorrupt_returnsNone(tmpdir):
+    path = os.path.join(tmpdir, "snapshot")
+    assert StatusSnapshot.load(path) is None
+    with open(path, 'w') as f:
+        f.write("{not json")
+    assert StatusSnapshot.load(path) is None
+
+def test_isValid_tagChanges_whenRcOrHeadChanges(tmpdir):
+    repo, rc_file = make_repo(tmpdir)
+    snapshot = StatusSnapshot(status_snapshot.current_tag(repo, rc_file), [])
+    assert snapshot.is_valid(status_snapshot.current_tag(repo, rc_file))
+
+    os.utime(rc_file, ns=(0, 0))
+    assert not snapshot.is_valid(status_snapshot.current_tag(repo, rc_file))
+
+    snapshot = StatusSnapshot(status_snapshot.current_tag(repo, rc_file), [])
+    with open(os.path.join(repo, ".git", "refs", "heads", "master"), 'w') as f:
+        f.write("b" * 40 + "\n")
+    assert not snapshot.is_valid(status_snapshot.current_tag(repo, rc_file))
+
+def test_isValid_tooOld_false():
+    tag = {'head': None, 'git_index': None, 'rc': None}
+    snapshot = StatusSnapshot(tag, [], created=1000.0)
+
+    assert snapshot.is_valid(tag, now=1000.0 + 60)
+    assert not snapshot.is_valid(tag, now=1000.0 + status_snapshot._MAX_AGE_SECONDS + 1)
@@ -0,0 +1,137 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import json
+import sqlite3
+import log
+
+# Storage backends for the run-configuration (<repository> pointer, <index> and tracked <dirs>).
+#
+# Every backend implements:
+#   read()  -> (repo_path, index, dirs)
+#   write(repo_path, index, dirs)
+#
+# JsonStorage is the original format, the whole configuration is one JSON document
+# that is loaded and dumped on every read/write. Writes go to a temporary file renamed
+# over the configuration, readers (and watchers, see LinkWatcher) never see it half written.
+# SqliteStorage keeps refs as rows in a table keyed by ref name. Writes only touch the
+# rows that changed. Reads still load the full index, lookups and prefix queries are
+# answered from memory by RefIndex.
+
+_JSON_KEY_REPOSITORY = 'repository'
+_JSON_KEY_REFS = 'refs' # the index
+_JSON_KEY_DIRS = 'dirs' # the index of tracked dirs
+_TMP_SUFFIX = '.tmp'
+
+_SQL_KEY_REPOSITORY = 'repository'
+_MIGRATED_SUFFIX = '.migrated'
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS refs (ref TEXT PRIMARY KEY) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS dirs (ref TEXT PRIMARY KEY) WITHOUT ROWID",
+]
+
+class JsonStorage:
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return None, [], []
+
+        with open(self.path, 'r') as f:
+            data = json.loads(f.read())
+
+        repo_path = data.get(_JSON_KEY_REPOSITORY)
+        index = data.get(_JSON_KEY_REFS, [])
+        dirs = data.get(_JSON_KEY_DIRS, [])
+        return repo_path, index, dirs
+
+    def write(self, repo_path: str, index: [str], dirs: [str]):
+        data = {_JSON_KEY_REPOSITORY: repo_path, _JSON_KEY_REFS: index, _JSON_KEY_DIRS: dirs}
+        encoded = json.dumps(data)
+        tmp_path = self.path + _TMP_SUFFIX
+        with open(tmp_path, 'w') as f:
+            f.write(encoded)
+        os.replace(tmp_path, self.path)
+
+
+# If the database does not exist yet but a JSON configuration does (legacy_path) the JSON
+# configuration is imported on first read and renamed to <legacy_path>.migrated
+class SqliteStorage:
+
+    def __init__(self, path: str, legacy_path: str = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.conn = None
+        # refs/dirs currently stored in database, used to compute incremental updates
+        self.stored_refs = None
+        self.stored_dirs = None
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path)
+            with self.conn:
+                for statement in _SCHEMA:
+                    self.conn.execute(statement)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            if self.legacy_path and os.path.isfile(self.legacy_path):
+                self.migrate(self.legacy_path)
+            else:
+                return None, [], []
+
+        conn = self.connect()
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (_SQL_KEY_REPOSITORY,)).fetchone()
+        repo_path = row[0] if row else None
+        index = [ref for (ref,) in conn.execute("SELECT ref FROM refs ORDER BY ref")]
+        dirs = [ref for (ref,) in conn.execute("SELECT ref FROM dirs ORDER BY ref")]
+        self.stored_refs = set(index)
+        self.stored_dirs = set(dirs)
+        return repo_path, index, dirs
+
+    # only rows that differ from what is already stored are inserted/deleted
+    def write(self, repo_path: str, index: [str], dirs: [str]):
+        conn = self.connect()
+        if self.stored_refs is None:
+            self.stored_refs = set(ref for (ref,) in conn.execute("SELECT ref FROM refs"))
+            self.stored_dirs = set(ref for (ref,) in conn.execute("SELECT ref FROM dirs"))
+
+        refs, dir_refs = set(index), set(dirs)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (_SQL_KEY_REPOSITORY, repo_path))
+            self.update_table(conn, "refs", self.stored_refs, refs)
+            self.update_table(conn, "dirs", self.stored_dirs, dir_refs)
+        self.stored_refs = refs
+        self.stored_dirs = dir_refs
+
+    def update_table(self, conn, table, stored, wanted):
+        removed = stored - wanted
+        added = wanted - stored
+        if removed:
+            conn.executemany("DELETE FROM {0} WHERE ref = ?".format(table), ((ref,) for ref in removed))
+        if added:
+            conn.executemany("INSERT OR IGNORE INTO {0} (ref) VALUES (?)".format(table), ((ref,) for ref in added))
+        log.debug("%s: %s rows added, %s rows removed", table, len(added), len(removed))
+
+    def migrate(self, legacy_path: str):
+        log.info("Migrating configuration {0} -> {1}".format(legacy_path, self.path))
+        repo_path, index, dirs = JsonStorage(legacy_path).read()
+        self.stored_refs = set()
+        self.stored_dirs = set()
+        try:
+            self.write(repo_path, index, dirs)
+        except BaseException:
+            # do not leave a half migrated database behind, it would shadow the JSON configuration
+            self.close()
+            os.remove(self.path)
+            raise
+        os.rename(legacy_path, legacy_path + _MIGRATED_SUFFIX)
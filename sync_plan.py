@@ -0,0 +1,106 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import json
+
+# SyncPlan - list of actions that resolves broken refs, built before anything is changed.
+#
+# Sync is done in two steps: first a plan is built from broken refs (and sync policy),
+# then the plan is applied. Plans are plain data so they can be printed (--dry-run),
+# saved as JSON and applied later.
+#
+# Action kinds:
+#   link:       hard link src to dest, dest does not exist (types C and D)
+#   relink:     replace dest with a hard link to src (type B)
+#   add_ref:    add ref to index (type F), src is the file in repository
+#   add:        link src (new file in system) to dest and add it to index (type G)
+#   remove_ref: remove ref from index (type E)
+#   ask:        needs a decision from user (types B, C, E), asked for when everything else is done
+#   skip:       nothing is done (undecided by policy in non-interactive mode or declined)
+#
+# Actions for type B record stat signatures (see StatCache.signature) of mine and theirs
+# when planned. A saved plan is only applied where the ref is still broken the same way
+# and, for B, neither side changed since (see App.check_saved_plan).
+
+LINK = 'link'
+RELINK = 'relink'
+ADD_REF = 'add_ref'
+ADD = 'add'
+REMOVE_REF = 'remove_ref'
+ASK = 'ask'
+SKIP = 'skip'
+
+_PLAN_VERSION = 2
+_KEY_VERSION = 'version'
+_KEY_ACTIONS = 'actions'
+
+_ERROR_UNSUPPORTED_PLAN = "Unsupported sync plan version: {0}"
+
+class SyncAction:
+
+    # ref is the users home relative ref name (repository relative for add_ref)
+    # broken_type is the type of broken ref (see BrokenRefType) the action resolves
+    # stats are stat signatures {"mine": [..], "theirs": [..]} (None for a missing side) when planned
+    def __init__(self, kind: str, ref: str, src: str = None, dest: str = None, broken_type: str = None, stats: dict = None):
+        self.kind = kind
+        self.ref = ref
+        self.src = src
+        self.dest = dest
+        self.broken_type = broken_type
+        self.stats = stats
+
+    def __repr__(self):
+        return "SyncAction: {0} ref {1} src {2} dest {3}".format(self.kind, self.ref, self.src, self.dest)
+
+    def __eq__(self, other):
+        return isinstance(other, SyncAction) and self.to_dict() == other.to_dict()
+
+    def describe(self) -> str:
+        if self.kind in (LINK, RELINK, ADD):
+            return "{0:<10} {1} -> {2}".format(self.kind, self.src, self.dest)
+        return "{0:<10} {1} (type {2})".format(self.kind, self.ref, self.broken_type)
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'ref': self.ref, 'src': self.src, 'dest': self.dest, 'type': self.broken_type, 'stats': self.stats}
+
+    @staticmethod
+    def from_dict(data: dict):
+        return SyncAction(data['kind'], data['ref'], data.get('src'), data.get('dest'), data.get('type'), data.get('stats'))
+
+
+class SyncPlan:
+
+    def __init__(self, actions=None):
+        self.actions = list(actions) if actions else []
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def __iter__(self):
+        return iter(self.actions)
+
+    def add(self, action: SyncAction):
+        self.actions.append(action)
+
+    def by_kind(self, kind: str) -> [SyncAction]:
+        return [action for action in self.actions if action.kind == kind]
+
+    def describe(self) -> [str]:
+        return [action.describe() for action in self.actions]
+
+    def to_json(self) -> str:
+        return json.dumps({_KEY_VERSION: _PLAN_VERSION, _KEY_ACTIONS: [action.to_dict() for action in self.actions]}, indent=2)
+
+    @staticmethod
+    def from_json(encoded: str):
+        data = json.loads(encoded)
+        if data.get(_KEY_VERSION) != _PLAN_VERSION:
+            raise ValueError(_ERROR_UNSUPPORTED_PLAN.format(data.get(_KEY_VERSION)))
+        return SyncPlan(SyncAction.from_dict(action) for action in data[_KEY_ACTIONS])
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+    @staticmethod
+    def load(path: str):
+        with open(path, 'r') as f:
+            return SyncPlan.from_json(f.read())
@@ -0,0 +1,21 @@
+import os
+import pytest
+import sync_plan
+from sync_plan import SyncPlan, SyncAction
+
+def test_saveAndLoad_sameActions(tmpdir):
+    plan = SyncPlan()
+    plan.add(SyncAction(sync_plan.LINK, ".bashrc", "/home/repo/.bashrc", "/home/.bashrc", "D"))
+    plan.add(SyncAction(sync_plan.ASK, ".vimrc", "/home/.vimrc", "/home/repo/.vimrc", "B", {"mine": [1, 2, 3, 4, 1], "theirs": None}))
+    plan.add(SyncAction(sync_plan.ADD_REF, "stray", "/home/repo/stray", None, "F"))
+    path = os.path.join(tmpdir, "plan.json")
+
+    plan.save(path)
+    loaded = SyncPlan.load(path)
+
+    assert list(loaded) == list(plan)
+    assert loaded.by_kind(sync_plan.ASK) == [plan.actions[1]]
+
+def test_fromJson_unknownVersion_throwException():
+    with pytest.raises(ValueError):
+        SyncPlan.from_json('{"version": 99, "actions": []}')
@@ -0,0 +1,95 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import json
+import log
+
+# SyncPolicy - decides how --sync resolves broken refs without asking
+#
+# prefer:      conflicting content (type B), keep "mine", "theirs" or the "newest" of both
+# on_missing:  ref missing in both system and repository (type E), "remove" it from index or "skip"
+# on_unlinked: ref present in system but not in repository (type C), "link" it or "skip"
+#
+# Decisions come from, in order of precedence:
+#   1. per directory prefix rules in the policy file (longest matching prefix wins)
+#   2. command line (--prefer, --on-missing, --on-unlinked)
+#   3. defaults in the policy file
+# Policy file (<rc>.policy) example:
+#   {"prefer": "newest", "on_missing": "skip",
+#    "prefixes": {".config/nvim/": {"prefer": "mine"}, "Library/": {"on_unlinked": "skip"}}}
+#
+# A decision that is not set by any of these is None. In interactive mode the user is asked
+# for those, otherwise they are skipped. Interactive mode is off as soon as any policy is
+# given on command line, so sync never waits for input in automated runs.
+
+PREFER = 'prefer'
+ON_MISSING = 'on_missing'
+ON_UNLINKED = 'on_unlinked'
+
+MINE = 'mine'
+THEIRS = 'theirs'
+NEWEST = 'newest'
+REMOVE = 'remove'
+LINK = 'link'
+SKIP = 'skip'
+
+CHOICES = {
+    PREFER: [MINE, THEIRS, NEWEST],
+    ON_MISSING: [REMOVE, SKIP],
+    ON_UNLINKED: [LINK, SKIP],
+}
+
+_KEY_PREFIXES = 'prefixes'
+
+_ERROR_INVALID_DECISION = "Invalid policy {0}: {1} (expected one of: {2})"
+
+def _check_decisions(decisions: dict) -> dict:
+    checked = {}
+    for key, value in decisions.items():
+        if key not in CHOICES:
+            log.error("Ignoring unknown policy: {0}".format(key))
+            continue
+        if value is None:
+            continue
+        if value not in CHOICES[key]:
+            raise ValueError(_ERROR_INVALID_DECISION.format(key, value, ", ".join(CHOICES[key])))
+        checked[key] = value
+    return checked
+
+class SyncPolicy:
+
+    def __init__(self, defaults: dict = None, rules: dict = None, interactive: bool = True):
+        self.defaults = _check_decisions(defaults or {})
+        # list of (prefix, decisions), longest prefix first
+        self.rules = sorted(((prefix, _check_decisions(decisions)) for prefix, decisions in (rules or {}).items()),
+                            key=lambda rule: len(rule[0]), reverse=True)
+        self.interactive = interactive
+
+    # decision for key (PREFER, ON_MISSING, ON_UNLINKED) of a home relative ref, or None if undecided
+    def decide(self, key: str, ref: str):
+        for prefix, decisions in self.rules:
+            if key in decisions and ref.startswith(prefix):
+                return decisions[key]
+        return self.defaults.get(key)
+
+    # resolves "newest" to either mine or theirs using modification times
+    def prefer(self, ref: str, mine: str, theirs: str):
+        decision = self.decide(PREFER, ref)
+        if decision != NEWEST:
+            return decision
+        try:
+            return MINE if os.stat(mine).st_mtime_ns >= os.stat(theirs).st_mtime_ns else THEIRS
+        except OSError:
+            return None
+
+    # overrides are command line decisions, they take precedence over policy file defaults
+    @staticmethod
+    def load(path: str = None, overrides: dict = None):
+        defaults, rules = {}, {}
+        if path and os.path.isfile(path):
+            with open(path, 'r') as f:
+                data = json.loads(f.read())
+            rules = data.pop(_KEY_PREFIXES, {})
+            defaults = data
+        overrides = {key: value for key, value in (overrides or {}).items() if value is not None}
+        defaults.update(overrides)
+        return SyncPolicy(defaults, rules, interactive=not overrides)
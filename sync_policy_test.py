@@ -0,0 +1,48 @@
+import os
+import json
+import pytest
+import sync_policy
+from sync_policy import SyncPolicy
+
+def test_load_noFileNoOverrides_interactiveAndUndecided():
+    policy = SyncPolicy.load(None, {sync_policy.PREFER: None})
+    assert policy.interactive
+    assert policy.decide(sync_policy.PREFER, ".vimrc") is None
+
+def test_load_overrides_nonInteractive():
+    policy = SyncPolicy.load(None, {sync_policy.ON_MISSING: sync_policy.REMOVE})
+    assert not policy.interactive
+    assert policy.decide(sync_policy.ON_MISSING, ".vimrc") == sync_policy.REMOVE
+    assert policy.decide(sync_policy.ON_UNLINKED, ".vimrc") is None
+
+def test_decide_longestPrefixRuleWins(tmpdir):
+    path = os.path.join(tmpdir, "policy")
+    with open(path, 'w') as f:
+        f.write(json.dumps({"prefer": "theirs", "prefixes": {
+            ".config/": {"prefer": "mine"},
+            ".config/nvim/": {"prefer": "newest"},
+            ".config/git/": {"on_missing": "remove"}}}))
+
+    policy = SyncPolicy.load(path, {sync_policy.PREFER: sync_policy.MINE})
+
+    assert policy.decide(sync_policy.PREFER, ".config/nvim/init.vim") == sync_policy.NEWEST
+    assert policy.decide(sync_policy.PREFER, ".config/git/config") == sync_policy.MINE
+    assert policy.decide(sync_policy.ON_MISSING, ".config/git/config") == sync_policy.REMOVE
+    assert policy.decide(sync_policy.PREFER, ".vimrc") == sync_policy.MINE
+
+def test_prefer_newest_picksMostRecentlyModified(tmpdir):
+    mine, theirs = os.path.join(tmpdir, "mine"), os.path.join(tmpdir, "theirs")
+    for path in (mine, theirs):
+        with open(path, 'w') as f:
+            f.write(path)
+    os.utime(mine, ns=(0, 1000))
+    os.utime(theirs, ns=(0, 2000))
+    policy = SyncPolicy({sync_policy.PREFER: sync_policy.NEWEST})
+
+    assert policy.prefer("mine", mine, theirs) == sync_policy.THEIRS
+    os.utime(mine, ns=(0, 3000))
+    assert policy.prefer("mine", mine, theirs) == sync_policy.MINE
+
+def test_invalidDecision_throwException():
+    with pytest.raises(ValueError):
+        SyncPolicy({sync_policy.PREFER: "both"})
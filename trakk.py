@@ -1,21 +1,38 @@
 #!/usr/local/bin/python3
 # author: Samuel Wejeus (samuel@isalldigital.com)
-from injector import Module, provider, Injector, inject, singleton
-
 import sys
+import atexit
 import argparse
 import os
-import git
-from distutils.util import strtobool
 
-from app_module import AppModule
-from linker import Linker
 from ref_store import RefStore
 from app import App, AVAILABLE_ACTIONS
 from config import Config, APP, VERSION
+import sync_policy
+import profiler
 import log
 
-injector = Injector(AppModule())
+# Keep startup cheap: trakk runs on every shell start. Injector is imported when first
+# needed and GitPython when git is first used, --list and the banner never load git.
+
+_injector = None
+
+def get_instance(cls):
+	global _injector
+	if _injector is None:
+		from injector import Injector
+		from app_module import AppModule
+		_injector = Injector(AppModule())
+	return _injector.get(cls)
+
+# same answers as distutils strtobool (yes=True, no=False)
+def _is_yes(answer: str) -> bool:
+	answer = answer.strip().lower()
+	if answer in ('y', 'yes', 't', 'true', 'on', '1'):
+		return True
+	if answer in ('n', 'no', 'f', 'false', 'off', '0'):
+		return False
+	raise ValueError("invalid truth value {0}".format(answer))
 
 
 #_ERROR_REPOSITORY_NOT_EMPTY = "Specified repository path is not empty and/or already exists"
@@ -24,7 +41,7 @@ _ERROR_INVALID_REPOSITORY_PATH_NOT_IN_HOME = "Invalid repository! Repository pat
 
 def check_initialized():
 	# test if config exists and repo is valid
-	ref_store = injector.get(RefStore)
+	ref_store = get_instance(RefStore)
 	ref_store.check_valid()
 
 def setup_repo_and_ref_store(path) -> bool:
@@ -37,7 +54,7 @@ def setup_repo_and_ref_store(path) -> bool:
 	# TODO test what happens if I give non existing path here...
 	if not _is_repo_dir_empty(repo_abs_path):
 		log.info("Potential repository already exist at location (i.e it is not empty).\nUse as {0} repository? [y/n]".format(APP))
-		yes = strtobool(input().lower()) # yes=1, no=0
+		yes = _is_yes(input())
 		if not yes:
 			log.info("Aborting..")
 			return False
@@ -46,9 +63,9 @@ def setup_repo_and_ref_store(path) -> bool:
 		log.debug("creating missing directories..")
 		os.makedirs(repo_abs_path)
 
-	config = injector.get(Config)
+	config = get_instance(Config)
 	config.write_rc(repo_abs_path, [])
-	ref_store = injector.get(RefStore)
+	ref_store = get_instance(RefStore)
 	ref_store.reload()
 	return True
 
@@ -60,7 +77,7 @@ def _is_repo_dir_empty(abspath):
 
 # test to see if already exists otherwise create new
 def init(path):
-	ref_store = injector.get(RefStore)
+	ref_store = get_instance(RefStore)
 
 	try:
 		check_initialized()
@@ -71,6 +88,7 @@ def init(path):
 
 	try:
 		if setup_repo_and_ref_store(path):
+			import git
 			assert git.Repo.init(os.path.abspath(path)).__class__ is git.Repo
 			log.info("Initialized {0} repository in {1}".format(APP, ref_store.get_repository()))	
 	except BaseException as e:
@@ -90,19 +108,42 @@ def clone(params):
 		# TODO must create new index with refs from repo
 		# TODO need to --sync afterwards, figure out how to solve --sync here..
 		# repo = git.Repo(store.get_repository())
+		import git
 		git.Repo.clone_from(repo_url, path)
 	except BaseException as e:
 		log.error(e)
 		sys.exit(1)
 	sys.exit(1)
 
+# paths listed one per line in file (or stdin for "-"), blank lines and # comments are skipped
+def read_path_list(path):
+	if path == '-':
+		lines = sys.stdin.read().splitlines()
+	else:
+		with open(path, 'r') as f:
+			lines = f.read().splitlines()
+	return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+# applies options and removes them from args so only commands remain
+def configure(args):
+	config = get_instance(Config)
+	from_file = args.pop('from_file')
+	if from_file:
+		args['add'] = (args['add'] or []) + read_path_list(from_file)
+	workers = args.pop('workers')
+	if workers is not None:
+		config.set_workers(workers)
+	for option in list(sync_policy.CHOICES) + ['dry_run', 'save_plan', 'apply_plan', 'pager', 'cached']:
+		config.set_option(option, args.pop(option))
+
 def dispatch(command, params):
 	if command in AVAILABLE_ACTIONS:
 		try:
-			check_initialized()
-			trakkApp = injector.get(App)
-			method = getattr(trakkApp, command)
-			method(params)
+			with profiler.phase(command):
+				check_initialized()
+				trakkApp = get_instance(App)
+				method = getattr(trakkApp, command)
+				method(params)
 		except BaseException as e:
 			log.error(e)
 			sys.exit(1)
@@ -136,6 +177,18 @@ parser.add_argument('--status',
 					action='store_true',
 					help='Show any inconsistencies between original system files and mirror files and folders')
 
+parser.add_argument('--daemon',
+					action='store_true',
+					help='Run in foreground keeping status live (Linux, inotify). --status then asks the daemon')
+
+parser.add_argument('--watch',
+					action='store_true',
+					help='Run in foreground relinking tracked files replaced by editors that save atomically (Linux, inotify)')
+
+parser.add_argument('--cached',
+					action='store_true', dest='cached',
+					help='With --status: use result of last full status if nothing changed since (fast, for shell prompts)')
+
 parser.add_argument('--sync',
 					action='store_true',
 					help='Synchronize potentially broken links and/or missing files or files detected in trakk dir but is added as watched files in git (i.e. missing in index)')
@@ -145,7 +198,11 @@ parser.add_argument('--sync',
 
 parser.add_argument('--add',
 					type=str, dest='add', nargs='+', metavar="<pathspec>",
-					help='Stage a file or directory to be included in tracking')
+					help='Stage files or directories (or glob patterns) to be included in tracking')
+
+parser.add_argument('--from-file',
+					type=str, dest='from_file', metavar="<file>",
+					help='Add paths listed in file, one per line ("-" reads from stdin)')
 
 parser.add_argument('--remove',
 					type=str, dest='remove', nargs='+', metavar="<pathspec>",
@@ -155,9 +212,51 @@ parser.add_argument('--show',
 					type=str, dest='show', nargs='+', metavar="<pathspec>",
 					help='Show diff for file')
 
+# Options (modify how commands are run)
+
+parser.add_argument('--workers',
+					type=int, dest='workers', metavar="<n>",
+					help='Number of worker threads used for filesystem operations (default: number of CPUs + 4, max 32)')
+
+parser.add_argument('--prefer',
+					type=str, dest='prefer', choices=sync_policy.CHOICES[sync_policy.PREFER],
+					help='Sync without asking: resolve conflicting content by keeping mine (system), theirs (repository) or the newest')
+
+parser.add_argument('--on-missing',
+					type=str, dest='on_missing', choices=sync_policy.CHOICES[sync_policy.ON_MISSING],
+					help='Sync without asking: remove or skip refs missing in both system and repository')
+
+parser.add_argument('--on-unlinked',
+					type=str, dest='on_unlinked', choices=sync_policy.CHOICES[sync_policy.ON_UNLINKED],
+					help='Sync without asking: link or skip refs present in system but missing in repository')
+
+parser.add_argument('--dry-run',
+					action='store_true', dest='dry_run',
+					help='Only print what sync would do')
+
+parser.add_argument('--save-plan',
+					type=str, dest='save_plan', metavar="<file>",
+					help='Save what sync will do as JSON (use with --dry-run to only save it)')
+
+parser.add_argument('--apply-plan',
+					type=str, dest='apply_plan', metavar="<file>",
+					help='Sync by applying a plan saved with --save-plan')
+
+parser.add_argument('--pager',
+					action='store_true', dest='pager',
+					help='Page output of --show through $PAGER (default: less -R)')
+
+parser.add_argument('-v', '--verbose',
+					action='store_true', dest='verbose',
+					help='Print debug messages to stderr (same as TRAKK_LOG=debug)')
+
+parser.add_argument('--profile',
+					type=str, dest='profile', nargs='?', const=profiler.TEXT, choices=profiler.FORMATS,
+					help='Time phases and count stat calls, git invocations and bytes read, report is printed to stderr at exit (text or json, default: text)')
+
 if len(sys.argv)==1:
 	try:
-		ref_store = injector.get(RefStore)
+		ref_store = get_instance(RefStore)
 		log.info("Trakk is live in: {0}".format(ref_store.get_repository()))
 	except IOError as e:
 		log.info("{0}\n".format(e))
@@ -165,6 +264,17 @@ if len(sys.argv)==1:
 	sys.exit(1)
 
 args = vars(parser.parse_args())
+if args.pop('verbose'):
+	log.set_level(log.DEBUG)
+profile_format = args.pop('profile')
+if profile_format:
+	profiler.enable()
+	atexit.register(profiler.write_report, profile_format)
+try:
+	configure(args)
+except (ValueError, OSError) as e:
+	log.error(e)
+	sys.exit(1)
 for command in args:
 	if args[command]:
 		dispatch(command, args[command])
@@ -0,0 +1,250 @@
+#!/usr/local/bin/python3
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+# Benchmark of the trakk command line on synthetic home directories.
+#
+# For each size a temporary $HOME is built with a git repository and N files in a tracked
+# directory. Commands are run through trakk.py in a subprocess (same as a user would, so
+# startup is included) and timed with a wall clock. After the directory is added and
+# committed a controlled share of refs is broken in each way status reports (A-G), then
+# status, sync (non-interactive) and list are timed. A command that fails stops the
+# benchmark, its timing would look like an improvement.
+#
+# Results are written as JSON and can be compared with results of another commit:
+#   python3 trakk_bench.py --refs 1000 10000 --output new.json --compare old.json
+
+_TRAKK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trakk.py")
+
+_FILES_PER_DIR = 100
+_TRACKED_DIR = "dotfiles"
+_REPO_DIR = "repo"
+
+# share of refs broken per type, see BrokenRefType
+_BROKEN_SHARE = 0.01
+_BROKEN_TYPES = "ABCDEFG"
+
+_SYNC_POLICY = ["--prefer", "mine", "--on-missing", "remove", "--on-unlinked", "link"]
+
+# name -> (trakk arguments, runs are independent of each other so command can be repeated)
+_REPEATABLE = [
+    ("startup", ["--version"]),
+    ("banner", []),
+    ("list", ["--list"]),
+    ("status", ["--status"]),
+    ("status_cached", ["--status", "--cached"]),
+]
+
+# the banner (no arguments) exits with 1 by design
+_EXPECTED_EXIT_CODES = {(): (1,)}
+
+_ERROR_COMMAND_FAILED = "trakk {0} failed with exit code {1}: {2}"
+
+# slower than baseline by more than this is reported as a regression
+_DEFAULT_THRESHOLD = 1.2
+
+class BenchmarkError(Exception):
+    pass
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", repo, "-c", "user.email=bench@trakk", "-c", "user.name=bench"] + list(args),
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+class Sandbox:
+
+    def __init__(self, refs: int, storage: str = None):
+        self.refs = refs
+        self.root = tempfile.mkdtemp(prefix="trakk-bench-")
+        self.home = os.path.join(self.root, "home")
+        self.repo = os.path.join(self.home, _REPO_DIR)
+        self.env = dict(os.environ, HOME=self.home)
+        self.exit_codes = {} # command -> exit code of its last run
+        self.env.pop('TRAKK_WORKERS', None)
+        self.env.pop('TRAKK_STORAGE', None)
+        if storage:
+            self.env['TRAKK_STORAGE'] = storage
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def ref_names(self) -> [str]:
+        return ["{0}/d{1:04d}/f{2:06d}".format(_TRACKED_DIR, i // _FILES_PER_DIR, i) for i in range(self.refs)]
+
+    def build(self):
+        os.makedirs(self.repo)
+        git(self.repo, "init", "-q")
+        git(self.repo, "commit", "-q", "--allow-empty", "-m", "init")
+        with open(os.path.join(self.home, ".trakk.config"), 'w') as f:
+            f.write(json.dumps({"repository": self.repo, "refs": [], "dirs": []}))
+        for name in self.ref_names():
+            write(os.path.join(self.home, name), name + "\n")
+
+    def commit(self):
+        git(self.repo, "add", "-A")
+        git(self.repo, "commit", "-q", "-m", "add")
+
+    # breaks _BROKEN_SHARE of refs for each broken ref type, returns count per type
+    def break_refs(self) -> dict:
+        names = self.ref_names()
+        per_type = max(1, int(len(names) * _BROKEN_SHARE))
+        counts = {}
+        for n, kind in enumerate(_BROKEN_TYPES):
+            chosen = names[n::len(_BROKEN_TYPES)][:per_type]
+            for name in chosen:
+                mine, theirs = os.path.join(self.home, name), os.path.join(self.repo, name)
+                if kind == "A": # changed content, still linked
+                    with open(mine, 'a') as f:
+                        f.write("changed\n")
+                elif kind == "B": # atomic save, new inode
+                    write(mine + ".tmp", name + " saved\n")
+                    os.replace(mine + ".tmp", mine)
+                elif kind == "C":
+                    os.remove(theirs)
+                elif kind == "D":
+                    os.remove(mine)
+                elif kind == "E":
+                    os.remove(mine)
+                    os.remove(theirs)
+                elif kind == "F":
+                    write(theirs + ".untracked", "untracked\n")
+                elif kind == "G":
+                    write(mine + ".new", "new\n")
+            counts[kind] = len(chosen)
+        return counts
+
+    # seconds command took, raises BenchmarkError if it failed (a failing command is not a fast one)
+    def run(self, args) -> float:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, _TRAKK] + args, env=self.env, cwd=self.home,
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        elapsed = time.perf_counter() - start
+        command = " ".join(args) or "(banner)"
+        self.exit_codes[command] = result.returncode
+        if result.returncode not in _EXPECTED_EXIT_CODES.get(tuple(args), (0,)):
+            raise BenchmarkError(_ERROR_COMMAND_FAILED.format(command, result.returncode, _tail(result.stdout)))
+        return elapsed
+
+# last lines of command output (errors are printed last)
+def _tail(output: bytes, lines: int = 5) -> str:
+    return "\n".join(output.decode(errors='replace').strip().splitlines()[-lines:])
+
+def timing(samples) -> dict:
+    return {"min": min(samples), "median": statistics.median(samples), "runs": len(samples)}
+
+def bench_size(refs: int, repeat: int, storage: str = None) -> dict:
+    results = {}
+    with Sandbox(refs, storage) as sandbox:
+        sandbox.build()
+        results["add_dir"] = timing([sandbox.run(["--add", _TRACKED_DIR])])
+        sandbox.commit()
+        results["status_clean"] = timing([sandbox.run(["--status"]) for _ in range(repeat)])
+
+        results["broken"] = sandbox.break_refs()
+        # first run after changes sees cold caches
+        results["status_cold"] = timing([sandbox.run(["--status"])])
+        for name, args in _REPEATABLE:
+            results[name] = timing([sandbox.run(args) for _ in range(repeat)])
+        results["sync"] = timing([sandbox.run(["--sync"] + _SYNC_POLICY)])
+        results["status_after_sync"] = timing([sandbox.run(["--status"])])
+        results["exit_codes"] = sandbox.exit_codes
+    return results
+
+def package_commit():
+    try:
+        return subprocess.check_output(["git", "-C", os.path.dirname(_TRAKK), "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, repeat: int, storage: str = None) -> dict:
+    report = {
+        "meta": {
+            "commit": package_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "storage": storage or "default",
+            "repeat": repeat,
+        },
+        "results": {},
+    }
+    for refs in sizes:
+        print("benchmarking {0} refs..".format(refs), file=sys.stderr)
+        report["results"][str(refs)] = bench_size(refs, repeat, storage)
+    return report
+
+# rows of (size, benchmark, baseline median, current median, ratio)
+def compare(baseline: dict, current: dict):
+    rows = []
+    for size, benchmarks in current["results"].items():
+        for name, result in benchmarks.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if not isinstance(result, dict) or "median" not in result or not old:
+                continue
+            rows.append((size, name, old["median"], result["median"], result["median"] / old["median"] if old["median"] else None))
+    return rows
+
+def print_report(report: dict):
+    for size, benchmarks in report["results"].items():
+        print("{0} refs".format(size))
+        for name, result in benchmarks.items():
+            if isinstance(result, dict) and "median" in result:
+                print("  {0:<20} {1:8.3f}s (min {2:.3f}s)".format(name, result["median"], result["min"]))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark trakk on synthetic home directories')
+    parser.add_argument('--refs', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Number of tracked files, one benchmark per size (default: 1000 10000 100000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of each repeatable command, median and min are reported (default: 3)')
+    parser.add_argument('--storage', type=str, choices=['json', 'sqlite'],
+                        help='Storage backend to benchmark (default: trakk default)')
+    parser.add_argument('--output', type=str, metavar="<file>",
+                        help='Write results as JSON')
+    parser.add_argument('--compare', type=str, metavar="<file>",
+                        help='Compare with results of an earlier run, exits with 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=_DEFAULT_THRESHOLD,
+                        help='Slowdown (current / baseline median) counted as regression (default: 1.2)')
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_benchmarks(args.refs, args.repeat, args.storage)
+    except BenchmarkError as e:
+        print("ERROR: {0}".format(e), file=sys.stderr)
+        return 2
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.loads(f.read())
+        print("compared with {0}".format(baseline.get("meta", {}).get("commit")))
+        regressions = 0
+        for size, name, old, new, ratio in compare(baseline, report):
+            regressed = ratio is not None and ratio > args.threshold
+            regressions += regressed
+            print("  {0:>7} {1:<20} {2:8.3f}s -> {3:8.3f}s  x{4:.2f}{5}".format(size, name, old, new, ratio or 0, "  REGRESSION" if regressed else ""))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
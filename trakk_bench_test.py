@@ -0,0 +1,39 @@
+import os
+import pytest
+import trakk_bench
+
+def report(medians):
+    return {"results": {"10": {name: {"min": value, "median": value, "runs": 1} for name, value in medians.items()}}}
+
+def test_benchSize_tinyHome_timesEveryCommand():
+    results = trakk_bench.bench_size(14, 1)
+
+    assert results["broken"] == {kind: 1 for kind in "ABCDEFG"}
+    for name in ["add_dir", "status_clean", "status_cold", "sync", "status_after_sync"] + [name for name, _ in trakk_bench._REPEATABLE]:
+        assert results[name]["runs"] == 1
+        assert results[name]["min"] > 0
+    exit_codes = results["exit_codes"]
+    assert exit_codes.pop("(banner)") == 1 # banner exits with 1 by design
+    assert exit_codes and set(exit_codes.values()) == {0}
+
+def test_run_failingCommand_raises():
+    with trakk_bench.Sandbox(1) as sandbox:
+        os.makedirs(sandbox.home) # no trakk configuration, trakk reports an error
+        with pytest.raises(trakk_bench.BenchmarkError):
+            sandbox.run(["--status"])
+
+def test_compare_matchingBenchmarks_givesRatio():
+    baseline = report({"status": 1.0, "list": 0.5})
+    current = report({"status": 1.5, "sync": 2.0})
+
+    rows = trakk_bench.compare(baseline, current)
+
+    assert rows == [("10", "status", 1.0, 1.5, 1.5)]
+
+def test_main_regression_exitsWithOne(tmpdir, monkeypatch):
+    baseline = tmpdir.join("old.json")
+    baseline.write('{"meta": {}, "results": {"10": {"status": {"min": 1.0, "median": 1.0, "runs": 1}}}}')
+    monkeypatch.setattr(trakk_bench, "run_benchmarks", lambda sizes, repeat, storage: report({"status": 1.3}))
+
+    assert trakk_bench.main(["--refs", "10", "--compare", str(baseline)]) == 1
+    assert trakk_bench.main(["--refs", "10", "--compare", str(baseline), "--threshold", "1.5"]) == 0
@@ -0,0 +1,166 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+import os
+import stat
+import time
+import select
+import signal
+import log
+import inotify
+from pathspec import home
+
+# LinkWatcher - relinks tracked files replaced by editors that save atomically
+#
+# Many editors save by writing a new file and renaming it over the old one. The tracked
+# file in system then has a new inode and is no longer linked to its copy in repository
+# (broken ref type B). The watcher listens for files being created or renamed into the
+# directories holding tracked files and replaces the repository copy with a hard link
+# to the new file in system (same as sync choosing "mine").
+#
+# Only refs seen linked when the index was (re)loaded are relinked, and only while their
+# repository copy still has the inode recorded then: the system file was replaced but
+# the repository copy was not. If the repository copy was replaced too (e.g. by a git
+# pull or checkout) the ref is left for --sync, relinking would overwrite upstream content.
+#
+# Events are collected until none has arrived for _DEBOUNCE_SECONDS (at most
+# _MAX_DELAY_SECONDS), so a burst of saves is handled in one go and temporary files are
+# gone by then. When idle the watcher is blocked in select and uses no CPU.
+
+# rename over the old file, or a new file created after the old one was removed
+_WATCH_MASK = inotify.IN_MOVED_TO | inotify.IN_CREATE
+
+_DEBOUNCE_SECONDS = 0.1
+_MAX_DELAY_SECONDS = 1.0
+
+# sqlite storage writes its journal next to the database
+_JOURNAL_SUFFIX = '-journal'
+
+
+class _Stopped(Exception):
+    pass
+
+def _stop(signum, frame):
+    raise _Stopped()
+
+
+class LinkWatcher:
+
+    def __init__(self, app):
+        self.app = app
+        self.ref_store = app.ref_store
+        self.linker = app.linker
+        self.notify = None
+        self.storage_file = None
+        self.pending = set() # changed paths in system
+        self.linked = {} # path in system -> (dev, inode) of repository copy when last seen linked
+        self.first_event = None
+        self.last_event = None
+
+    def run(self):
+        signal.signal(signal.SIGTERM, _stop)
+        with inotify.Inotify() as notify:
+            self.notify = notify
+            self.reload()
+            log.info("Watching {0} tracked files for broken links".format(len(self.ref_store.get_index())))
+            try:
+                self.loop()
+            except (_Stopped, KeyboardInterrupt):
+                log.info("Stopped watching")
+
+    def loop(self):
+        while True:
+            readable, _, _ = select.select([self.notify], [], [], self.timeout())
+            now = time.monotonic()
+            if readable:
+                events = self.notify.read_events()
+                if events:
+                    self.first_event = self.first_event or now
+                    self.last_event = now
+                    self.collect(events)
+            if self.first_event and (now - self.last_event >= _DEBOUNCE_SECONDS or now - self.first_event >= _MAX_DELAY_SECONDS):
+                self.first_event = self.last_event = None
+                self.relink_pending()
+
+    # None (wait forever) when nothing is pending
+    def timeout(self):
+        if not self.first_event:
+            return None
+        now = time.monotonic()
+        return max(0.0, min(self.last_event + _DEBOUNCE_SECONDS, self.first_event + _MAX_DELAY_SECONDS) - now)
+
+    def reload(self):
+        self.ref_store.reload()
+        self.storage_file = self.app.config.get_storage_file()
+        self.record_links()
+        wanted = {home()}
+        for ref_name in self.ref_store.get_index():
+            mine, _ = self.app.mine_theirs_from_ref(ref_name)
+            wanted.add(os.path.dirname(mine))
+        for path in list(self.notify.watches):
+            if path not in wanted:
+                self.notify.remove_watch(path)
+        for path in wanted:
+            if not self.notify.is_watched(path) and os.path.isdir(path):
+                try:
+                    self.notify.add_watch(path, _WATCH_MASK)
+                except OSError as e:
+                    log.error("could not watch {0}: {1}".format(path, e))
+
+    def collect(self, events):
+        for event in events:
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                # events were lost, check every tracked file
+                self.pending.update(self.app.mine_theirs_from_ref(ref_name)[0] for ref_name in self.ref_store.get_index())
+            elif event.path in (self.storage_file, self.storage_file + _JOURNAL_SUFFIX):
+                log.debug("index changed, reloading")
+                self.reload()
+            elif not event.is_dir():
+                self.pending.add(event.path)
+
+    # records inode of repository copy for every ref that is linked right now
+    def record_links(self):
+        self.linked = {}
+        for ref_name in self.ref_store.get_index():
+            mine, theirs = self.app.mine_theirs_from_ref(ref_name)
+            try:
+                mine_stat, theirs_stat = os.lstat(mine), os.lstat(theirs)
+            except OSError:
+                continue
+            if os.path.samestat(mine_stat, theirs_stat):
+                self.linked[mine] = (theirs_stat.st_dev, theirs_stat.st_ino)
+
+    def relink_pending(self):
+        paths, self.pending = self.pending, set()
+        user_home = home()
+        for mine in sorted(paths):
+            ref_name = os.path.relpath(mine, user_home)
+            if not self.ref_store.contains_ref_name(ref_name):
+                continue
+            _, theirs = self.app.mine_theirs_from_ref(ref_name)
+            mine_stat = self.replaced_stat(mine, theirs)
+            if mine_stat is None:
+                continue
+            try:
+                self.linker.link_raw(mine, theirs, True)
+                self.linked[mine] = (mine_stat.st_dev, mine_stat.st_ino)
+                log.info("relinked: {0}".format(mine))
+            except OSError as e:
+                log.error("could not relink {0}: {1}".format(mine, e))
+
+    # Stat of system file if it is a regular file that replaced a linked file while the
+    # repository copy is still the one it was linked to, else None (nothing to do or left for --sync)
+    def replaced_stat(self, mine: str, theirs: str):
+        recorded = self.linked.get(mine)
+        if recorded is None:
+            return None
+        try:
+            mine_stat = os.lstat(mine)
+            theirs_stat = os.lstat(theirs)
+        except OSError:
+            return None # missing on either side is not an editor save
+        if not stat.S_ISREG(mine_stat.st_mode) or os.path.samestat(mine_stat, theirs_stat):
+            return None
+        if (theirs_stat.st_dev, theirs_stat.st_ino) != recorded:
+            del self.linked[mine] # reported once
+            log.info("not relinking {0}, repository copy changed too (use --sync)".format(mine))
+            return None
+        return mine_stat
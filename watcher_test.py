@@ -0,0 +1,159 @@
+import os
+import pytest
+import inotify
+import watcher
+from config import Config
+from linker import Linker
+from watcher import LinkWatcher
+
+class FakeRefStore:
+
+    def __init__(self, refs):
+        self.refs = refs
+
+    def get_index(self):
+        return self.refs
+
+    def contains_ref_name(self, ref_name):
+        return ref_name in self.refs
+
+class FakeApp:
+
+    def __init__(self, home, refs):
+        self.home = home
+        self.ref_store = FakeRefStore(refs)
+        self.linker = Linker(os.path.join(home, "repo"))
+
+    def mine_theirs_from_ref(self, ref):
+        return os.path.join(self.home, ref), os.path.join(self.home, "repo", ref)
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    import pathspec
+    home = str(tmpdir)
+    monkeypatch.setenv('HOME', home)
+    monkeypatch.setattr(pathspec, '_home', home)
+    os.makedirs(os.path.join(home, "repo"))
+    return home
+
+def write(path, content="x"):
+    with open(path, 'w') as f:
+        f.write(content)
+
+def read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+# tracked file linked to its repository copy and a watcher that has seen it linked
+def linked_watcher(home, name=".vimrc"):
+    mine, theirs = os.path.join(home, name), os.path.join(home, "repo", name)
+    write(mine, "original")
+    os.link(mine, theirs)
+    return make_watcher(home, [name]), mine, theirs
+
+# watcher as after reload, without inotify
+def make_watcher(home, refs):
+    watcher = LinkWatcher(FakeApp(home, refs))
+    watcher.storage_file = os.path.join(home, ".trakk.config")
+    watcher.record_links()
+    return watcher
+
+def atomic_save(path, content):
+    write(path + ".tmp", content)
+    os.replace(path + ".tmp", path)
+
+def moved_to(path):
+    return inotify.Event(1, inotify.IN_MOVED_TO, 0, path)
+
+def test_relinkPending_atomicSave_relinksRepositoryCopy(home):
+    watcher, mine, theirs = linked_watcher(home)
+    atomic_save(mine, "saved")
+
+    watcher.collect([moved_to(mine)])
+    watcher.relink_pending()
+
+    assert os.path.samefile(mine, theirs)
+    assert read(theirs) == "saved"
+
+def test_relinkPending_savedTwice_relinksBothTimes(home):
+    watcher, mine, theirs = linked_watcher(home)
+    for content in ["first", "second"]:
+        atomic_save(mine, content)
+        watcher.collect([moved_to(mine)])
+        watcher.relink_pending()
+
+    assert os.path.samefile(mine, theirs)
+    assert read(theirs) == "second"
+
+def test_relinkPending_repositoryCopyReplaced_leftForSync(home):
+    watcher, mine, theirs = linked_watcher(home)
+    # e.g. git pull replaced the repository copy, then file in system is saved
+    atomic_save(theirs, "upstream")
+    atomic_save(mine, "saved")
+
+    watcher.collect([moved_to(mine)])
+    watcher.relink_pending()
+
+    assert read(theirs) == "upstream"
+    assert not os.path.samefile(mine, theirs)
+
+def test_relinkPending_notLinkedWhenRecorded_leftForSync(home):
+    mine, theirs = os.path.join(home, ".vimrc"), os.path.join(home, "repo", ".vimrc")
+    write(mine, "mine")
+    write(theirs, "theirs")
+    watcher = make_watcher(home, [".vimrc"])
+    atomic_save(mine, "saved")
+
+    watcher.collect([moved_to(mine)])
+    watcher.relink_pending()
+
+    assert read(theirs) == "theirs"
+
+def test_relinkPending_untrackedFile_ignored(home):
+    watcher, _, _ = linked_watcher(home)
+    other = os.path.join(home, ".other")
+    write(other)
+
+    watcher.collect([moved_to(other)])
+    watcher.relink_pending()
+
+    assert not os.path.exists(os.path.join(home, "repo", ".other"))
+
+def test_collect_directoryEvent_ignored(home):
+    watcher, mine, _ = linked_watcher(home)
+
+    watcher.collect([inotify.Event(1, inotify.IN_CREATE | inotify.IN_ISDIR, 0, os.path.join(home, ".config"))])
+
+    assert watcher.pending == set()
+
+def test_collect_overflow_checksAllTrackedFiles(home):
+    watcher, mine, _ = linked_watcher(home)
+
+    watcher.collect([inotify.Event(-1, inotify.IN_Q_OVERFLOW, 0, "")])
+
+    assert watcher.pending == {mine}
+
+def test_replacedStat_symlink_none(home):
+    watcher, mine, theirs = linked_watcher(home)
+    os.remove(mine)
+    os.symlink(theirs, mine)
+
+    assert watcher.replaced_stat(mine, theirs) is None
+
+@pytest.mark.skipif(not inotify.is_supported(), reason="inotify not available")
+@pytest.mark.parametrize('storage', ['json', 'sqlite'])
+def test_collect_storageWritten_liveWatcher_reloads(home, monkeypatch, storage):
+    monkeypatch.setenv('TRAKK_STORAGE', storage)
+    config = Config()
+    config.write_rc(os.path.join(home, "repo"), [".vimrc"], [])
+    link_watcher = make_watcher(home, [".vimrc"])
+    link_watcher.storage_file = config.get_storage_file()
+    reloads = []
+    link_watcher.reload = lambda: reloads.append(True)
+
+    with inotify.Inotify() as notify:
+        notify.add_watch(home, watcher._WATCH_MASK)
+        config.write_rc(os.path.join(home, "repo"), [".vimrc", ".zshrc"], [])
+        link_watcher.collect(notify.read_events())
+
+    assert reloads
@@ -0,0 +1,25 @@
+# author: Samuel Wejeus (samuel@isalldigital.com)
+from concurrent.futures import ThreadPoolExecutor
+
+# Helpers for running I/O bound work (stats, links, reads) on a bounded thread pool.
+
+# below this many items a thread pool costs more than it saves
+_MIN_PARALLEL_ITEMS = 128
+# chunks handed to each worker, keeps per task overhead low for many small items
+_CHUNKS_PER_WORKER = 4
+
+# Applies function to every item and returns results in same order as items. Items are
+# split in chunks and spread over at most <workers> threads. Runs in calling thread if
+# workers is 1 or there are too few items for threads to pay off.
+def map_parallel(function, items, workers: int = 1, min_parallel: int = _MIN_PARALLEL_ITEMS):
+    items = list(items)
+    if workers <= 1 or len(items) < min_parallel:
+        return [function(item) for item in items]
+
+    chunk_size = max(1, -(-len(items) // (workers * _CHUNKS_PER_WORKER)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    results = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        for chunk_result in pool.map(lambda chunk: [function(item) for item in chunk], chunks):
+            results.extend(chunk_result)
+    return results
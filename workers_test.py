@@ -0,0 +1,31 @@
+import threading
+import pytest
+from workers import map_parallel
+
+def test_mapParallel_manyItems_resultsInInputOrder():
+    threads = set()
+    def square(x):
+        threads.add(threading.get_ident())
+        return x * x
+
+    results = map_parallel(square, range(1000), workers=8)
+
+    assert results == [x * x for x in range(1000)]
+    assert len(threads) > 1
+
+def test_mapParallel_fewItems_runsInCallingThread():
+    threads = set()
+
+    map_parallel(lambda x: threads.add(threading.get_ident()), range(10), workers=8)
+
+    assert threads == {threading.get_ident()}
+
+@pytest.mark.parametrize('workers', [1, 8])
+def test_mapParallel_functionRaises_propagates(workers):
+    def fail_on_500(x):
+        if x == 500:
+            raise ValueError("item {0}".format(x))
+        return x
+
+    with pytest.raises(ValueError, match="item 500"):
+        map_parallel(fail_on_500, range(1000), workers=workers)